@@ -0,0 +1,69 @@
+#----------------------------------------------------------------------
+# This programme provides a simple benchmark harness for the layout state ('.sig') file formats.
+# A layout state snapshot is generated for a given number of items (split between signals, points,
+# sections and instruments) and then saved/loaded in each of the supported formats (the default
+# 'human readable' json format, the compact json format and the binary format). The save time,
+# load time and file size are reported for each format.
+#
+# Usage: python3 benchmark_file_interface.py [number_of_items ...]
+# ---------------------------------------------------------------------
+
+from model_railway_signals.library import file_interface
+import tempfile
+import random
+import time
+import sys
+import os
+
+formats = {"json":(False,False), "json-compact":(True,False), "binary":(False,True)}
+
+#----------------------------------------------------------------------
+# Function to create a snapshot (in the form returned by 'take_layout_state_snapshot')
+# with random values for each of the item elements
+#----------------------------------------------------------------------
+
+def create_snapshot(number_of_items:int):
+    snapshot = {}
+    layout_elements = file_interface.get_sig_file_config()
+    items_per_element = max(1, number_of_items // len(layout_elements))
+    for layout_element, element_config in layout_elements.items():
+        snapshot[layout_element] = []
+        for item_id in range(1, items_per_element+1):
+            item_elements = []
+            for element_name, element_type in element_config["elements"]:
+                if element_type == "bool": value = random.choice((True, False, None))
+                elif element_type == "enum": value = random.randint(0, 5)
+                else: value = "Item "+str(item_id)
+                item_elements.append((element_name, value))
+            snapshot[layout_element].append((str(item_id), item_elements))
+    return(snapshot)
+
+#----------------------------------------------------------------------
+# Main benchmark function
+#----------------------------------------------------------------------
+
+def run_benchmark(number_of_items:int, repeats:int=5):
+    snapshot = create_snapshot(number_of_items)
+    print ("Layout state with "+str(number_of_items)+" items:")
+    with tempfile.TemporaryDirectory() as directory:
+        for format_name, (compact, binary) in formats.items():
+            filename = os.path.join(directory, format_name+".sig")
+            start_time = time.perf_counter()
+            for repeat in range(repeats):
+                file_interface.write_layout_state_file(filename, snapshot, compact=compact, binary=binary)
+            save_time = (time.perf_counter() - start_time) / repeats
+            start_time = time.perf_counter()
+            for repeat in range(repeats):
+                with open (filename,'rb') as file:
+                    file_interface.decode_layout_state_file(file.read())
+            load_time = (time.perf_counter() - start_time) / repeats
+            print ("    "+format(format_name,"<14")+"save "+format(save_time*1000.0,">9.3f")+" ms   load "
+                    +format(load_time*1000.0,">9.3f")+" ms   size "+format(os.path.getsize(filename),">10")+" bytes")
+    return()
+
+if __name__ == "__main__":
+    item_counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+    for item_count in item_counts:
+        run_benchmark(item_count)
+
+#############################################################################################
@@ -0,0 +1,137 @@
+#----------------------------------------------------------------------
+# This programme provides a simple benchmark harness for the MQTT networking using the local
+# (in-process) broker stand-in - so it can be run on any machine without an external broker.
+# A chain of simulated "signal boxes" is created, each with its own MQTT client. The first box
+# originates a stream of signal, section, instrument and DCC messages and each subsequent box
+# relays them on to the next box (in the same way a signal update is passed along a line). The
+# latency of every hop is recorded and the percentiles reported for each message type and hop.
+#
+# Usage: python3 benchmark_networking.py [number_of_boxes] [messages_per_type]
+# ---------------------------------------------------------------------
+
+from model_railway_signals.library import mqtt_local_broker
+import threading
+import json
+import time
+import sys
+
+network_identifier = "benchmark"
+
+# The message types we exchange between boxes - and the subtopic (if any) they use
+message_types = {"signal_updated_event":False, "section_updated_event":False,
+                 "instrument_updated_event":False, "dcc_accessory_short_events":True}
+
+#----------------------------------------------------------------------
+# Function to build the topic in the same format as the mqtt_interface module
+#----------------------------------------------------------------------
+
+def build_topic(message_type:str, node:str, item_id:int, subtopic:str=None):
+    topic = message_type+"/"+network_identifier+"/"+node+"-"+str(item_id)
+    if subtopic is not None: topic = topic+"/"+subtopic
+    return(topic)
+
+#----------------------------------------------------------------------
+# Function to create a simulated signal box - which subscribes to all the message types from
+# the box behind it and relays each message it receives on to the box ahead (if there is one)
+#----------------------------------------------------------------------
+
+def create_signal_box(box_number:int, number_of_boxes:int, items_per_type:int,
+                      latencies:dict, messages_expected:int, all_received):
+    node = "box"+str(box_number)
+    client = mqtt_local_broker.local_mqtt_client()
+    received = [0]
+
+    def on_message(mqtt_client, userdata, msg):
+        receive_time = time.perf_counter()
+        message = json.loads(msg.payload)
+        message_type = msg.topic.split("/")[0]
+        latencies[(message_type,box_number)].append(receive_time-message["timestamp"])
+        if box_number < number_of_boxes-1:
+            message["timestamp"] = time.perf_counter()
+            message["sourceidentifier"] = node+"-"+str(message["itemid"])
+            publish_message(client, message_type, node, message)
+        received[0] += 1
+        if received[0] == messages_expected: all_received.set()
+        return()
+
+    client.on_message = on_message
+    client.connect("local")
+    client.loop_start()
+    # Subscribe to each item in the same way as the mqtt_interface (DCC addresses are subtopics)
+    if box_number > 0:
+        for message_type, subtopics in message_types.items():
+            if subtopics:
+                client.subscribe(build_topic(message_type,"box"+str(box_number-1),0)+"/+", qos=1)
+            else:
+                for item_id in range(1,items_per_type+1):
+                    client.subscribe(build_topic(message_type,"box"+str(box_number-1),item_id), qos=1)
+    return(client)
+
+def publish_message(client, message_type:str, node:str, message:dict):
+    if message_types[message_type]:
+        topic = build_topic(message_type, node, 0, subtopic=str(message["itemid"]))
+    else:
+        topic = build_topic(message_type, node, message["itemid"])
+    client.publish(topic, json.dumps(message), qos=1, retain=True)
+    return()
+
+#----------------------------------------------------------------------
+# Function to calculate the percentiles for a list of latency values (in milliseconds)
+#----------------------------------------------------------------------
+
+def percentile(sorted_values:list, percent:float):
+    index = min(len(sorted_values)-1, int(round(percent/100.0*(len(sorted_values)-1))))
+    return(sorted_values[index]*1000.0)
+
+#----------------------------------------------------------------------
+# Main benchmark function
+#----------------------------------------------------------------------
+
+def run_benchmark(number_of_boxes:int=4, messages_per_type:int=1000, items_per_type:int=50):
+    mqtt_local_broker.reset_local_broker()
+    latencies = {}
+    for message_type in message_types:
+        for box_number in range(1,number_of_boxes):
+            latencies[(message_type,box_number)] = []
+    messages_expected = messages_per_type * len(message_types)
+    events = [threading.Event() for box_number in range(number_of_boxes)]
+    clients = [create_signal_box(box_number, number_of_boxes, items_per_type,
+                                 latencies, messages_expected, events[box_number])
+                                                             for box_number in range(number_of_boxes)]
+    # Allow the clients to connect (the connection callbacks are made in the client threads)
+    time.sleep(0.1)
+    print ("Sending "+str(messages_per_type)+" messages of each type through "+str(number_of_boxes)+" boxes")
+    start_time = time.perf_counter()
+    for count in range(messages_per_type):
+        for message_type in message_types:
+            item_id = (count % items_per_type) + 1
+            message = {"sourceidentifier":"box0-"+str(item_id), "itemid":item_id,
+                       "timestamp":time.perf_counter(), "state":count}
+            publish_message(clients[0], message_type, "box0", message)
+    if not events[number_of_boxes-1].wait(timeout=60):
+        print ("Timeout waiting for all messages to be received")
+    elapsed_time = time.perf_counter() - start_time
+    for client in clients:
+        client.disconnect()
+        client.loop_stop()
+    # Report the results
+    total_messages = messages_expected * (number_of_boxes-1)
+    print ("Delivered "+str(total_messages)+" messages in "+format(elapsed_time,".3f")+" secs ("
+                 +format(total_messages/elapsed_time,".0f")+" messages/sec)")
+    print (format("Message type","<28")+format("Hop","<6")+format("Count","<8")+format("p50 (ms)","<10")
+                 +format("p90 (ms)","<10")+format("p99 (ms)","<10")+format("max (ms)","<10"))
+    for (message_type, box_number), values in latencies.items():
+        values.sort()
+        if len(values) > 0:
+            print (format(message_type,"<28")+format(str(box_number-1)+">"+str(box_number),"<6")
+                   +format(len(values),"<8")+format(percentile(values,50),"<10.3f")
+                   +format(percentile(values,90),"<10.3f")+format(percentile(values,99),"<10.3f")
+                   +format(values[-1]*1000.0,"<10.3f"))
+    return()
+
+if __name__ == "__main__":
+    boxes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    run_benchmark(number_of_boxes=boxes, messages_per_type=messages)
+
+#############################################################################################
@@ -0,0 +1,134 @@
+#----------------------------------------------------------------------
+# This programme provides a simple benchmark harness for the track sensors using the in-process
+# GPIO simulator - so it can be run on any machine (not just a Raspberry Pi). A track sensor is
+# created for every available GPIO channel and a timed script of input pulses is then run at a
+# range of trigger rates - firstly on a single channel and then on all channels at once. For each
+# rate the number of triggers (sensor callbacks) is compared with the number of pulses and the
+# maximum sustained trigger rate (the highest rate with at least 99% of pulses detected) reported.
+# The same rate benchmark is then run for a large number of sensors mapped to simulated input banks
+# (16 bit port expanders that are polled rather than generating an interrupt for every input).
+# The debounce filtering is also checked (with more realistic trigger period and timeout values)
+# by running pulses with "bounces" at the start and end (each pulse should still result in exactly
+# one trigger) and short "spikes" (which should be filtered out by the trigger period).
+#
+# Usage: python3 benchmark_track_sensors.py [duration_secs] [rate ...] [--banks=number_of_banks]
+# ---------------------------------------------------------------------
+
+from model_railway_signals.library import track_sensors
+from model_railway_signals.library import gpio_simulator
+import threading
+import time
+import sys
+
+# The available GPIO channels (14 and 15 are reserved for the Pi-SPROG serial port)
+gpio_channels = [channel for channel in range(4, 27) if channel not in (14, 15)]
+trigger_period = 0.0002
+sensor_timeout = 0.0
+bank_poll_interval = 0.001
+
+trigger_counts: dict = {}
+trigger_lock = threading.Lock()
+
+#----------------------------------------------------------------------
+# The sensor callback - counts the triggers for each sensor
+#----------------------------------------------------------------------
+
+def sensor_callback(sensor_id:int, callback_type):
+    with trigger_lock:
+        trigger_counts[sensor_id] = trigger_counts.get(sensor_id, 0) + 1
+    return()
+
+def create_sensors():
+    track_sensors.configure_gpio_backend(simulated=True)
+    for sensor_id, gpio_channel in enumerate(gpio_channels, start=1):
+        track_sensors.create_track_sensor(sensor_id, gpio_channel, sensor_callback=sensor_callback,
+                                 trigger_period=trigger_period, sensor_timeout=sensor_timeout)
+    return()
+
+def create_bank_sensors(number_of_banks:int):
+    bank_inputs = []
+    for bank_id in range(1, number_of_banks+1):
+        track_sensors.create_input_bank(bank_id, device="simulated", poll_interval=bank_poll_interval)
+        for bank_input in range(16):
+            sensor_id = 1000 + bank_id * 16 + bank_input
+            track_sensors.create_track_sensor(sensor_id, bank_input, input_bank=bank_id, sensor_callback=sensor_callback,
+                                 trigger_period=trigger_period, sensor_timeout=sensor_timeout)
+            bank_inputs.append((bank_id, bank_input))
+    return(bank_inputs)
+
+# The sensors can only be created once - so we change the filter settings directly for the debounce checks
+def set_sensor_filter(trigger_period:float, sensor_timeout:float):
+    for channel in track_sensors.channels.values():
+        channel["trigger_period"] = trigger_period
+        channel["timeout_value"] = sensor_timeout
+    return()
+
+#----------------------------------------------------------------------
+# Function to run a script of pulses on the specified channels at the specified rate
+# Returns (number of pulses, number of triggers, achieved pulse rate per channel)
+#----------------------------------------------------------------------
+
+def run_pulses(channels:list, rate:float, duration:float, active_duration:float=None,
+                                        bounces:int=0, bounce_interval:float=0.0005):
+    script = []
+    number_of_pulses = max(1, int(rate * duration))
+    if active_duration is None: active_duration = 0.5 / rate
+    for gpio_channel in channels:
+        for pulse in range(number_of_pulses):
+            script.extend(gpio_simulator.create_bounce_pattern(gpio_channel, start_time=pulse / rate,
+                        active_duration=active_duration, bounces=bounces, bounce_interval=bounce_interval))
+    with trigger_lock: trigger_counts.clear()
+    start_time = time.perf_counter()
+    gpio_simulator.run_simulated_input_script(script)
+    elapsed = time.perf_counter() - start_time
+    # Allow time for the last pulses to work their way through the debounce and timeout checks
+    time.sleep(0.1)
+    with trigger_lock: number_of_triggers = sum(trigger_counts.values())
+    return(number_of_pulses * len(channels), number_of_triggers, number_of_pulses / elapsed)
+
+#----------------------------------------------------------------------
+# Main benchmark functions
+#----------------------------------------------------------------------
+
+def run_rate_benchmark(title:str, channels:list, rates:list, duration:float):
+    print (title+" ("+str(len(channels))+" channels):")
+    max_sustained_rate = 0.0
+    for rate in rates:
+        pulses, triggers, achieved_rate = run_pulses(channels, rate, duration)
+        detected = triggers / pulses * 100.0
+        print ("    target "+format(rate,">7.0f")+" Hz   achieved "+format(achieved_rate,">8.1f")+" Hz per channel"
+               "   pulses "+format(pulses,">7")+"   triggers "+format(triggers,">7")+"   detected "+format(detected,">6.1f")+"%")
+        if detected >= 99.0: max_sustained_rate = max(max_sustained_rate, achieved_rate)
+    print ("    Maximum sustained trigger rate: "+format(max_sustained_rate,".1f")+" Hz per channel, "
+                                    +format(max_sustained_rate * len(channels),".1f")+" Hz in total")
+    return()
+
+def run_debounce_checks(channels:list, rate:float, duration:float, bounces:int=3):
+    set_sensor_filter(trigger_period=0.005, sensor_timeout=0.01)
+    pulses, triggers, achieved_rate = run_pulses(channels, rate, duration, bounces=bounces)
+    print ("Debounce check ("+str(bounces)+" bounces at each end of every pulse, "+format(rate,".0f")+" Hz): "
+                    +str(pulses)+" pulses, "+str(triggers)+" triggers ("+format(triggers/pulses,".2f")+" per pulse)")
+    pulses, triggers, achieved_rate = run_pulses(channels, rate, duration, active_duration=0.001)
+    print ("Spike check (1ms pulses with a 5ms trigger period, "+format(rate,".0f")+" Hz): "
+                    +str(pulses)+" pulses, "+str(triggers)+" triggers ("+format(triggers/pulses,".2f")+" per pulse)")
+    set_sensor_filter(trigger_period=trigger_period, sensor_timeout=sensor_timeout)
+    return()
+
+if __name__ == "__main__":
+    number_of_banks = 13
+    for arg in [arg for arg in sys.argv[1:] if arg.startswith("--banks=")]:
+        number_of_banks = int(arg.partition("=")[2])
+        sys.argv.remove(arg)
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    rates = [float(arg) for arg in sys.argv[2:]] or [10, 50, 100, 200, 500, 1000]
+    create_sensors()
+    bank_inputs = create_bank_sensors(number_of_banks)
+    # Warm up (the simulator callback thread and the sensor scheduler thread are started on first use)
+    run_pulses(gpio_channels, 10, 0.1)
+    run_rate_benchmark("Single channel", gpio_channels[:1], rates, duration)
+    run_rate_benchmark("All channels", gpio_channels, rates, duration)
+    run_rate_benchmark("Input banks - polled every "+format(bank_poll_interval*1000,".0f")+"ms", bank_inputs,
+                                                      [rate for rate in rates if rate <= 100], duration)
+    run_debounce_checks(gpio_channels, 20, duration)
+
+#############################################################################################
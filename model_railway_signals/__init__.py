@@ -50,12 +50,22 @@ from .library.track_sections import section_occupied
 from .library.track_sections import section_label
 from .library.track_sections import set_section_occupied
 from .library.track_sections import clear_section_occupied
+from .library.track_sections import set_sections
 from .library.track_sections import subscribe_to_section_updates
 from .library.track_sections import set_sections_to_publish_state
+from .library.track_sections import add_section_transition
+from .library.track_sections import add_section_protection
 
 from .library.track_sensors import track_sensor_callback_type
 from .library.track_sensors import create_track_sensor
 from .library.track_sensors import track_sensor_active 
+from .library.track_sensors import track_sensors_active
+from .library.track_sensors import configure_gpio_backend
+from .library.track_sensors import create_input_bank
+from .library.gpio_simulator import set_simulated_input
+from .library.gpio_simulator import pulse_simulated_input
+from .library.gpio_simulator import create_bounce_pattern
+from .library.gpio_simulator import run_simulated_input_script
 
 from .library.pi_sprog_interface import initialise_pi_sprog
 from .library.pi_sprog_interface import service_mode_write_cv
@@ -71,12 +81,51 @@ from .library.dcc_control import subscribe_to_dcc_command_feed
 from .library.dcc_control import set_node_to_publish_dcc_commands
 
 from .library.mqtt_interface import configure_networking
+from .library.network_snapshots import set_node_to_publish_snapshots
 
 from .library.file_interface import load_layout_state
+from .library.file_interface import convert_layout_state_file
+from .library.file_interface import load_state
+from .library.file_interface import save_state
+from .library.file_interface import configure_autosave
+
+from .library.layout_checkpoints import save_checkpoint
+from .library.layout_checkpoints import restore_checkpoint
+from .library.layout_checkpoints import delete_checkpoint
+from .library.layout_checkpoints import list_checkpoints
 
 from .library.block_instruments import block_callback_type
 from .library.block_instruments import create_block_instrument
+from .library.block_instruments import create_block_instruments
 from .library.block_instruments import block_section_ahead_clear
+from .library.block_instruments import send_bell_code
+from .library.audio_mixer import set_audio_voices
+
+from .library.event_tracing import enable_event_tracing
+from .library.event_tracing import disable_event_tracing
+from .library.event_tracing import reset_trace_statistics
+from .library.event_tracing import get_trace_statistics
+from .library.event_tracing import log_trace_statistics
+
+from .library.event_recorder import start_event_recording
+from .library.event_recorder import stop_event_recording
+from .library.event_recorder import replay_event_log
+from .library.event_recorder import layout_state_hash
+
+from .library.state_mirror import enable_state_mirror
+from .library.state_mirror import disable_state_mirror
+from .library.state_mirror import read_state_mirror
+
+from .library.layout_metrics import get_metrics
+from .library.layout_metrics import reset_metrics
+from .library.layout_metrics import start_metrics_exporter
+from .library.layout_metrics import stop_metrics_exporter
+
+from .library.callback_profiler import enable_callback_profiling
+from .library.callback_profiler import disable_callback_profiling
+from .library.callback_profiler import reset_callback_statistics
+from .library.callback_profiler import get_callback_statistics
+from .library.callback_profiler import log_callback_statistics
 
 __all__ = [
       # Public point types
@@ -133,13 +182,23 @@ __all__ = [
         'section_label',
         'set_section_occupied',
         'clear_section_occupied',
+        'set_sections',
         'subscribe_to_section_updates',
         'set_sections_to_publish_state',
+        'add_section_transition',
+        'add_section_protection',
       # public track_sensor types
         'track_sensor_callback_type',
       # public track_sensor functions
         'create_track_sensor',
         'track_sensor_active',
+        'track_sensors_active',
+        'configure_gpio_backend',
+        'create_input_bank',
+        'set_simulated_input',
+        'pulse_simulated_input',
+        'create_bounce_pattern',
+        'run_simulated_input_script',
       # Public DCC control functions
         'initialise_pi_sprog',
         'service_mode_write_cv',
@@ -153,12 +212,51 @@ __all__ = [
         'set_node_to_publish_dcc_commands',
       # Public networking functions
         'configure_networking',
+        'set_node_to_publish_snapshots',
       # Public File load/save functions
         'load_layout_state',
+        'convert_layout_state_file',
+        'load_state',
+        'save_state',
+        'configure_autosave',
+      # Public layout checkpoint functions
+        'save_checkpoint',
+        'restore_checkpoint',
+        'delete_checkpoint',
+        'list_checkpoints',
       # public block instrument types
         'block_callback_type',
       # Public block instrument functions
         'create_block_instrument',
-        'block_section_ahead_clear'
+        'create_block_instruments',
+        'block_section_ahead_clear',
+        'send_bell_code',
+        'set_audio_voices',
+      # Public event tracing functions
+        'enable_event_tracing',
+        'disable_event_tracing',
+        'reset_trace_statistics',
+        'get_trace_statistics',
+        'log_trace_statistics',
+      # Public event recorder functions
+        'start_event_recording',
+        'stop_event_recording',
+        'replay_event_log',
+        'layout_state_hash',
+      # Public state mirror functions
+        'enable_state_mirror',
+        'disable_state_mirror',
+        'read_state_mirror',
+      # Public layout metrics functions
+        'get_metrics',
+        'reset_metrics',
+        'start_metrics_exporter',
+        'stop_metrics_exporter',
+      # Public callback profiler functions
+        'enable_callback_profiling',
+        'disable_callback_profiling',
+        'reset_callback_statistics',
+        'get_callback_statistics',
+        'log_callback_statistics'
            ]
 
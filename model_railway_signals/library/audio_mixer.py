@@ -0,0 +1,169 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides the sound playback for the block instruments (bell rings and telegraph key
+# "clacks"). Rather than playing sounds directly from the tkinter thread, sounds are queued for a
+# single background "mixer" thread which starts each sound at its scheduled time. This keeps the
+# tkinter thread free and allows sequences of sounds (i.e. bell codes) to be played with the
+# correct timing between the rings.
+#
+# The sound files are loaded (and decoded) once and the wave buffers shared by all instruments
+# using the same file. The number of sounds playing at the same time is limited to a "pool" of
+# voices - if all voices are in use when a new sound is due then the oldest sound is stopped to
+# free up a voice (previously the new sound would have been dropped as 'simpleaudio' raises an
+# exception if too many sounds are played at once).
+#
+# Sounds can be queued on a "channel" (e.g. the block instrument) - the sounds queued on a channel
+# are serialised so a bell code arriving whilst another is still being played on the instrument
+# is played afterwards (rather than the rings of both codes being interleaved).
+#
+# If you want sound enabled then you will also need to install the 'simpleaudio' package. Note
+# that for Windows it has a dependency on Microsoft Visual C++ 14.0 or greater (so you will need
+# to ensure Visual Studio 2015 is installed first). If 'simpleaudio' is not installed then the
+# software will still function correctly (just without sound)
+#
+# Public types and functions:
+#
+# set_audio_voices - Sets the maximum number of sounds that can be played at the same time
+#   Mandatory Parameters:
+#       max_voices:int - The size of the voice pool (default on startup = 8)
+#-----------------------------------------------------------------------------------------------
+
+import importlib.resources
+import threading
+import heapq
+import time
+import logging
+
+# We can only use audio if 'simpleaudio' is installed. Although this package is supported across
+# different platforms, for Windows it has a dependency on Visual C++ 14.0. As this is quite a faff
+# to install I haven't made audio a hard and fast dependency for the 'model_railway_signals'
+# package as a whole - its up to the user to install if required
+
+def is_simpleaudio_installed():
+    global simpleaudio
+    try:
+        import simpleaudio
+        return (True)
+    except Exception: pass
+    return (False)
+audio_enabled = is_simpleaudio_installed()
+
+#-----------------------------------------------------------------------------------------------
+# Global variables used by the module. The scheduled sounds are held in a heap of (due_time,
+# sequence_number, sound) - the sequence number ensures sounds due at the same time are played
+# in the order they were queued. The channels dictionary holds the time each channel becomes
+# free (i.e. the time the last sound queued on the channel has finished)
+#-----------------------------------------------------------------------------------------------
+
+mixer_config: dict = {}
+mixer_config["max_voices"] = 8
+mixer_config["sequence"] = 0
+mixer_config["mixer_thread"] = None
+
+sound_buffers: dict = {}
+scheduled_sounds: list = []
+active_voices: list = []
+channels: dict = {}
+mixer_condition = threading.Condition()
+
+#-----------------------------------------------------------------------------------------------
+# Public API function to set the size of the voice pool
+#-----------------------------------------------------------------------------------------------
+
+def set_audio_voices(max_voices:int):
+    global logging
+    if max_voices < 1:
+        logging.error("Audio: set_audio_voices - The number of voices must be at least 1")
+    else:
+        logging.info("Audio: Setting the maximum number of voices to "+str(max_voices))
+        with mixer_condition:
+            mixer_config["max_voices"] = max_voices
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to load a sound file from the package resources folder. The decoded wave
+# buffer is cached so each file is only loaded once (however many instruments use it). Returns
+# None if audio is not enabled or the file fails to load (in which case no sound is produced)
+#-----------------------------------------------------------------------------------------------
+
+def load_sound(sound_file_name:str):
+    global logging
+    if not audio_enabled: return(None)
+    if sound_file_name not in sound_buffers.keys():
+        try:
+            with importlib.resources.path ('model_railway_signals.library.resources',sound_file_name) as sound_file:
+                sound_buffers[sound_file_name] = simpleaudio.WaveObject.from_wave_file(str(sound_file))
+        except Exception as exception:
+            logging.error("Audio: Error loading audio file '"+str(sound_file_name)+"' - Reported exception: "+str(exception))
+            sound_buffers[sound_file_name] = None
+    return(sound_buffers[sound_file_name])
+
+#-----------------------------------------------------------------------------------------------
+# Internal functions to queue sounds for playing by the mixer thread. A sequence is a list of
+# (sound, time_offset) - with the time offsets (in seconds) from the start of the sequence. If
+# a channel is specified then the sequence is started once the previous sounds queued on the
+# channel have completed and the channel is then "busy" until 'channel_gap' seconds after the
+# last sound of the sequence. Sounds can be None (no sound) so the timing is still maintained.
+# Returns the delay (in seconds) before the sequence will start (so any visual indications can
+# be scheduled to match the sounds)
+#-----------------------------------------------------------------------------------------------
+
+def play_sound(sound, channel=None, channel_gap:float=0.0):
+    return(play_sound_sequence([(sound, 0.0)], channel, channel_gap))
+
+def play_sound_sequence(sequence:list, channel=None, channel_gap:float=0.0):
+    with mixer_condition:
+        current_time = time.monotonic()
+        start_time = current_time
+        if channel is not None:
+            start_time = max(start_time, channels.get(channel, 0.0))
+            channels[channel] = start_time + max(offset for sound, offset in sequence) + channel_gap
+        for sound, offset in sequence:
+            if sound is not None:
+                mixer_config["sequence"] = mixer_config["sequence"] + 1
+                heapq.heappush(scheduled_sounds, (start_time + offset, mixer_config["sequence"], sound))
+        if mixer_config["mixer_thread"] is None:
+            mixer_config["mixer_thread"] = threading.Thread(target=thread_to_play_sounds, daemon=True)
+            mixer_config["mixer_thread"].start()
+        mixer_condition.notify()
+    return(start_time - current_time)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to start a sound using a voice from the pool. Voices that have finished are
+# returned to the pool - if all voices are still in use then the oldest sound is stopped. If the
+# sound still fails to play (the audio device has run out of streams) then we stop the oldest
+# sound and have another go (rather than just dropping the sound)
+#-----------------------------------------------------------------------------------------------
+
+def start_voice(sound):
+    global logging
+    active_voices[:] = [voice for voice in active_voices if voice.is_playing()]
+    while len(active_voices) >= mixer_config["max_voices"]: active_voices.pop(0).stop()
+    for attempt in range(2):
+        try:
+            active_voices.append(sound.play())
+            break
+        except Exception as exception:
+            if attempt > 0 or len(active_voices) == 0:
+                logging.debug("Audio: Error playing sound - Reported exception: "+str(exception))
+                break
+            active_voices.pop(0).stop()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# The mixer thread - waits for the next scheduled sound to become due and then plays it
+#-----------------------------------------------------------------------------------------------
+
+def thread_to_play_sounds():
+    global logging
+    while True:
+        with mixer_condition:
+            while len(scheduled_sounds) == 0 or scheduled_sounds[0][0] > time.monotonic():
+                if len(scheduled_sounds) == 0: mixer_condition.wait()
+                else: mixer_condition.wait(scheduled_sounds[0][0] - time.monotonic())
+            due_time, sequence, sound = heapq.heappop(scheduled_sounds)
+        try: start_voice(sound)
+        except Exception as exception:
+            logging.error("Audio: Exception in mixer thread - Reported exception: "+str(exception))
+    return()
+
+###############################################################################################
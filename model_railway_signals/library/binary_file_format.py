@@ -0,0 +1,179 @@
+#-------------------------------------------------------------------------------------------------
+# This module provides a compact binary format for the layout state ('.sig') files - as an
+# alternative to the default 'human readable' json format for very large layouts. The format is
+# self-describing (the schema from 'file_interface.get_sig_file_config' is written into the file
+# header) so files remain readable if item elements are added/removed in future versions.
+#
+# The items for each layout element are stored "column by column" (all the values of one item
+# element for all the items together) so that each column can be decoded in a single operation
+# (rather than field by field for each item in the python interpreter) - this means files load
+# at about the same speed as the json format (where the decoding is implemented in C code).
+#
+# File Layout (all multi-byte integers are little-endian):
+#    Header      - Magic bytes "MRSB", format version (1 byte), number of layout elements (1 byte)
+#    For each layout element (e.g. "signals", "points" etc):
+#       Name     - String (1 byte length + UTF-8)
+#       Schema   - Number of item elements (1 byte), then for each item element the name (1 byte
+#                  length + UTF-8) and the type (1 byte - 0 = bool, 1 = enum, 2 = str)
+#       Items    - Number of items (4 bytes), then the Item IDs (as a string column) followed by
+#                  a column for each item element (in the order defined by the schema):
+#                     Bools   - packed as 2 bit fields, 4 items per byte (0 = False, 1 = True, 2 = None)
+#                     Enums   - 1 byte per item (255 = None)
+#                     Strings - 1 byte per item (0 = String, 1 = None), then the total length of
+#                               the strings in bytes (4 bytes) and the strings separated by a
+#                               NULL character as a single UTF-8 block (None values are empty)
+#-------------------------------------------------------------------------------------------------
+
+import itertools
+import struct
+
+#-------------------------------------------------------------------------------------------------
+# Global definitions for the binary file format
+#-------------------------------------------------------------------------------------------------
+
+file_magic = b"MRSB"
+file_version = 2
+element_types = {"bool":0, "enum":1, "str":2}
+enum_none_value = 255
+str_separator = "\x00"
+
+# Lookup table to convert the stored bytes into the enum values
+enum_values = tuple(range(enum_none_value)) + (None,)
+
+# Lookup table to unpack a byte of packed bools (4 x 2 bit fields) into the four values
+bool_field_values = (False, True, None, None)
+bool_lookup_table = [tuple(bool_field_values[(packed_byte >> (index * 2)) & 0x03] for index in range(4))
+                                                                for packed_byte in range(256)]
+
+#-------------------------------------------------------------------------------------------------
+# Function to test whether the contents of a file are in the binary format (or json)
+#-------------------------------------------------------------------------------------------------
+
+def is_binary_format(file_contents:bytes):
+    return(file_contents[:len(file_magic)] == file_magic)
+
+#-------------------------------------------------------------------------------------------------
+# Internal functions for encoding the basic types
+#-------------------------------------------------------------------------------------------------
+
+def encode_short_string(value:str):
+    encoded_value = value.encode("utf-8")
+    if len(encoded_value) > 255: raise ValueError("String too long for binary format: "+value)
+    return(bytes((len(encoded_value),)) + encoded_value)
+
+def encode_string_column(values:list):
+    strings = ["" if value is None else str(value) for value in values]
+    encoded_strings = str_separator.join(strings).encode("utf-8")
+    if encoded_strings.count(str_separator.encode("utf-8")) != max(len(strings)-1, 0):
+        raise ValueError("Strings containing NULL characters are not supported by the binary format")
+    none_flags = bytes([value is None for value in values])
+    return(none_flags + struct.pack("<I",len(encoded_strings)) + encoded_strings)
+
+def encode_bool_column(values:list):
+    fields = [2 if value is None else 1 if value is True else 0 for value in values]
+    fields.extend([0] * (-len(fields) % 4))
+    return(bytes([fields[index] | (fields[index+1] << 2) | (fields[index+2] << 4) | (fields[index+3] << 6)
+                                                    for index in range(0, len(fields), 4)]))
+
+#-------------------------------------------------------------------------------------------------
+# Function to encode a layout state snapshot (in the form returned by 'take_layout_state_snapshot'
+# - {layout_element: [(item_id, [(name, value),]),]}) into the binary format. The schema for each
+# layout element is the 'layout_elements' returned by 'file_interface.get_sig_file_config'
+#-------------------------------------------------------------------------------------------------
+
+def encode_layout_state(snapshot:dict, layout_elements:dict):
+    output = [file_magic, bytes((file_version, len(layout_elements)))]
+    for layout_element, element_config in layout_elements.items():
+        schema = element_config["elements"]
+        output.append(encode_short_string(layout_element))
+        output.append(bytes((len(schema),)))
+        for element_name, element_type in schema:
+            output.append(encode_short_string(element_name))
+            output.append(bytes((element_types[element_type],)))
+        items = snapshot.get(layout_element, [])
+        output.append(struct.pack("<I",len(items)))
+        output.append(encode_string_column([str(item_id) for item_id, item_elements in items]))
+        item_values = [dict(item_elements) for item_id, item_elements in items]
+        for element_name, element_type in schema:
+            values = [item.get(element_name) for item in item_values]
+            if element_type == "bool": output.append(encode_bool_column(values))
+            elif element_type == "enum": output.append(bytes([enum_none_value if value is None else value for value in values]))
+            else: output.append(encode_string_column(values))
+    return(b"".join(output))
+
+#-------------------------------------------------------------------------------------------------
+# Internal function to decode a string column - returns the list of values and the new position
+#-------------------------------------------------------------------------------------------------
+
+def decode_string_column(data:bytes, position:int, number_of_items:int):
+    none_flags = data[position:position+number_of_items]
+    position = position + number_of_items
+    encoded_length = struct.unpack_from("<I", data, position)[0]
+    position = position + 4
+    values = data[position:position+encoded_length].decode("utf-8").split(str_separator)
+    position = position + encoded_length
+    if number_of_items == 0: values = []
+    elif 1 in none_flags: values = [None if none_flag else value for value, none_flag in zip(values, none_flags)]
+    return(values, position)
+
+#-------------------------------------------------------------------------------------------------
+# Function to decode the binary format into the same dictionary structure as the json format
+# ({"layout_element": {"item_id": {"element_name": value}}}) - raises a ValueError if the file
+# is not a valid binary format file (or is a version other than the one we support)
+#-------------------------------------------------------------------------------------------------
+
+def decode_layout_state(file_contents:bytes):
+    if not is_binary_format(file_contents): raise ValueError("Not a binary layout state file")
+    data = bytes(file_contents)
+    version = data[4]
+    if version != file_version: raise ValueError("Unsupported binary file version "+str(version))
+    number_of_layout_elements = data[5]
+    position = 6
+    layout_state = {"info": "Model Railway Signalling State File"}
+    for layout_element_index in range(number_of_layout_elements):
+        length = data[position]
+        layout_element = data[position+1:position+1+length].decode("utf-8")
+        position = position + 1 + length
+        schema = []
+        number_of_elements = data[position]
+        position = position + 1
+        for element_index in range(number_of_elements):
+            length = data[position]
+            element_name = data[position+1:position+1+length].decode("utf-8")
+            position = position + 1 + length
+            schema.append((element_name, data[position]))
+            position = position + 1
+        number_of_items = struct.unpack_from("<I", data, position)[0]
+        position = position + 4
+        layout_state[layout_element], position = decode_items(data, position, schema, number_of_items)
+    return(layout_state)
+
+#-------------------------------------------------------------------------------------------------
+# Internal function to decode the items for a layout element (stored column by column). Each
+# column is converted into a list of values in one operation and the item dictionaries are
+# then built from the columns. Returns the items and the new position
+#-------------------------------------------------------------------------------------------------
+
+def decode_items(data:bytes, position:int, schema:list, number_of_items:int):
+    item_ids, position = decode_string_column(data, position, number_of_items)
+    columns = []
+    for element_name, element_type in schema:
+        if element_type == element_types["bool"]:
+            column_bytes = (number_of_items + 3) // 4
+            values = list(itertools.chain.from_iterable(map(bool_lookup_table.__getitem__, data[position:position+column_bytes])))
+            columns.append(values[:number_of_items])
+            position = position + column_bytes
+        elif element_type == element_types["enum"]:
+            columns.append(list(map(enum_values.__getitem__, data[position:position+number_of_items])))
+            position = position + number_of_items
+        else:
+            values, position = decode_string_column(data, position, number_of_items)
+            columns.append(values)
+    # The item dictionaries are built from the rows of the columns using 'map' and 'zip' - so
+    # the loop over the items is made in C code rather than in the python interpreter
+    element_names = [element_name for element_name, element_type in schema]
+    if len(columns) == 0: item_states = [{} for item_id in item_ids]
+    else: item_states = map(dict, map(zip, itertools.repeat(element_names), zip(*columns)))
+    return(dict(zip(item_ids, item_states)), position)
+
+###################################################################################################
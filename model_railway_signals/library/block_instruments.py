@@ -28,6 +28,21 @@
 #                           the local schematic), or a string representing a Block Instrument 
 #                           running on a remote node - see MQTT networking (default = None)
 # 
+# create_block_instruments - Creates (and links) a number of Block Instruments in one go. Once all the
+#           instruments have been created, the links between the local instruments are checked (a
+#           warning is logged for any instrument whose linked instrument doesn't exist or isn't
+#           linked back to it) and the repeater indicators of the linked instruments are updated
+#           to reflect the (loaded) state of the instruments they are linked to
+#   Mandatory Parameters:
+#       Canvas - The Tkinter Drawing canvas on which the instruments are to be displayed
+#       instrument_definitions:[dict,] - A dictionary for each instrument to create - the keys are
+#           the parameters for 'create_block_instrument' (e.g. {"block_id":1, "x":100, "y":200,
+#           "linked_to":2}). 'block_id', 'x' and 'y' are mandatory - other parameters are optional
+#           (any definitions with missing or invalid parameters are logged and skipped)
+#   Optional Parameters:
+#       Any of the 'create_block_instrument' optional parameters - these are used as the defaults
+#           for all instruments (unless specified in the dictionary for an instrument)
+# 
 # Note that the Block Instruments feature is primarily intended to provide a prototypical means of
 # communication between signallers working their respective signal boxes. As such, MQTT networking
 # is "built in" - If a remote instrument identifier is specified for the "linked_to" instrument
@@ -40,6 +55,19 @@
 #           This can be used to implement full interlocking of the Starter signal in our section
 #           (i.e. signal locked at danger until the box ahead sets their instrument to LINE-CLEAR)
 #           Returned state is: True = LINE-CLEAR, False = LINE-BLOCKED or TRAIN-ON-LINE
+# 
+# send_bell_code - Sends a complete bell code (e.g. "3-1" - Is line clear for a stopping passenger
+#           train) from a block instrument. The telegraph key is "tapped" locally with the correct
+#           timing and the code is sent to the linked instrument (as a single MQTT message for a
+#           remote instrument) - where it is played back on the bell with the same timing
+#   Mandatory Parameters:
+#       block_id:int - The local block instrument sending the bell code
+#       bell_code:str - The bell code - the number of beats in each group separated by '-'
+#           (e.g. "1", "2-1" or "3-1-1"). Each group can have between 1 and 9 beats
+# 
+# set_audio_voices(max_voices:int) - Sets the maximum number of sounds (bell rings and telegraph
+#           key clicks) that can be played at the same time (the default is 8 voices). If all the
+#           voices are in use when a new sound is due then the oldest sound is stopped to make way
 #
 #
 # If you want to use Block Instruments with full sound enabled (bell rings and telegraph key sounds)
@@ -52,26 +80,14 @@
 from . import common
 from . import mqtt_interface
 from . import file_interface
+from . import network_snapshots
+from . import event_recorder
+from . import callback_profiler
+from . import audio_mixer
 from tkinter import *
 from typing import Union
 import enum
 import logging
-import importlib.resources
-
-# We can only use audio for the block instruments if 'simpleaudio' is installed
-# Although this package is supported across different platforms, for Windows
-# it has a dependency on Visual C++ 14.0. As this is quite a faff to install I
-# haven't made audio a hard and fast dependency for the 'model_railway_signals'
-# pack age as a whole - its up to the user to install if required
-
-def is_simpleaudio_installed():
-    global simpleaudio
-    try:
-        import simpleaudio
-        return (True)
-    except Exception: pass
-    return (False)
-audio_enabled = is_simpleaudio_installed()
 
 # -------------------------------------------------------------------------
 # Classes used by external functions when calling the create_point function
@@ -92,6 +108,58 @@ instruments = {}
 
 bell_code_hints_open = False
 
+# --------------------------------------------------------------------------------
+# The minimum time between bell rings on an instrument (in seconds)
+# --------------------------------------------------------------------------------
+
+bell_ring_gap = 0.15
+
+# --------------------------------------------------------------------------------
+# The block instrument "state machine". The states (held in 'sectionstate' and
+# 'repeaterstate') are None = LINE BLOCKED, True = LINE CLEAR, False = TRAIN ON LINE
+# The valid transitions for the local instrument buttons are defined below - note
+# that LINE CLEAR can't be given whilst the instrument is showing TRAIN ON LINE (the
+# instrument must be returned to LINE BLOCKED first). State changes made by the linked
+# instrument, layout checkpoints or loaded layout state are always applied
+# --------------------------------------------------------------------------------
+
+state_names = {None:"LINE BLOCKED", True:"LINE CLEAR", False:"TRAIN ON LINE"}
+valid_button_transitions = {None: (True, False), True: (None, False), False: (None,)}
+
+# Precomputed "render descriptors" for each state - the button options and the
+# indicator drawing objects to show (applied only where they differ from those displayed)
+# The button descriptors are computed when the first instrument is created (as they use
+# the colours defined in the common module - which may not have been imported as yet)
+section_button_render: dict = {}
+
+def create_section_button_render():
+    for state in (None, True, False):
+        section_button_render[state] = {}
+        for button_key, button_state in (("blockbutton",None), ("clearbutton",True), ("occupbutton",False)):
+            if button_state == state: options = {"relief":"sunken", "bg":common.bgsunken}
+            else: options = {"relief":"raised", "bg":common.bgraised}
+            section_button_render[state][button_key] = options
+    return()
+
+button_state_render = {
+    "normal":   {"blockbutton": {"state":"normal"}, "clearbutton": {"state":"normal"}, "occupbutton": {"state":"normal"} },
+    "disabled": {"blockbutton": {"state":"disabled"}, "clearbutton": {"state":"disabled"}, "occupbutton": {"state":"disabled"} } }
+
+indicator_render = {
+    None:  {"indicatorblock":"normal", "indicatorclear":"hidden", "indicatoroccup":"hidden"},
+    True:  {"indicatorblock":"hidden", "indicatorclear":"normal", "indicatoroccup":"hidden"},
+    False: {"indicatorblock":"hidden", "indicatorclear":"hidden", "indicatoroccup":"normal"} }
+
+# --------------------------------------------------------------------------------
+# The timing for bell codes (in seconds) - the interval between the beats within a group
+# and the pause between the groups of beats (e.g. between the 3 and the 1 of a 3-1 code)
+# --------------------------------------------------------------------------------
+
+bell_beat_interval = 0.25
+bell_group_pause = 0.9
+max_bell_code_beats = 32
+max_bell_code_duration = 30.0
+
 # -------------------------------------------------------------------------
 # The default "External" callback for Block Instruments if one isn't specified
 # -------------------------------------------------------------------------
@@ -159,6 +227,24 @@ def open_bell_code_hints():
 def instrument_exists(block_id:int):
     return (str(block_id) in instruments.keys() )
 
+# --------------------------------------------------------------------------------
+# Internal Function to validate a state change requested by a button push event
+# (re-selecting the current state is always valid - to re-render the buttons)
+# --------------------------------------------------------------------------------
+
+def button_transition_valid(block_id:int, new_state:Union[bool,None]):
+    global logging
+    current_state = instruments[str(block_id)]["sectionstate"]
+    if current_state == new_state or new_state in valid_button_transitions[current_state]:
+        transition_valid = True
+    else:
+        logging.warning ("Block Instrument "+str(block_id)+": Can't change from "+state_names[current_state]+
+                    " to "+state_names[new_state]+" - Instrument must be returned to LINE BLOCKED first")
+        # Restore the buttons (the button that was clicked won't have changed its relief)
+        render_instrument_buttons(block_id, section_button_render[current_state])
+        transition_valid = False
+    return(transition_valid)
+
 # --------------------------------------------------------------------------------
 # Callbacks for handling button push events
 # --------------------------------------------------------------------------------
@@ -166,37 +252,39 @@ def instrument_exists(block_id:int):
 def occup_button_event (block_id:int):
     global logging
     logging.info ("Block Instrument "+str(block_id)+": Occup button event *****************************************")
-    set_section_occupied(block_id)
+    event_recorder.record_input_event("instrument_occup_button",block_id)
+    if button_transition_valid(block_id, False): set_section_occupied(block_id)
     return()
 
 def clear_button_event (block_id:int):
     global logging
     logging.info ("Block Instrument "+str(block_id)+": Clear button event *****************************************")
-    set_section_clear(block_id)
+    event_recorder.record_input_event("instrument_clear_button",block_id)
+    if button_transition_valid(block_id, True): set_section_clear(block_id)
     return()
 
 def blocked_button_event (block_id:int):
     global logging
     logging.info ("Block Instrument "+str(block_id)+": Blocked button event ***************************************")
-    set_section_blocked(block_id)
+    event_recorder.record_input_event("instrument_blocked_button",block_id)
+    if button_transition_valid(block_id, None): set_section_blocked(block_id)
     return()
 
 def telegraph_key_button (block_id:int):
     global logging
     logging.debug ("Block Instrument "+str(block_id)+": Telegraph key operated ************************************")
+    event_recorder.record_input_event("instrument_telegraph_key",block_id)
     # Provide a visual indication of the key being pressed
     instruments[str(block_id)]["bellbutton"].config(relief="sunken")
     common.root_window.after(10,lambda:instruments[str(block_id)]["bellbutton"].config(relief="raised"))
-    # Sound the "clack" of the telegraph key - We put exception handling around this as the function can raise
-    # exceptions if you try to play too many sounds simultaneously (if the button is clicked too quickly/frequently)
+    # Sound the "clack" of the telegraph key (the sound is played by the audio mixer thread)
     if instruments[str(block_id)]["telegraphsound"] is not None:
-        try: instruments[str(block_id)]["telegraphsound"].play()
-        except: pass
+        audio_mixer.play_sound(instruments[str(block_id)]["telegraphsound"])
     # If linked to another instrument then call the function to ring the bell on the other instrument or
     # Publish the "bell ring event" to the broker (for other nodes to consume). Note that events will only
     # be published if the MQTT interface has been configured and we are connected to the broker
     if instruments[str(block_id)]["linkedto"] is not None:
-        if isinstance(instruments[str(block_id)]["linkedto"],str): send_mqtt_ring_section_bell_event(block_id)
+        if instruments[str(block_id)]["remotelink"]: send_mqtt_ring_section_bell_event(block_id)
         else: ring_section_bell(instruments[str(block_id)]["linkedto"])
     return()
 
@@ -208,234 +296,217 @@ def telegraph_key_button (block_id:int):
 def ring_section_bell (block_id:int):
     global logging
     logging.debug ("Block Instrument "+str(block_id)+": Ringing Bell")
-    # Provide a visual indication of an incoming bell
-    instruments[str(block_id)]["bellbutton"].config(bg="yellow")
-    common.root_window.after(100,lambda:instruments[str(block_id)]["bellbutton"].config(bg="black"))
-    # Sound the Bell - We put exception handling around this as I've seen this function raise exceptions
-    # if you try to play too many sounds simultaneously (if the button is clicked too quickly/frequently)
+    # Sound the Bell (the sound is played by the audio mixer thread). The bell rings for each instrument
+    # are serialised with a minimum gap between them so a burst of rings (e.g. a bell code received via
+    # the MQTT network) is still played as individual, distinct rings
     if instruments[str(block_id)]["bellsound"] is not None:
-        try: instruments[str(block_id)]["bellsound"].play()
-        except: pass
+        start_delay = audio_mixer.play_sound(instruments[str(block_id)]["bellsound"], channel=block_id, channel_gap=bell_ring_gap)
+    else:
+        start_delay = 0.0
+    # Provide a visual indication of the incoming bell (at the same time as the ring is sounded)
+    if start_delay > 0.0: common.root_window.after(int(start_delay*1000), lambda:flash_section_bell(block_id))
+    else: flash_section_bell(block_id)
     return()
 
 # --------------------------------------------------------------------------------
-# Function to set the repeater indicator (linked to another block section)
-# to BLOCKED - if its a single line instrument then we set the main indication
+# Internal Function to convert a bell code (e.g. "3-1") into the timings for each beat
+# (in seconds from the start of the code). Returns None if the bell code is not valid
 # --------------------------------------------------------------------------------
 
-def set_repeater_blocked (block_id:int,make_callback:bool=True):
-    global instruments
+def bell_code_timings (bell_code:str):
+    timings = []
+    time_offset = 0.0
+    for group in bell_code.replace(" ","").split("-"):
+        if not group.isdigit() or int(group) < 1 or int(group) > 9: return(None)
+        for beat in range(int(group)):
+            timings.append(round(time_offset,3))
+            time_offset = time_offset + bell_beat_interval
+        time_offset = time_offset - bell_beat_interval + bell_group_pause
+    return(timings)
+
+# --------------------------------------------------------------------------------
+# Public API Function to send a complete bell code from a block instrument
+# --------------------------------------------------------------------------------
+
+def send_bell_code (block_id:int, bell_code:str):
     global logging
-    # do some basic validation on the block ID we've been given
+    timings = bell_code_timings(str(bell_code))
     if not instrument_exists(block_id):
-        logging.error ("Block Instrument "+str(block_id)+": Can't set repeater to LINE BLOCKED - Block instrument doesn't exist")
-    elif instruments[str(block_id)]["singleline"]:
-        # If this is a single line instrument then we need to change the main instrument state
-        # We need to inhibit the update of the linked instrument in this call to prevent recursion
-        set_section_blocked(block_id,update_remote_instrument=False)
-        # As the change was initiated by a remote instrument we disable the local instrument
-        # buttons until the remote instrument has changed back to LINE BLOCKED
-        instruments[str(block_id)]["blockbutton"].config(state="normal")
-        instruments[str(block_id)]["clearbutton"].config(state="normal")
-        instruments[str(block_id)]["occupbutton"].config(state="normal")
-    elif instruments[str(block_id)]["repeaterstate"] is not None:
-        logging.info ("Block Instrument "+str(block_id)+": Changing block section repeater to LINE BLOCKED")
-        # Set the internal repeater state and the repeater indicator to BLOCKED
-        instruments[str(block_id)]["repeaterstate"] = None
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatoroccup"],state = "hidden")
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatorclear"],state = "hidden")
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatorblock"],state = "normal")
-    # Make an external callback (if one was specified) to notify that the block section AHEAD has been updated
-    # This enables full block section interlocking to be implemented for the starter signal in OUR block section
-    if make_callback: instruments[str(block_id)]["extcallback"] (block_id,block_callback_type.block_section_ahead_updated)
-    return ()
+        logging.error ("Block Instrument "+str(block_id)+": send_bell_code - Block instrument doesn't exist")
+    elif timings is None or len(timings) > max_bell_code_beats:
+        logging.error ("Block Instrument "+str(block_id)+": send_bell_code - Invalid bell code '"+str(bell_code)+"'")
+    else:
+        logging.info ("Block Instrument "+str(block_id)+": Sending bell code '"+str(bell_code)+"'")
+        # Sound the "clacks" of the telegraph key with the same timing as the bell code (serialised
+        # for each instrument so codes sent in quick succession don't overlap) and provide a visual
+        # indication of the key being pressed to match the sounds
+        telegraph_sound = instruments[str(block_id)]["telegraphsound"]
+        start_delay = audio_mixer.play_sound_sequence([(telegraph_sound, timing) for timing in timings],
+                                    channel=("telegraph",block_id), channel_gap=bell_group_pause)
+        for timing in timings:
+            common.root_window.after(int((start_delay+timing)*1000), lambda:press_telegraph_key(block_id))
+        # If linked to another instrument then call the function to ring the bell code on the other
+        # instrument or Publish the bell code to the broker (for other nodes to consume) as a single
+        # event. Note that events will only be published if the MQTT interface has been configured
+        if instruments[str(block_id)]["linkedto"] is not None:
+            if instruments[str(block_id)]["remotelink"]:
+                send_mqtt_ring_section_bell_event(block_id, bell_code=str(bell_code), timings=timings)
+            else: ring_bell_code(instruments[str(block_id)]["linkedto"], timings)
+    return()
 
 # --------------------------------------------------------------------------------
-# Function to set the repeater indicator (linked to another block section)
-# to LINE CLEAR - if its a single line instrument then we set the main indication
+# Internal Function to provide a visual indication of the telegraph key being pressed
 # --------------------------------------------------------------------------------
 
-def set_repeater_clear (block_id:int,make_callback:bool=True):
-    global instruments
+def press_telegraph_key (block_id:int):
+    if instrument_exists(block_id) and not common.shutdown_initiated:
+        instruments[str(block_id)]["bellbutton"].config(relief="sunken")
+        common.root_window.after(10,lambda:instruments[str(block_id)]["bellbutton"].config(relief="raised"))
+    return()
+
+# --------------------------------------------------------------------------------
+# Internal Function to receive a bell code from another instrument and play it back on the bell
+# of the local instrument (the beats are scheduled by the audio mixer so the spacing is accurate
+# and doesn't depend on the timing of the network events) with matching visual indications
+# --------------------------------------------------------------------------------
+
+def ring_bell_code (block_id:int, timings:list):
     global logging
-    # do some basic validation on the block ID we've been given
-    if not instrument_exists (block_id):
-        logging.error ("Block Instrument "+str(block_id)+": Can't set repeater to LINE CLEAR - Block instrument doesn't exist")
-    elif instruments[str(block_id)]["singleline"]:
-        # If this is a single line instrument then we need to change the main instrument state
-        # We need to inhibit the update of the linked instrument in this call to prevent recursion
-        set_section_clear(block_id,update_remote_instrument=False)
-        # As the change was initiated by a remote instrument we disable the local instrument
-        # buttons until the remote instrument has changed back to LINE BLOCKED
-        instruments[str(block_id)]["blockbutton"].config(state="disabled")
-        instruments[str(block_id)]["clearbutton"].config(state="disabled")
-        instruments[str(block_id)]["occupbutton"].config(state="disabled")
-    elif instruments[str(block_id)]["repeaterstate"] != True:
-        logging.info ("Block Instrument "+str(block_id)+": Changing block section repeater to LINE CLEAR")
-        # Set the internal repeater state and the repeater indicator to CLEAR
-        instruments[str(block_id)]["repeaterstate"] = True
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatoroccup"],state = "hidden")
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatorclear"],state = "normal")
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatorblock"],state = "hidden")
-    # Make an external callback (if one was specified) to notify that the block section AHEAD has been updated
-    # This enables full block section interlocking to be implemented for the starter signal in OUR block section
-    if make_callback: instruments[str(block_id)]["extcallback"] (block_id,block_callback_type.block_section_ahead_updated)
-    return ()
+    logging.debug ("Block Instrument "+str(block_id)+": Ringing bell code ("+str(len(timings))+" beats)")
+    bell_sound = instruments[str(block_id)]["bellsound"]
+    start_delay = audio_mixer.play_sound_sequence([(bell_sound, timing) for timing in timings],
+                                            channel=block_id, channel_gap=bell_group_pause)
+    for timing in timings:
+        common.root_window.after(int((start_delay+timing)*1000), lambda:flash_section_bell(block_id))
+    return()
+
+def flash_section_bell (block_id:int):
+    if instrument_exists(block_id) and not common.shutdown_initiated:
+        instruments[str(block_id)]["bellbutton"].config(bg="yellow")
+        common.root_window.after(100,lambda:instruments[str(block_id)]["bellbutton"].config(bg="black"))
+    return()
 
 # --------------------------------------------------------------------------------
-# Function to set the repeater indicator (linked to another block section)
-# to OCCUPIED - if its a single line instrument then we set the main indication
+# Internal functions to render the buttons and indicators of an instrument from the
+# precomputed descriptors (above). The displayed configuration is cached for each
+# instrument so only the options / drawing objects that have changed are updated
 # --------------------------------------------------------------------------------
 
-def set_repeater_occupied (block_id:int,make_callback:bool=True):
+def render_instrument_buttons (block_id:int, button_render:dict):
+    instrument = instruments[str(block_id)]
+    for button_key, options in button_render.items():
+        displayed = instrument["displayed"][button_key]
+        changed_options = {}
+        for option, value in options.items():
+            if displayed.get(option) != value: changed_options[option] = value
+        if changed_options:
+            instrument[button_key].config(**changed_options)
+            displayed.update(changed_options)
+    return()
+
+def render_instrument_indicator (block_id:int, indicator:str, state:Union[bool,None]):
+    instrument = instruments[str(block_id)]
+    for item_key, item_state in indicator_render[state].items():
+        if instrument["displayed"][indicator+item_key] != item_state:
+            instrument["canvas"].itemconfigure(instrument[indicator+item_key], state=item_state)
+            instrument["displayed"][indicator+item_key] = item_state
+    return()
+
+# --------------------------------------------------------------------------------
+# Internal Function to change the repeater indicator (linked to another block section)
+# if its a single line instrument then we change the main indication (and the buttons
+# are disabled whilst the linked instrument is not at LINE BLOCKED)
+# --------------------------------------------------------------------------------
+
+def change_repeater_state (block_id:int, new_state:Union[bool,None], make_callback:bool=True):
     global instruments
     global logging
     # do some basic validation on the block ID we've been given
-    if not instrument_exists (block_id):
-        logging.error ("Block Instrument "+str(block_id)+": Can't set repeater to TRAIN ON LINE - Block instrument doesn't exist")
-    elif instruments[str(block_id)]["singleline"]:
+    if not instrument_exists(block_id):
+        logging.error ("Block Instrument "+str(block_id)+": Can't set repeater to "+state_names[new_state]+
+                                                                        " - Block instrument doesn't exist")
+        return()
+    instrument = instruments[str(block_id)]
+    if instrument["singleline"]:
         # If this is a single line instrument then we need to change the main instrument state
         # We need to inhibit the update of the linked instrument in this call to prevent recursion
-        set_section_occupied(block_id,update_remote_instrument=False)
+        change_section_state(block_id, new_state, update_remote_instrument=False)
         # As the change was initiated by a remote instrument we disable the local instrument
         # buttons until the remote instrument has changed back to LINE BLOCKED
-        instruments[str(block_id)]["blockbutton"].config(state="disabled")
-        instruments[str(block_id)]["clearbutton"].config(state="disabled")
-        instruments[str(block_id)]["occupbutton"].config(state="disabled")
-    elif instruments[str(block_id)]["repeaterstate"] != False:
-        logging.info ("Block Instrument "+str(block_id)+": Changing block section repeater to TRAIN ON LINE")
-        # Set the internal repeater state and the repeater indicator to OCCUPIED
-        instruments[str(block_id)]["repeaterstate"] = False
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatoroccup"],state = "normal")
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatorclear"],state = "hidden")
-        instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["repeatindicatorblock"],state = "hidden")
+        if new_state is None: render_instrument_buttons(block_id, button_state_render["normal"])
+        else: render_instrument_buttons(block_id, button_state_render["disabled"])
+    elif instrument["repeaterstate"] != new_state:
+        logging.info ("Block Instrument "+str(block_id)+": Changing block section repeater to "+state_names[new_state])
+        # Set the internal repeater state and the repeater indicator
+        instrument["repeaterstate"] = new_state
+        file_interface.record_state_change("instruments",block_id)
+        render_instrument_indicator(block_id, "repeat", new_state)
     # Make an external callback (if one was specified) to notify that the block section AHEAD has been updated
     # This enables full block section interlocking to be implemented for the starter signal in OUR block section
-    if make_callback: instruments[str(block_id)]["extcallback"] (block_id,block_callback_type.block_section_ahead_updated)
+    if make_callback: instrument["extcallback"] (block_id,block_callback_type.block_section_ahead_updated)
     return ()
 
-# --------------------------------------------------------------------------------
-# Internal Function to set the main block section indicator to BLOCKED
-# called when the "BLOCKED" button is clicked on the local block instrument
-# Also called for single-line block instruments (without a repeater display)
-# following a state change of the linked remote block instrument
-# --------------------------------------------------------------------------------
+def set_repeater_blocked (block_id:int,make_callback:bool=True):
+    change_repeater_state(block_id, None, make_callback)
+    return()
 
-def set_section_blocked (block_id:int,update_remote_instrument:bool=True):
-    global instruments
-    global logging
-    # do some basic validation on the block ID we've been given
-    if not instrument_exists (block_id):
-        logging.error ("Block Instrument "+str(block_id)+": Can't set section to LINE BLOCKED - Block instrument doesn't exist")
-    else:
-        # Set the state of the buttons accordingly. We always do this (even if the state hasn't changed)
-        # to deal with single line instruments being updated by a state change of the linked instrument
-        instruments[str(block_id)]["blockbutton"].config(relief="sunken")
-        instruments[str(block_id)]["blockbutton"].config(bg=common.bgsunken)
-        instruments[str(block_id)]["clearbutton"].config(relief="raised")
-        instruments[str(block_id)]["clearbutton"].config(bg=common.bgraised)
-        instruments[str(block_id)]["occupbutton"].config(relief="raised")
-        instruments[str(block_id)]["occupbutton"].config(bg=common.bgraised)
-        # Everything else is only processed on a state change
-        if instruments[str(block_id)]["sectionstate"] is not None:
-            logging.info ("Block Instrument "+str(block_id)+": Changing block section indicator to LINE BLOCKED")
-            # Set the internal state of the block instrument
-            instruments[str(block_id)]["sectionstate"] = None
-            # The repeater state is always the same as the main state for single line instruments
-            if instruments[str(block_id)]["singleline"]: instruments[str(block_id)]["repeaterstate"] = None
-            # Set the local block indication to reflect the state that has been set locally
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatoroccup"],state = "hidden")
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatorclear"],state = "hidden")
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatorblock"],state = "normal")
-            # If linked to another instrument then update the repeater indicator on the other instrument or
-            # Publish the initial state to the broker (for other nodes to consume). Note that state will only
-            # be published if the MQTT interface has been configured and we are connected to the broker
-            if update_remote_instrument and instruments[str(block_id)]["linkedto"] is not None:
-                if isinstance(instruments[str(block_id)]["linkedto"],str): send_mqtt_instrument_updated_event(block_id)
-                else: set_repeater_blocked(instruments[str(block_id)]["linkedto"])
-    return ()
+def set_repeater_clear (block_id:int,make_callback:bool=True):
+    change_repeater_state(block_id, True, make_callback)
+    return()
+
+def set_repeater_occupied (block_id:int,make_callback:bool=True):
+    change_repeater_state(block_id, False, make_callback)
+    return()
 
 # --------------------------------------------------------------------------------
-# Internal Function to set the main block section indicator to CLEAR
-# called when the "CLEAR" button is clicked on the local block instrument
-# Also called for single-line block instruments (without a repeater display)
-# following a state change of the linked remote block instrument
+# Internal Function to change the main block section indicator - called when the
+# buttons are clicked on the local block instrument. Also called for single-line
+# block instruments (without a repeater display) following a state change of the
+# linked remote block instrument
 # --------------------------------------------------------------------------------
 
-def set_section_clear (block_id:int,update_remote_instrument:bool=True):
+def change_section_state (block_id:int, new_state:Union[bool,None], update_remote_instrument:bool=True):
     global instruments
     global logging
     # do some basic validation on the block ID we've been given
     if not instrument_exists (block_id):
-        logging.error ("Block Instrument "+str(block_id)+": Can't set section to LINE CLEAR - Block instrument doesn't exist")
-    else:
-        # Set the state of the buttons accordingly. We always do this (even if the state hasn't changed)
-        # to deal with single line instruments being updated by a state change of the linked instrument
-        instruments[str(block_id)]["blockbutton"].config(relief="raised")
-        instruments[str(block_id)]["blockbutton"].config(bg=common.bgraised)
-        instruments[str(block_id)]["clearbutton"].config(relief="sunken")
-        instruments[str(block_id)]["clearbutton"].config(bg=common.bgsunken)
-        instruments[str(block_id)]["occupbutton"].config(relief="raised")
-        instruments[str(block_id)]["occupbutton"].config(bg=common.bgraised)
-        # Everything else is only processed on a state change
-        if instruments[str(block_id)]["sectionstate"] != True:
-            logging.info ("Block Instrument "+str(block_id)+": Changing block section indicator to LINE CLEAR")
-            # Set the internal state of the block instrument
-            instruments[str(block_id)]["sectionstate"] = True
-            # The repeater state is always the same as the main state for single line instruments
-            if instruments[str(block_id)]["singleline"]: instruments[str(block_id)]["repeaterstate"] = True
-            # Set the local block indication to reflect the state that has been set locally
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatoroccup"],state = "hidden")
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatorclear"],state = "normal")
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatorblock"],state = "hidden")
-            # If linked to another instrument then update the repeater indicator on the other instrument or
-            # Publish the initial state to the broker (for other nodes to consume). Note that state will only
-            # be published if the MQTT interface has been configured and we are connected to the broker
-            if update_remote_instrument and instruments[str(block_id)]["linkedto"] is not None:
-                if isinstance(instruments[str(block_id)]["linkedto"],str): send_mqtt_instrument_updated_event(block_id)
-                else: set_repeater_clear(instruments[str(block_id)]["linkedto"])
+        logging.error ("Block Instrument "+str(block_id)+": Can't set section to "+state_names[new_state]+
+                                                                        " - Block instrument doesn't exist")
+        return()
+    instrument = instruments[str(block_id)]
+    # Set the state of the buttons accordingly. We always do this (even if the state hasn't changed)
+    # to deal with single line instruments being updated by a state change of the linked instrument
+    # (only the button options that differ from those currently displayed are actually changed)
+    render_instrument_buttons(block_id, section_button_render[new_state])
+    # Everything else is only processed on a state change
+    if instrument["sectionstate"] != new_state:
+        logging.info ("Block Instrument "+str(block_id)+": Changing block section indicator to "+state_names[new_state])
+        # Set the internal state of the block instrument
+        instrument["sectionstate"] = new_state
+        # The repeater state is always the same as the main state for single line instruments
+        if instrument["singleline"]: instrument["repeaterstate"] = new_state
+        file_interface.record_state_change("instruments",block_id)
+        # Set the local block indication to reflect the state that has been set locally
+        render_instrument_indicator(block_id, "my", new_state)
+        # If linked to another instrument then update the repeater indicator on the other instrument or
+        # Publish the initial state to the broker (for other nodes to consume). Note that state will only
+        # be published if the MQTT interface has been configured and we are connected to the broker
+        if update_remote_instrument and instrument["linkedto"] is not None:
+            if instrument["remotelink"]: send_mqtt_instrument_updated_event(block_id)
+            else: change_repeater_state(instrument["linkedto"], new_state)
     return ()
 
-# --------------------------------------------------------------------------------
-# Internal Function to set the main block section indicator to OCCUPIED
-# called when the "OCCUP" button is clicked on the local block instrument
-# Also called for single-line block instruments (without a repeater display)
-# following a state change of the linked remote block instrument
-# --------------------------------------------------------------------------------
+def set_section_blocked (block_id:int,update_remote_instrument:bool=True):
+    change_section_state(block_id, None, update_remote_instrument)
+    return()
+
+def set_section_clear (block_id:int,update_remote_instrument:bool=True):
+    change_section_state(block_id, True, update_remote_instrument)
+    return()
 
 def set_section_occupied (block_id:int,update_remote_instrument:bool=True):
-    global instruments
-    global logging
-    # do some basic validation on the block ID we've been given
-    if not instrument_exists (block_id):
-        logging.error ("Block Instrument "+str(block_id)+": Can't set section to TRAIN ON LINE - Block instrument doesn't exist")
-    else:
-        # Set the state of the buttons accordingly. We always do this (even if the state hasn't changed)
-        # to deal with single line instruments being updated by a state change of the linked instrument
-        instruments[str(block_id)]["blockbutton"].config(relief="raised")
-        instruments[str(block_id)]["blockbutton"].config(bg=common.bgraised)
-        instruments[str(block_id)]["clearbutton"].config(relief="raised")
-        instruments[str(block_id)]["clearbutton"].config(bg=common.bgraised)
-        instruments[str(block_id)]["occupbutton"].config(relief="sunken")
-        instruments[str(block_id)]["occupbutton"].config(bg=common.bgsunken)
-        # Everything else is only processed on a state change
-        if instruments[str(block_id)]["sectionstate"] != False:
-            logging.info ("Block Instrument "+str(block_id)+": Changing block section indicator to TRAIN ON LINE")
-            # Set the internal state of the block instrument and the buttons accordingly. We always do
-            instruments[str(block_id)]["sectionstate"] = False
-            # The repeater state is always the same as the main state for single line instruments
-            if instruments[str(block_id)]["singleline"]: instruments[str(block_id)]["repeaterstate"] = False
-            # Set the local block indication to reflect the state that has been set locally
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatoroccup"],state = "normal")
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatorclear"],state = "hidden")
-            instruments[str(block_id)]["canvas"].itemconfigure(instruments[str(block_id)]["myindicatorblock"],state = "hidden")
-            # If linked to another instrument then update the repeater indicator on the other instrument or
-            # Publish the initial state to the broker (for other nodes to consume). Note that state will only
-            # be published if the MQTT interface has been configured and we are connected to the broker
-            if update_remote_instrument and instruments[str(block_id)]["linkedto"] is not None:
-                if isinstance(instruments[str(block_id)]["linkedto"],str): send_mqtt_instrument_updated_event(block_id)
-                else: set_repeater_occupied(instruments[str(block_id)]["linkedto"])
-    return ()
+    change_section_state(block_id, False, update_remote_instrument)
+    return()
 
 # --------------------------------------------------------------------------------
 # Internal function to create the Indicator component of a Block Instrument
@@ -466,11 +537,11 @@ def create_block_instrument (canvas,
                              telegraph_sound_file:str = "telegraph-key-01.wav",
                              linked_to:Union[int,str] = None):
     global instruments
-    global audio_enabled
     global logging
     logging.info ("Block Instrument "+str(block_id)+": Creating Block Instrument")
     # Find and store the root window (when the first block instrument is created)
     if common.root_window is None: common.find_root_window(canvas)
+    if not section_button_render: create_section_button_render()
     # Do some basic validation on the parameters we have been given
     if instrument_exists(block_id):
         logging.error ("Block Instrument "+str(block_id)+": Instrument already exists")
@@ -515,29 +586,23 @@ def create_block_instrument (canvas,
         else: rep_ind_block, rep_ind_clear, rep_ind_occup = create_block_indicator (canvas, x, y-55, block_id_tag)
         # Try to Load the specified audio files for the bell rings and telegraph key if audio is enabled
         # if these fail to load for any reason then no sounds will be produced on these events
-        if audio_enabled:
-            try:
-                with importlib.resources.path ('model_railway_signals.library.resources',bell_sound_file) as sound_file:
-                    bell_audio = simpleaudio.WaveObject.from_wave_file(str(sound_file))
-            except:
-                logging.error ("Block Instruments - Error loading bell audio file '"+str(bell_sound_file)+"'")       
-                bell_audio = None
-            try:
-                with importlib.resources.path ('model_railway_signals.library.resources',telegraph_sound_file) as sound_file:
-                    telegraph_audio = simpleaudio.WaveObject.from_wave_file(str(sound_file))
-            except:
-                logging.error ("Block Instruments - Error loading telegraph audio file '"+str(telegraph_sound_file)+"'")
-                telegraph_audio = None
+        # Note that the audio files are only loaded once and then shared by all instruments using them
+        if audio_mixer.audio_enabled:
+            bell_audio = audio_mixer.load_sound(bell_sound_file)
+            telegraph_audio = audio_mixer.load_sound(telegraph_sound_file)
         else:
             logging.warning ("Block Instruments - Audio is not enabled - To enable: 'python3 -m pip install simpleaudio'")
             bell_audio = None
             telegraph_audio = None
 
+        # Wrap the external callback so it can be profiled (see callback_profiler)
+        block_callback = callback_profiler.profile_callback(block_callback,"instrument_callback")
         # Create the dictionary of elements that we need to track
         instruments[str(block_id)] = {}
         instruments[str(block_id)]["canvas"] = canvas                         # Tkinter drawing canvas
         instruments[str(block_id)]["extcallback"] = block_callback            # External callback to make
         instruments[str(block_id)]["linkedto"] = linked_to                    # Id of the instrument this one is linked to
+        instruments[str(block_id)]["remotelink"] = isinstance(linked_to,str)  # Linked to an instrument on a remote node
         instruments[str(block_id)]["singleline"] = single_line                # Single line (bi-directional) instrument
         instruments[str(block_id)]["sectionstate"] = None                     # State of this instrument (None = "BLOCKED")
         instruments[str(block_id)]["repeaterstate"] = None                    # State of repeater display (None = "BLOCKED")
@@ -553,6 +618,13 @@ def create_block_instrument (canvas,
         instruments[str(block_id)]["repeatindicatorblock"] = rep_ind_block    # Tkinter Drawing object
         instruments[str(block_id)]["telegraphsound"] = telegraph_audio        # Sound file for the telegraph "clack"
         instruments[str(block_id)]["bellsound"] = bell_audio                  # Sound file for the bell "Ting"
+        # The button options and indicator states as currently displayed (as created above)
+        instruments[str(block_id)]["displayed"] = {"blockbutton": {"relief":"sunken", "bg":common.bgsunken, "state":"normal"},
+                                                   "clearbutton": {"relief":"raised", "bg":common.bgraised, "state":"normal"},
+                                                   "occupbutton": {"relief":"raised", "bg":common.bgraised, "state":"normal"},
+                                                   "myindicatorblock":"normal", "myindicatorclear":"hidden",
+                                                   "myindicatoroccup":"hidden", "repeatindicatorblock":"normal",
+                                                   "repeatindicatorclear":"hidden", "repeatindicatoroccup":"hidden"}
         # Get the initial state for the instrument (if layout state has been loaded)
         # if nothing has been loaded then the default state (of LINE BLOCKED) will be applied
         loaded_state = file_interface.get_initial_item_state("instruments",block_id)
@@ -571,11 +643,59 @@ def create_block_instrument (canvas,
         # compound identifier rather than an integer) then subscribe to updates from the remote node and
         # publish the initial state of the local instrument (to be picked up by the remote node). State
         # will only be published if the MQTT interface has been configured and we are connected to the broker
-        if isinstance(linked_to,str):
+        if instruments[str(block_id)]["remotelink"]:
             subscribe_to_remote_instrument(linked_to)
             send_mqtt_instrument_updated_event(block_id)
     return ()
 
+# --------------------------------------------------------------------------------
+# Public API function to create (and link) a number of Block Instruments in one go.
+# Each definition can include any of the 'create_block_instrument' parameters (apart
+# from the canvas) - any definitions with invalid parameters are logged and skipped
+# --------------------------------------------------------------------------------
+
+instrument_definition_parameters = ("block_id", "x", "y", "block_callback", "single_line",
+                                    "bell_sound_file", "telegraph_sound_file", "linked_to")
+
+def create_block_instruments (canvas, instrument_definitions:list,
+                              block_callback = null_callback,
+                              single_line:bool = False,
+                              bell_sound_file:str = "bell-ring-01.wav",
+                              telegraph_sound_file:str = "telegraph-key-01.wav"):
+    global logging
+    logging.info ("Block Instruments: Creating "+str(len(instrument_definitions))+" Block Instruments")
+    created_instruments = []
+    for definition in instrument_definitions:
+        if not isinstance(definition, dict) or not all(parameter in definition.keys() for parameter in ("block_id","x","y")):
+            logging.error ("Block Instruments: create_block_instruments - block_id, x and y must be specified "
+                                                                            "for each instrument: "+str(definition))
+        elif not all(parameter in instrument_definition_parameters for parameter in definition.keys()):
+            logging.error ("Block Instrument "+str(definition["block_id"])+": create_block_instruments - Invalid parameter(s) "+
+                    str([parameter for parameter in definition.keys() if parameter not in instrument_definition_parameters]))
+        elif not instrument_exists(definition["block_id"]):
+            parameters = {"block_callback": block_callback, "single_line": single_line,
+                          "bell_sound_file": bell_sound_file, "telegraph_sound_file": telegraph_sound_file}
+            parameters.update(definition)
+            create_block_instrument(canvas, **parameters)
+            if instrument_exists(definition["block_id"]): created_instruments.append(definition["block_id"])
+        else:
+            logging.error ("Block Instrument "+str(definition["block_id"])+": Instrument already exists")
+    # Now all the instruments have been created we can check the links between the local instruments
+    # and update the repeaters of the linked instruments (this is inhibited when each instrument is
+    # created as the linked instrument may not have been created at that time). The repeater state is
+    # always the same as the main state for single line instruments so these are not updated
+    for block_id in created_instruments:
+        linked_to = instruments[str(block_id)]["linkedto"]
+        if linked_to is not None and not instruments[str(block_id)]["remotelink"]:
+            if not instrument_exists(linked_to):
+                logging.warning ("Block Instrument "+str(block_id)+": Linked instrument "+str(linked_to)+" does not exist")
+            elif instruments[str(linked_to)]["linkedto"] != block_id:
+                logging.warning ("Block Instrument "+str(block_id)+": Linked instrument "+str(linked_to)+
+                                                                        " is not linked back to this instrument")
+            elif not instruments[str(linked_to)]["singleline"]:
+                change_repeater_state(linked_to, instruments[str(block_id)]["sectionstate"], make_callback=False)
+    return()
+
 # --------------------------------------------------------------------------------
 # Public API function to find out if the block section ahead is clear.
 # This is represented by the current status of the REPEATER Indicator
@@ -600,9 +720,11 @@ def block_section_ahead_clear(block_id:int):
 def subscribe_to_remote_instrument(block_identifier:str):
     remote_node,remote_id = mqtt_interface.split_remote_item_identifier(block_identifier) 
     mqtt_interface.subscribe_to_mqtt_messages("instrument_updated_event",remote_node,
-                                            remote_id,handle_mqtt_instrument_updated_event)   
+                                remote_id,handle_mqtt_instrument_updated_event,coalesce=True)
     mqtt_interface.subscribe_to_mqtt_messages("instrument_telegraph_event",remote_node,
                                             remote_id,handle_mqtt_ring_section_bell_event)  
+    # Subscribe to the layout state snapshot from the remote node (for fast synchronisation)
+    network_snapshots.subscribe_to_node_snapshot(remote_node)
     return()
 
 # --------------------------------------------------------------------------------
@@ -616,9 +738,11 @@ def handle_mqtt_instrument_updated_event(message):
         section_state = message["sectionstate"]
         node_id, block_id = mqtt_interface.split_remote_item_identifier(block_identifier)
         logging.info("Block Instrument "+str(block_id)+": State update from remote instrument ********************")
-        if section_state == True: set_repeater_clear(block_id)
-        elif section_state == False: set_repeater_occupied(block_id)
-        else: set_repeater_blocked(block_id)
+        # Only valid instrument states are accepted (anything else is discarded)
+        if section_state not in (None, True, False):
+            logging.warning("Block Instrument "+str(block_id)+": Invalid state received from remote instrument")
+        else:
+            change_repeater_state(block_id, section_state)
     return()
 
 def handle_mqtt_ring_section_bell_event(message):
@@ -626,8 +750,20 @@ def handle_mqtt_ring_section_bell_event(message):
     if "instrumentid" in message.keys():
         block_identifier = message["instrumentid"]
         node_id, block_id = mqtt_interface.split_remote_item_identifier(block_identifier)
-        logging.debug("Block Instrument "+str(block_id)+": Telegraph key event from remote instrument ************")
-        ring_section_bell(block_id)
+        # A bell code (sent as a single event) includes the timings of each beat - these are validated
+        # to make sure the received timings are sensible before the bell code is played back
+        if "belltimings" in message.keys():
+            timings = message["belltimings"]
+            if (isinstance(timings,list) and 0 < len(timings) <= max_bell_code_beats and
+                  all(isinstance(timing,(int,float)) and 0.0 <= timing <= max_bell_code_duration for timing in timings)):
+                logging.debug("Block Instrument "+str(block_id)+": Bell code '"+str(message.get("bellcode"))+
+                                                        "' from remote instrument ************")
+                ring_bell_code(block_id, timings)
+            else:
+                logging.warning("Block Instrument "+str(block_id)+": Invalid bell code timings from remote instrument")
+        else:
+            logging.debug("Block Instrument "+str(block_id)+": Telegraph key event from remote instrument ************")
+            ring_section_bell(block_id)
     return()
 
 # --------------------------------------------------------------------------------
@@ -641,12 +777,19 @@ def send_mqtt_instrument_updated_event(block_id:int):
     log_message = "Block Instrument "+str(block_id)+": Publishing instrument state to MQTT Broker"
     # Publish as "retained" messages so remote items that subscribe later will always pick up the latest state
     mqtt_interface.send_mqtt_message("instrument_updated_event",block_id,data=data,log_message=log_message,retain=True)
+    network_snapshots.published_state_changed()
     return()
 
-def send_mqtt_ring_section_bell_event(block_id:int):
+def send_mqtt_ring_section_bell_event(block_id:int, bell_code:str=None, timings:list=None):
     data = {}
     data["instrumentid"] = instruments[str(block_id)]["linkedto"]
-    log_message = "Block Instrument "+str(block_id)+": Publishing telegraph key event to MQTT Broker"
+    if bell_code is not None:
+        # A complete bell code is sent as a single event (with the timing for each beat)
+        data["bellcode"] = bell_code
+        data["belltimings"] = timings
+        log_message = "Block Instrument "+str(block_id)+": Publishing bell code '"+bell_code+"' to MQTT Broker"
+    else:
+        log_message = "Block Instrument "+str(block_id)+": Publishing telegraph key event to MQTT Broker"
     # These are transitory events so we do not publish as "retained" messages (if they get missed, they get missed)
     mqtt_interface.send_mqtt_message("instrument_telegraph_event",block_id,data=data,log_message=log_message,retain=False)
     return()
@@ -0,0 +1,167 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides optional profiling of the callbacks executed in the main tkinter thread -
+# the external callbacks registered by the application (signal, point, section, instrument and
+# track sensor callbacks) and the functions queued for execution in the tkinter thread by other
+# threads (see 'common.execute_function_in_tkinter_thread'). All of these run "inline" on the
+# tkinter thread, so a single slow callback will stall the processing of all other events.
+#
+# When profiling is enabled each invocation is timed and the results are aggregated for each
+# callback function. Any invocation that exceeds the specified threshold is logged as a warning
+# (with the arguments it was called with). When profiling is disabled the only overhead is a
+# single check of the 'profiling_active' flag for each invocation. Where a profiled callback is
+# called from within another (e.g. an external callback made by a queued function) the time is
+# only counted against the inner callback - so the total times never exceed the elapsed time.
+#
+# Public types and functions:
+#
+# enable_callback_profiling - Enables the profiling of callbacks (profiling is disabled by default)
+#    Optional Parameters:
+#       threshold:float - Callbacks taking longer than this (in milliseconds) are logged - default = 50.0
+#       reset_statistics:bool - Clear down any previously recorded statistics - default = True
+#
+# disable_callback_profiling - Disables the profiling of callbacks (recorded statistics are retained)
+#
+# reset_callback_statistics - Clears down all the recorded callback statistics
+#
+# get_callback_statistics - returns a dictionary of the recorded statistics for each callback
+#    Returned dictionary - key is the callback name ("<module>.<function>" - with the line number
+#    appended for lambda functions), value is a dictionary of:
+#       "type":str - the callback type ('signal_callback', 'point_callback', 'section_callback',
+#                    'instrument_callback', 'sensor_callback' or 'queued_function')
+#       "count":int - the number of times the callback has been executed
+#       "total":float - the total execution time (in milliseconds) - excluding nested callbacks
+#       "mean":float - the mean execution time (in milliseconds) - excluding nested callbacks
+#       "max":float - the maximum execution time (in milliseconds) - excluding nested callbacks
+#       "slow":int - the number of executions that exceeded the threshold
+#
+# log_callback_statistics - Writes a summary of the recorded statistics to the log (at INFO level)
+#                           with the callbacks listed in order of their total execution time
+#-----------------------------------------------------------------------------------------------
+
+import threading
+import logging
+import time
+
+#-----------------------------------------------------------------------------------------------
+# Global variables used by the module
+#-----------------------------------------------------------------------------------------------
+
+profiler_config: dict = {}
+profiler_config["profiling_active"] = False
+profiler_config["threshold"] = 50.0
+
+profiler_lock = threading.Lock()
+callback_statistics: dict = {}
+
+# The nested profiled callbacks in progress for each thread - each entry is the time spent
+# (so far) in the profiled callbacks called from within the callback at that level
+thread_context = threading.local()
+
+#-----------------------------------------------------------------------------------------------
+# Public API functions to enable/disable profiling and access the recorded statistics
+#-----------------------------------------------------------------------------------------------
+
+def enable_callback_profiling(threshold:float=50.0, reset_statistics:bool=True):
+    global logging
+    if reset_statistics: reset_callback_statistics()
+    logging.info("Callback Profiler: Enabling callback profiling (threshold "+format(threshold,".1f")+"ms)")
+    profiler_config["threshold"] = threshold
+    profiler_config["profiling_active"] = True
+    return()
+
+def disable_callback_profiling():
+    global logging
+    logging.info("Callback Profiler: Disabling callback profiling")
+    profiler_config["profiling_active"] = False
+    return()
+
+def reset_callback_statistics():
+    with profiler_lock:
+        callback_statistics.clear()
+    return()
+
+def get_callback_statistics():
+    statistics = {}
+    with profiler_lock:
+        for callback_name, callback_data in callback_statistics.items():
+            statistics[callback_name] = {"type": callback_data["type"],
+                                         "count": callback_data["count"],
+                                         "total": callback_data["total"],
+                                         "mean": callback_data["total"] / callback_data["count"],
+                                         "max": callback_data["max"],
+                                         "slow": callback_data["slow"] }
+    return(statistics)
+
+def log_callback_statistics():
+    global logging
+    statistics = get_callback_statistics()
+    for callback_name, callback_data in sorted(statistics.items(), key=lambda item: item[1]["total"], reverse=True):
+        logging.info("Callback Profiler: "+callback_data["type"]+" '"+callback_name+"' - count="+str(callback_data["count"])+
+                     ", total="+format(callback_data["total"],".3f")+"ms, mean="+format(callback_data["mean"],".3f")+
+                     "ms, max="+format(callback_data["max"],".3f")+"ms, slow="+str(callback_data["slow"]))
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to get the name of a callback function for the statistics. Functions that
+# have been wrapped (see below) are named after the original function. The line number is
+# appended for lambda functions (as the name on its own doesn't tell us much)
+#-----------------------------------------------------------------------------------------------
+
+def get_callback_name(callback_function):
+    callback_function = getattr(callback_function, "__wrapped__", callback_function)
+    callback_name = (getattr(callback_function, "__module__", None) or "") + "." + getattr(
+                            callback_function, "__qualname__", type(callback_function).__name__)
+    if callback_name.endswith("<lambda>") and hasattr(callback_function, "__code__"):
+        callback_name = callback_name + ":" + str(callback_function.__code__.co_firstlineno)
+    return(callback_name)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to execute a callback and record the time taken (only called if profiling
+# is active). The time is recorded even if the callback raises an exception. The time spent in
+# any profiled callbacks called from within the callback is excluded (as this is recorded
+# against the nested callbacks) so the same time is never counted twice
+#-----------------------------------------------------------------------------------------------
+
+def execute_profiled_callback(callback_type:str, callback_function, *args):
+    nested_callbacks = getattr(thread_context, "nested_callbacks", None)
+    if nested_callbacks is None:
+        nested_callbacks = []
+        thread_context.nested_callbacks = nested_callbacks
+    nested_callbacks.append(0.0)
+    start_time = time.perf_counter()
+    try:
+        return(callback_function(*args))
+    finally:
+        total_elapsed = (time.perf_counter() - start_time) * 1000.0
+        elapsed = total_elapsed - nested_callbacks.pop()
+        if len(nested_callbacks) > 0: nested_callbacks[-1] += total_elapsed
+        callback_name = get_callback_name(callback_function)
+        slow_callback = elapsed > profiler_config["threshold"]
+        with profiler_lock:
+            if callback_name not in callback_statistics.keys():
+                callback_statistics[callback_name] = {"type":callback_type, "count":0, "total":0.0, "max":0.0, "slow":0}
+            callback_data = callback_statistics[callback_name]
+            callback_data["count"] += 1
+            callback_data["total"] += elapsed
+            callback_data["max"] = max(callback_data["max"], elapsed)
+            if slow_callback: callback_data["slow"] += 1
+        if slow_callback:
+            logging.warning("Callback Profiler: Slow "+callback_type+" '"+callback_name+"' "+str(args)+
+                        " took "+format(elapsed,".1f")+"ms (threshold "+format(profiler_config["threshold"],".1f")+"ms)")
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to "wrap" an external callback function (when it is registered) so that it
+# is profiled whenever profiling is active. The 'null_callback' functions used by the library
+# (when no external callback has been specified) are not wrapped
+#-----------------------------------------------------------------------------------------------
+
+def profile_callback(callback_function, callback_type:str):
+    if getattr(callback_function, "__name__", None) == "null_callback": return(callback_function)
+    def profiled_callback(*args):
+        if profiler_config["profiling_active"]:
+            return(execute_profiled_callback(callback_type, callback_function, *args))
+        return(callback_function(*args))
+    profiled_callback.__wrapped__ = callback_function
+    return(profiled_callback)
+
+###############################################################################################
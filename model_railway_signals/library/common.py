@@ -9,6 +9,9 @@ import logging
 import time
 from . import mqtt_interface
 from . import file_interface
+from . import event_tracing
+from . import event_recorder
+from . import callback_profiler
 
 # -------------------------------------------------------------------------
 # Global variables used within the Common Module
@@ -99,12 +102,19 @@ def handle_callback_in_tkinter_thread(*args):
        callback = event_queue.get(False)
     except event_queue.Empty:
         return()
-    callback()
+    # Flag that an input event is being processed (only if the event recorder is active)
+    event_recorder.mark_input_event_in_progress()
+    # Time the execution of the function (only if callback profiling is active)
+    if callback_profiler.profiler_config["profiling_active"]:
+        callback_profiler.execute_profiled_callback("queued_function",callback)
+    else:
+        callback()
     return()
     
 def execute_function_in_tkinter_thread(callback_function):
     global logging
-    callback = event_queue.put(callback_function)
+    # If event tracing is enabled then the trace ID (if any) is carried across into the tkinter thread
+    callback = event_queue.put(event_tracing.wrap_callback_with_current_trace(callback_function))
     if root_window is not None:
         root_window.event_generate("<<ExtCallback>>", when="tail")
     else:
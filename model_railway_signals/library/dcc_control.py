@@ -132,20 +132,33 @@
 # set_node_to_publish_dcc_commands - Enables publishing of DCC commands to other network nodes
 #   Optional Parameters:
 #       publish_dcc_commands:bool - 'True' to Publish / 'False' to stop publishing (default=False)
+#       batched:bool - 'True' to publish all the DCC commands generated by a single update as
+#                  a single sequence-numbered frame rather than a message per DCC address.
+#                  The latest state of every DCC address is also published (at most once per
+#                  second) as a single "retained" frame so nodes that subscribe later (or are
+#                  restarted) will still pick up the current state (default=False)
 # 
 # subscribe_to_dcc_command_feed - Subcribes to DCC command feed from another node on the network.
 #           All received DCC commands are automatically forwarded to the local Pi-Sprog interface.
+#           Both the 'per address' and the 'batched' feeds are subscribed to (missing and out of
+#           sequence batched frames are detected and reported - out of sequence frames are discarded)
+#           together with the retained "state" frame for the batched feed
 #   Mandatory Parameters:
 #       *nodes:str - The name of the node publishing the feed (multiple nodes can be specified)
 #
 #----------------------------------------------------------------------------------------------------
 
+from . import common
 from . import signals_common
 from . import pi_sprog_interface
 from . import mqtt_interface
+from . import event_tracing
+from . import layout_metrics
 
+import threading
 import enum
 import logging
+import time
 
 #-----------------------------------------------------------------------------------------
 # Global definitions
@@ -163,6 +176,24 @@ dcc_point_mappings:dict = {}
 # Define the Flag for whether DCC Commands are published to the MQTT Broker or not
 publish_dcc_commands_to_mqtt_broker:bool = False
 
+# Define the variables for publishing DCC commands in batches (sequence-numbered frames).
+# The session ID allows remote nodes to detect the publishing node has been restarted
+publish_dcc_commands_in_batches:bool = False
+dcc_batch_lock = threading.Lock()
+dcc_batch_pending_commands:list = []
+dcc_batch_flush_scheduled:bool = False
+dcc_batch_sequence_number:int = 0
+dcc_batch_session_id:str = format(int(time.time()*1000),"x")
+
+# The latest state of all DCC addresses published in batches (published as a "retained" frame)
+# together with the delay (in milliseconds) before the state frame is published after a change
+dcc_batch_accessory_states:dict = {}
+dcc_batch_state_publish_scheduled:bool = False
+dcc_batch_state_publish_delay:int = 1000
+
+# Dictionary of the last received session/sequence number for each remote publishing node
+dcc_batch_receive_state:dict = {}
+
 #-----------------------------------------------------------------------------------------
 # Internal function to test if a mapping exists for a signal
 #-----------------------------------------------------------------------------------------
@@ -436,6 +467,7 @@ def update_dcc_point(point_id:int, state:bool):
         logging.debug ("Point "+str(point_id)+": Generating DCC Bus commands to switch point")
         # Retrieve the DCC mappings for our point
         dcc_mapping = dcc_point_mappings[str(point_id)]
+        event_tracing.record_trace_stage("dcc_mapping")
         if dcc_mapping["reversed"]: state = not state
         if dcc_mapping["address"] > 0:
             # Send the DCC commands to change the state
@@ -458,6 +490,7 @@ def update_dcc_signal_aspects(sig_id: int):
             logging.error ("Signal "+str(sig_id)+": Incorrect DCC Mapping Type for signal - Expecting a Colour Light signal")
         else:
             logging.debug ("Signal "+str(sig_id)+": Generating DCC Bus commands to change main signal aspect")
+            event_tracing.record_trace_stage("dcc_mapping")
             # Send the DCC commands to change the state
             for entry in dcc_mapping[str(signals_common.signals[str(sig_id)]["sigstate"])]:
                 if entry[0] > 0:
@@ -489,6 +522,7 @@ def update_dcc_signal_element (sig_id:int,state:bool, element:str="main_subsidar
             logging.error ("Signal "+str(sig_id)+": Incorrect DCC Mapping Type for signal - Expecting a Semaphore signal")
         else:
             logging.debug ("Signal "+str(sig_id)+": Generating DCC Bus commands to change \'"+element+"\' ")
+            event_tracing.record_trace_stage("dcc_mapping")
             # Send the DCC commands to change the state 
             if dcc_mapping[element] > 0:
                 # Send the DCC commands to change the state via the serial port to the Pi-Sprog.
@@ -530,6 +564,7 @@ def update_dcc_signal_route (sig_id:int,route:signals_common.route_type,
                  (not dcc_mapping["auto_route_inhibit"] and signal_change) or
                  (not sig_at_danger and not signal_change) ):
                 logging.debug ("Signal "+str(sig_id)+": Generating DCC Bus commands to change route display")
+                event_tracing.record_trace_stage("dcc_mapping")
                 # Send the DCC commands to change the state if required
                 for entry in dcc_mapping[str(route)]:
                     if entry[0] > 0:
@@ -569,6 +604,7 @@ def update_dcc_signal_theatre (sig_id:int, character_to_display,
              (not dcc_mapping["auto_route_inhibit"] and signal_change) or
              (not sig_at_danger and not signal_change) ):
             logging.debug ("Signal "+str(sig_id)+": Generating DCC Bus commands to change Theatre display")
+            event_tracing.record_trace_stage("dcc_mapping")
             # Send the DCC commands to change the state if required
             for entry in dcc_mapping["THEATRE"]:
                 if entry[0] == character_to_display:
@@ -587,11 +623,16 @@ def update_dcc_signal_theatre (sig_id:int, character_to_display,
 # Public API Function to "subscribe" to the published DCC commands from another "Node"
 #-----------------------------------------------------------------------------------------------
 
-def set_node_to_publish_dcc_commands (publish_dcc_commands:bool=False):
+def set_node_to_publish_dcc_commands (publish_dcc_commands:bool=False, batched:bool=False):
     global publish_dcc_commands_to_mqtt_broker
-    if publish_dcc_commands: logging.info("MQTT-Client - Configuring Application to publish DCC Commands to MQTT broker")
+    global publish_dcc_commands_in_batches
+    if publish_dcc_commands and batched: logging.info("MQTT-Client - Configuring Application to publish batched DCC Commands to MQTT broker")
+    elif publish_dcc_commands: logging.info("MQTT-Client - Configuring Application to publish DCC Commands to MQTT broker")
     else: logging.info("DCC Control - Configuring Application NOT to publish DCC Commands to MQTT broker")
+    # Send out any commands still waiting in the current batch before we change the mode
+    flush_dcc_command_batch()
     publish_dcc_commands_to_mqtt_broker = publish_dcc_commands
+    publish_dcc_commands_in_batches = batched
     return()
 
 #-----------------------------------------------------------------------------------------------
@@ -604,6 +645,12 @@ def subscribe_to_dcc_command_feed (*nodes:str):
         # as each DCC address will appear on a different topic from the remote MQTT node 
         mqtt_interface.subscribe_to_mqtt_messages("dcc_accessory_short_events",node,0,
                                     handle_mqtt_dcc_accessory_short_event,subtopics=True)
+        # Batched frames are forwarded straight to the Pi-Sprog from the mqtt network thread
+        # (we don't need to wait for the main tkinter thread as no tkinter objects are updated)
+        mqtt_interface.subscribe_to_mqtt_messages("dcc_accessory_batch_events",node,0,
+                                    handle_mqtt_dcc_accessory_batch_event,network_thread=True)
+        mqtt_interface.subscribe_to_mqtt_messages("dcc_accessory_batch_states",node,0,
+                                    handle_mqtt_dcc_accessory_state_event,network_thread=True)
     return() 
 
 #-----------------------------------------------------------------------------------------------
@@ -624,13 +671,97 @@ def handle_mqtt_dcc_accessory_short_event (message):
         pi_sprog_interface.send_accessory_short_event(dcc_address,dcc_state)
     return()
 
+#-----------------------------------------------------------------------------------------------
+# Internal function to validate a received batched (or state) frame - to make sure a malformed
+# frame can't raise an exception in the mqtt network thread. The commands are a list of
+# [address:int, active:bool] - the addresses are validated by the Pi-Sprog interface
+#-----------------------------------------------------------------------------------------------
+
+def valid_dcc_batch_frame(message):
+    return( isinstance(message.get("sourceidentifier"),str) and isinstance(message.get("session"),str) and
+            isinstance(message.get("sequence"),int) and isinstance(message.get("commands"),list) and
+            all(isinstance(command,list) and len(command) == 2 and isinstance(command[0],int) and
+                       isinstance(command[1],bool) for command in message["commands"]) )
+
+#-----------------------------------------------------------------------------------------------
+# Callback for handling received batched frames from a remote DCC-command-producer Node. We track
+# the session ID and sequence number of the last frame from each node to detect missing frames
+# (which are reported) and out of sequence frames (which are discarded as the commands in the
+# frame would otherwise overwrite the more recent commands already sent to the DCC bus)
+#-----------------------------------------------------------------------------------------------
+
+def handle_mqtt_dcc_accessory_batch_event (message):
+    global logging
+    global dcc_batch_receive_state
+    if not valid_dcc_batch_frame(message):
+        logging.warning ("DCC Control: Discarding invalid DCC batch received from '"+str(message.get("sourceidentifier"))+"'")
+    else:
+        source_node = message["sourceidentifier"]
+        session_id = message["session"]
+        sequence_number = message["sequence"]
+        last_received = dcc_batch_receive_state.get(source_node)
+        if last_received is None or last_received["session"] != session_id:
+            logging.info ("DCC Control: Receiving batched DCC commands from '"+source_node+"' (session "+str(session_id)+")")
+        elif sequence_number <= last_received["sequence"]:
+            logging.warning ("DCC Control: Discarding out of sequence DCC batch "+str(sequence_number)+" from '"
+                             +source_node+"' - last batch received was "+str(last_received["sequence"]))
+            return()
+        elif sequence_number > last_received["sequence"] + 1:
+            logging.warning ("DCC Control: "+str(sequence_number-last_received["sequence"]-1)+
+                             " DCC batch(es) missing from '"+source_node+"' before batch "+str(sequence_number))
+        dcc_batch_receive_state[source_node] = {"session":session_id, "sequence":sequence_number}
+        logging.debug ("DCC Control: Received DCC batch "+str(sequence_number)+" from '"+source_node+"' with "
+                                     +str(len(message["commands"]))+" commands")
+        # Forward the received DCC commands on to the Pi-Sprog Interface (for transmission on the DCC Bus)
+        pi_sprog_interface.send_accessory_short_events(message["commands"])
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Callback for handling the received (retained) state frame from a remote DCC-command-producer
+# Node. This holds the latest state of every DCC address and the sequence number of the last batch
+# it includes. The state is only sent to the DCC bus if it is more recent than the last batch we
+# have received (i.e. on startup, when the remote node has been restarted or after missing frames)
+#-----------------------------------------------------------------------------------------------
+
+def handle_mqtt_dcc_accessory_state_event (message):
+    global logging
+    global dcc_batch_receive_state
+    if not valid_dcc_batch_frame(message):
+        logging.warning ("DCC Control: Discarding invalid DCC state received from '"+str(message.get("sourceidentifier"))+"'")
+    else:
+        source_node = message["sourceidentifier"]
+        session_id = message["session"]
+        sequence_number = message["sequence"]
+        last_received = dcc_batch_receive_state.get(source_node)
+        if (last_received is None or last_received["session"] != session_id or
+                     sequence_number > last_received["sequence"]):
+            logging.info ("DCC Control: Received DCC state for "+str(len(message["commands"]))+" DCC addresses from '"
+                             +source_node+"' (session "+str(session_id)+", batch "+str(sequence_number)+")")
+            dcc_batch_receive_state[source_node] = {"session":session_id, "sequence":sequence_number}
+            # Forward the DCC commands on to the Pi-Sprog Interface (for transmission on the DCC Bus)
+            pi_sprog_interface.send_accessory_short_events(message["commands"])
+    return()
+
 # --------------------------------------------------------------------------------
 # Internal function for building and sending MQTT messages - but only if this
 # particular node has been configured to publish DCC commands viathe mqtt broker
 # --------------------------------------------------------------------------------
 
 def publish_accessory_short_event(address:int,active:bool):
-    if publish_dcc_commands_to_mqtt_broker:
+    global dcc_batch_flush_scheduled
+    if publish_dcc_commands_to_mqtt_broker: layout_metrics.increment_counter("dcc_commands_published",address)
+    if publish_dcc_commands_to_mqtt_broker and publish_dcc_commands_in_batches:
+        # Add the command to the current batch. If we know the tkinter root window we schedule the
+        # batch to be sent once the current update has completed (all the DCC commands from the one
+        # logical update will be generated in the same tkinter event). Otherwise we send it immediately
+        with dcc_batch_lock:
+            dcc_batch_pending_commands.append([address,active])
+            schedule_flush = not dcc_batch_flush_scheduled and common.root_window is not None and not common.shutdown_initiated
+            flush_now = not dcc_batch_flush_scheduled and not schedule_flush
+            if schedule_flush: dcc_batch_flush_scheduled = True
+        if schedule_flush: common.root_window.after_idle(flush_dcc_command_batch)
+        elif flush_now: flush_dcc_command_batch()
+    elif publish_dcc_commands_to_mqtt_broker:
         data = {}
         data["dccaddress"] = address
         data["dccstate"] = active
@@ -641,4 +772,60 @@ def publish_accessory_short_event(address:int,active:bool):
                             log_message=log_message,subtopic = str(address),retain=True)
     return()
 
+# --------------------------------------------------------------------------------
+# Internal function to publish the pending batch of DCC commands (if there are any)
+# as a single sequence-numbered frame. These frames are transitory so we do not
+# publish them as "retained" messages (missing frames are detected by the receiver).
+# The commands are also added to the latest state of all DCC addresses - which is
+# then published as a single "retained" frame (at most once every second)
+# --------------------------------------------------------------------------------
+
+def flush_dcc_command_batch():
+    global dcc_batch_pending_commands
+    global dcc_batch_flush_scheduled
+    global dcc_batch_sequence_number
+    global dcc_batch_state_publish_scheduled
+    with dcc_batch_lock:
+        commands = dcc_batch_pending_commands
+        dcc_batch_pending_commands = []
+        dcc_batch_flush_scheduled = False
+        if len(commands) > 0: dcc_batch_sequence_number = dcc_batch_sequence_number + 1
+        sequence_number = dcc_batch_sequence_number
+        for address, active in commands: dcc_batch_accessory_states[address] = active
+        schedule_state = (len(commands) > 0 and not dcc_batch_state_publish_scheduled and
+                             common.root_window is not None and not common.shutdown_initiated)
+        publish_state = len(commands) > 0 and not dcc_batch_state_publish_scheduled and not schedule_state
+        if schedule_state: dcc_batch_state_publish_scheduled = True
+    if len(commands) > 0:
+        data = {}
+        data["session"] = dcc_batch_session_id
+        data["sequence"] = sequence_number
+        data["commands"] = commands
+        log_message = ("DCC Control: Publishing DCC batch "+str(sequence_number)+" with "
+                             +str(len(commands))+" commands to MQTT broker")
+        mqtt_interface.send_mqtt_message("dcc_accessory_batch_events",0,data=data,
+                                           log_message=log_message,retain=False)
+    if schedule_state: common.root_window.after(dcc_batch_state_publish_delay,publish_dcc_accessory_states)
+    elif publish_state: publish_dcc_accessory_states()
+    return()
+
+# --------------------------------------------------------------------------------
+# Internal function to publish the latest state of all DCC addresses published in
+# batches (and the sequence number of the last batch) as a "retained" frame
+# --------------------------------------------------------------------------------
+
+def publish_dcc_accessory_states():
+    global dcc_batch_state_publish_scheduled
+    with dcc_batch_lock:
+        dcc_batch_state_publish_scheduled = False
+        data = {}
+        data["session"] = dcc_batch_session_id
+        data["sequence"] = dcc_batch_sequence_number
+        data["commands"] = [[address,active] for address, active in dcc_batch_accessory_states.items()]
+    log_message = ("DCC Control: Publishing DCC state for "+str(len(data["commands"]))+
+                       " DCC addresses (batch "+str(data["sequence"])+") to MQTT broker")
+    mqtt_interface.send_mqtt_message("dcc_accessory_batch_states",0,data=data,
+                                       log_message=log_message,retain=True)
+    return()
+
 #######################################################################################
@@ -0,0 +1,310 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides a facility to record all the external inputs to the application during an
+# operating session (button events, track sensor triggers, MQTT messages received from other nodes
+# and timed signal triggers) to an event log file - and to then replay the event log to reproduce
+# the session (for performance regression testing of the signals/points/sections modules).
+#
+# The event log is a compact text file - a header line followed by one line (of compact json) per
+# event: [timestamp (ms from the start of recording), event_type, event arguments...]. Events are
+# passed to a background thread for writing so recording doesn't block the main tkinter thread.
+#
+# Timed signal triggers are only recorded if they are made directly by the application (rather than
+# from within the processing of another recorded event - i.e. a callback function) as these will be
+# triggered again when the other event is replayed.
+#
+# On replay, the events are fed back in (from a background thread) either at the recorded rate or
+# as fast as possible. Each event is executed in the main tkinter thread (in the same way as the
+# original event) and the time taken for each event to be processed (including the hop into the
+# tkinter thread) is recorded. A report of the throughput, the latency (per event type) and a hash
+# of the final layout state (so the final state can be compared between runs) is then produced.
+# Note that the layout must have been created (in the same way as for the original session) before
+# the events are replayed.
+#
+# Public types and functions:
+#
+# start_event_recording - Starts recording all external inputs to an event log file
+#   Mandatory Parameters:
+#       file_name:str - The name of the event log file (any existing file will be overwritten)
+#
+# stop_event_recording - Stops recording (any queued events are written to file first)
+#
+# replay_event_log - Replays an event log (in a background thread). The report is written to the
+#                    log (at INFO level) once the replay has completed and returned via the callback
+#   Mandatory Parameters:
+#       file_name:str - The name of the event log file to replay
+#   Optional Parameters:
+#       speed:float - The replay speed (1.0 = as recorded, 0 = as fast as possible) - default = 1.0
+#       replay_callback - Function to call (in the main tkinter thread) when the replay has completed.
+#                         The function is called with the report dictionary (see below)
+#   Returned report dictionary:
+#       "events":int - the number of events that were replayed
+#       "elapsed":float - the elapsed time for the replay (in seconds)
+#       "throughput":float - the number of events processed per second
+#       "latency":dict - key is the event type, value is a dictionary of the "count", "mean",
+#                        "p50", "p99" and "max" processing times for the event (in milliseconds)
+#       "statehash":str - a hash of the final layout state (see 'layout_state_hash')
+#
+# layout_state_hash - Returns a hash (as a hex string) of the current layout state (all the signal,
+#                     point, section and instrument elements that are saved to the '.sig' file)
+#-----------------------------------------------------------------------------------------------
+
+from . import common
+from . import file_interface
+from . import mqtt_interface
+from . import mqtt_local_broker
+from . import signals_common
+from . import signals
+from . import points
+from . import track_sections
+from . import track_sensors
+from . import block_instruments
+
+import threading
+import hashlib
+import logging
+import queue
+import json
+import time
+
+#-----------------------------------------------------------------------------------------------
+# Global variables used by the module. The 'thread_context' is used to flag (for each thread)
+# that a recorded input event is being processed (so nested timed signal triggers are not recorded)
+#-----------------------------------------------------------------------------------------------
+
+recorder_config: dict = {}
+recorder_config["recording_active"] = False
+recorder_config["start_time"] = 0.0
+recorder_config["writer_thread"] = None
+recorder_config["replay_thread"] = None
+recorder_queue = queue.Queue()
+thread_context = threading.local()
+
+event_log_header = {"info": "Model Railway Signalling Event Log", "version": 1}
+
+#-----------------------------------------------------------------------------------------------
+# Public API functions to start and stop recording
+#-----------------------------------------------------------------------------------------------
+
+def start_event_recording(file_name:str):
+    global logging
+    if recorder_config["recording_active"]:
+        logging.warning("Event Recorder: Already recording - stopping the previous recording")
+        stop_event_recording()
+    try:
+        event_log_file = open(file_name,'w')
+        event_log_file.write(json.dumps(event_log_header)+"\n")
+    except Exception as exception:
+        logging.error("Event Recorder: Error opening event log file - Reported exception: "+str(exception))
+    else:
+        logging.info("Event Recorder: Recording all input events to '"+file_name+"'")
+        recorder_config["start_time"] = time.perf_counter()
+        recorder_config["recording_active"] = True
+        recorder_config["writer_thread"] = threading.Thread(target=thread_to_write_event_log,args=(event_log_file,))
+        recorder_config["writer_thread"].daemon = True
+        recorder_config["writer_thread"].start()
+    return()
+
+def stop_event_recording():
+    global logging
+    if recorder_config["recording_active"]:
+        logging.info("Event Recorder: Stopping recording of input events")
+        recorder_config["recording_active"] = False
+        recorder_queue.put(None)
+        recorder_config["writer_thread"].join()
+        recorder_config["writer_thread"] = None
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function called by the other modules for every external input event (this can be
+# called from any thread - e.g. the GPIO event threads or the MQTT network thread)
+#-----------------------------------------------------------------------------------------------
+
+def record_input_event(event_type:str, *args):
+    if recorder_config["recording_active"]:
+        timestamp = round((time.perf_counter() - recorder_config["start_time"]) * 1000.0, 3)
+        recorder_queue.put([timestamp, event_type] + list(args))
+        mark_input_event_in_progress()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal functions to flag that an input event is being processed in the main tkinter thread.
+# Also called by the common module for callbacks passed into the tkinter thread (e.g. sensor
+# events and MQTT messages). The flag is cleared once tkinter is next idle (i.e. when all the
+# processing for the event has completed)
+#-----------------------------------------------------------------------------------------------
+
+def mark_input_event_in_progress():
+    if (recorder_config["recording_active"] and common.root_window is not None and
+            threading.current_thread() is threading.main_thread() and
+            not getattr(thread_context, "input_event_in_progress", False)):
+        thread_context.input_event_in_progress = True
+        common.root_window.after_idle(clear_input_event_in_progress)
+    return()
+
+def clear_input_event_in_progress():
+    thread_context.input_event_in_progress = False
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function called for timed signal triggers - these are only recorded if they have
+# not been made from within the processing of another recorded input event
+#-----------------------------------------------------------------------------------------------
+
+def record_timed_signal_trigger(sig_id:int, start_delay:int, time_delay:int):
+    if recorder_config["recording_active"] and not getattr(thread_context, "input_event_in_progress", False):
+        record_input_event("timed_signal", sig_id, start_delay, time_delay)
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal thread to write the queued events to the event log file
+#-----------------------------------------------------------------------------------------------
+
+def thread_to_write_event_log(event_log_file):
+    global logging
+    stop_requested = False
+    while not stop_requested:
+        events = [recorder_queue.get()]
+        while not recorder_queue.empty(): events.append(recorder_queue.get())
+        lines = []
+        for event in events:
+            if event is None: stop_requested = True
+            else: lines.append(json.dumps(event,separators=(',',':'))+"\n")
+        try:
+            event_log_file.write("".join(lines))
+            event_log_file.flush()
+        except Exception as exception:
+            logging.error("Event Recorder: Error writing event log file - Reported exception: "+str(exception))
+    event_log_file.close()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Public API function to return a hash of the current layout state. The state is serialised to
+# json (with the keys sorted) so the hash is independent of the order the items were created in
+#-----------------------------------------------------------------------------------------------
+
+def layout_state_hash():
+    snapshot = file_interface.take_layout_state_snapshot()
+    layout_state = { layout_element: {str(item_id): dict(item_elements) for item_id, item_elements in items}
+                                                        for layout_element, items in snapshot.items() }
+    return(hashlib.sha256(json.dumps(layout_state,sort_keys=True).encode("utf-8")).hexdigest())
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to execute a recorded event - this is executed in the main tkinter thread
+#-----------------------------------------------------------------------------------------------
+
+def execute_event(event_type:str, args:list):
+    if event_type == "signal_button": signals_common.signal_button_event(*args)
+    elif event_type == "subsidary_button": signals_common.subsidary_button_event(*args)
+    elif event_type == "sig_passed_button": signals_common.sig_passed_button_event(*args)
+    elif event_type == "approach_release_button": signals_common.approach_release_button_event(*args)
+    elif event_type == "point_change_button": points.change_button_event(*args)
+    elif event_type == "point_fpl_button": points.fpl_button_event(*args)
+    elif event_type == "section_button": track_sections.section_button_event(*args)
+    elif event_type == "instrument_occup_button": block_instruments.occup_button_event(*args)
+    elif event_type == "instrument_clear_button": block_instruments.clear_button_event(*args)
+    elif event_type == "instrument_blocked_button": block_instruments.blocked_button_event(*args)
+    elif event_type == "instrument_telegraph_key": block_instruments.telegraph_key_button(*args)
+    elif event_type == "timed_signal": signals.trigger_timed_signal(*args)
+    elif event_type == "sensor_triggered":
+        if track_sensors.sensor_exists(args[0]): track_sensors.sensor_triggered_event(args[0])
+    elif event_type == "mqtt_message":
+        # The message is decoded and the callback made directly (rather than being queued)
+        decoded_message = mqtt_interface.decode_message(mqtt_local_broker.local_mqtt_message(
+                                        args[0], args[1].encode("utf-8"), 1, False))
+        if decoded_message is not None:
+            callback, coalesce, network_thread, unpacked_json = decoded_message
+            callback(unpacked_json)
+    else:
+        logging.warning("Event Recorder: Ignoring unknown event type '"+str(event_type)+"'")
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Public API function to replay an event log (in a background thread)
+#-----------------------------------------------------------------------------------------------
+
+def replay_event_log(file_name:str, speed:float=1.0, replay_callback=None):
+    global logging
+    if recorder_config["replay_thread"] is not None and recorder_config["replay_thread"].is_alive():
+        logging.error("Event Recorder: replay_event_log - A replay is already in progress")
+    else:
+        try:
+            with open(file_name,'r') as file:
+                header = json.loads(file.readline())
+                events = [json.loads(line) for line in file if line.strip()]
+            if header.get("info") != event_log_header["info"]: raise ValueError("Not an event log file")
+        except Exception as exception:
+            logging.error("Event Recorder: Error reading event log file - Reported exception: "+str(exception))
+        else:
+            logging.info("Event Recorder: Replaying "+str(len(events))+" events from '"+file_name+"'")
+            recorder_config["replay_thread"] = threading.Thread(target=thread_to_replay_events,
+                                                    args=(events,speed,replay_callback))
+            recorder_config["replay_thread"].daemon = True
+            recorder_config["replay_thread"].start()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal thread to replay the events. Each event is executed in the main tkinter thread (if we
+# know the root window - otherwise in this thread) and we wait for it to complete before moving
+# on to the next event. The latency is the time from the event being "raised" to it completing
+#-----------------------------------------------------------------------------------------------
+
+def thread_to_replay_events(events:list, speed:float, replay_callback):
+    global logging
+    latencies = {}
+    event_complete = threading.Event()
+    start_time = time.perf_counter()
+    for event in events:
+        if common.shutdown_initiated: break
+        timestamp, event_type, args = event[0], event[1], event[2:]
+        if speed > 0:
+            delay = start_time + (timestamp / 1000.0 / speed) - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+        event_start = time.perf_counter()
+        if common.root_window is not None:
+            event_complete.clear()
+            def replayed_event(event_type=event_type, args=args):
+                try: execute_event(event_type, args)
+                finally: event_complete.set()
+                return()
+            common.execute_function_in_tkinter_thread(replayed_event)
+            event_complete.wait()
+        else:
+            execute_event(event_type, args)
+        if event_type not in latencies: latencies[event_type] = []
+        latencies[event_type].append((time.perf_counter() - event_start) * 1000.0)
+    elapsed = time.perf_counter() - start_time
+    # The state hash has to be calculated in the main tkinter thread (along with the callback)
+    def complete_replay():
+        report = create_replay_report(latencies, elapsed)
+        if replay_callback is not None: replay_callback(report)
+        return()
+    if common.root_window is not None: common.execute_function_in_tkinter_thread(complete_replay)
+    else: complete_replay()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to create (and log) the report following the replay of an event log
+#-----------------------------------------------------------------------------------------------
+
+def create_replay_report(latencies:dict, elapsed:float):
+    global logging
+    number_of_events = sum(len(values) for values in latencies.values())
+    report = {"events": number_of_events, "elapsed": elapsed,
+              "throughput": number_of_events / elapsed if elapsed > 0 else 0.0,
+              "latency": {}, "statehash": layout_state_hash()}
+    for event_type, values in latencies.items():
+        values.sort()
+        report["latency"][event_type] = {"count": len(values),
+                                         "mean": sum(values) / len(values),
+                                         "p50": values[int(0.50 * (len(values)-1))],
+                                         "p99": values[int(0.99 * (len(values)-1))],
+                                         "max": values[-1]}
+    logging.info("Event Recorder: Replayed "+str(number_of_events)+" events in "+format(elapsed,".3f")+
+                 " secs ("+format(report["throughput"],".0f")+" events/sec)")
+    for event_type, stats in report["latency"].items():
+        logging.info("Event Recorder: '"+event_type+"' - count="+str(stats["count"])+", mean="+format(stats["mean"],".3f")+
+                     "ms, p50="+format(stats["p50"],".3f")+"ms, p99="+format(stats["p99"],".3f")+"ms, max="+format(stats["max"],".3f")+"ms")
+    logging.info("Event Recorder: Final layout state hash "+report["statehash"])
+    return(report)
+
+###############################################################################################
@@ -0,0 +1,186 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides an opt-in "end to end" latency tracing facility - to find out where the
+# time goes between an event originating (a GPIO track sensor being triggered or a signal button
+# being clicked) and the resulting DCC commands being transmitted to the Pi-SPROG or the resulting
+# state changes being published to the MQTT broker. This is primarily intended as an aid to tuning
+# the Pi-SPROG 'transmit_delay' and the processing in the application's callback functions.
+#
+# When tracing is enabled, a correlation ID (trace ID) is allocated at each event origin and then
+# carried through the processing (across the hop into the main tkinter thread and on into the
+# Pi-SPROG transmit buffer). The elapsed time since the event originated is recorded at each stage
+# and the results accumulated into a histogram (and basic statistics) for each stage.
+#
+# The stages that are recorded are as follows:
+#    'sensor_trigger_filter' - GPIO sensor event has passed the trigger period filter
+#    'tkinter_thread_hop' - callback function is being executed in the main tkinter thread
+#    'signal_aspect_update' - the displayed aspect of a signal has been changed
+#    'dcc_mapping' - the DCC commands for a signal or point have been looked up (DCC mapping)
+#    'sprog_queued' - a CBUS command has been added to the Pi-SPROG output buffer
+#    'sprog_transmit' - a CBUS command has been written to the Pi-SPROG serial port
+#    'mqtt_publish' - a message has been published to the MQTT broker
+#
+# Public types and functions:
+#
+# enable_event_tracing - Enables the tracing of events (tracing is disabled by default)
+#    Optional Parameters:
+#       reset_statistics:bool - Clear down any previously recorded statistics - default = True
+#
+# disable_event_tracing - Disables the tracing of events (recorded statistics are retained)
+#
+# reset_trace_statistics - Clears down all the recorded trace statistics
+#
+# get_trace_statistics - returns a dictionary of the recorded statistics for each stage
+#    Returned dictionary - key is the stage name, value is a dictionary of:
+#       "count":int - the number of times the stage has been recorded
+#       "mean":float - the mean elapsed time from the event origin (in milliseconds)
+#       "min":float - the minimum elapsed time from the event origin (in milliseconds)
+#       "max":float - the maximum elapsed time from the event origin (in milliseconds)
+#       "histogram":dict - key is the upper bound of the histogram 'bucket' (in milliseconds)
+#                          value is the count (the last bucket has an upper bound of 'inf')
+#
+# log_trace_statistics - Writes a summary of the recorded statistics to the log (at INFO level)
+#-----------------------------------------------------------------------------------------------
+
+import threading
+import collections
+import logging
+import time
+
+#-----------------------------------------------------------------------------------------------
+# Global variables used by the module. The 'thread_context' holds the trace ID (if any) of the
+# event currently being processed by each thread. The 'active_traces' dictionary holds the start
+# time for each of the traces (limited to the most recent traces so it doesn't grow indefinitely)
+#-----------------------------------------------------------------------------------------------
+
+tracing_enabled = False
+trace_lock = threading.Lock()
+thread_context = threading.local()
+trace_counter = 0
+active_traces = collections.OrderedDict()
+max_active_traces = 1000
+stage_statistics = {}
+
+# The upper bounds of the histogram buckets (in milliseconds)
+histogram_buckets = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf"))
+
+#-----------------------------------------------------------------------------------------------
+# Public API functions to enable/disable tracing and access the recorded statistics
+#-----------------------------------------------------------------------------------------------
+
+def enable_event_tracing(reset_statistics:bool=True):
+    global tracing_enabled
+    if reset_statistics: reset_trace_statistics()
+    logging.info("Event Tracing: Enabling end to end event tracing")
+    tracing_enabled = True
+    return()
+
+def disable_event_tracing():
+    global tracing_enabled
+    logging.info("Event Tracing: Disabling end to end event tracing")
+    tracing_enabled = False
+    return()
+
+def reset_trace_statistics():
+    with trace_lock:
+        active_traces.clear()
+        stage_statistics.clear()
+    return()
+
+def get_trace_statistics():
+    statistics = {}
+    with trace_lock:
+        for stage, stage_data in stage_statistics.items():
+            statistics[stage] = {"count": stage_data["count"],
+                                 "mean": stage_data["total"] / stage_data["count"],
+                                 "min": stage_data["min"],
+                                 "max": stage_data["max"],
+                                 "histogram": dict(zip(histogram_buckets, stage_data["histogram"])) }
+    return(statistics)
+
+def log_trace_statistics():
+    statistics = get_trace_statistics()
+    for stage, stage_data in statistics.items():
+        logging.info("Event Tracing: Stage '"+stage+"' - count="+str(stage_data["count"])+
+                     ", mean="+format(stage_data["mean"],".3f")+"ms, min="+format(stage_data["min"],".3f")+
+                     "ms, max="+format(stage_data["max"],".3f")+"ms")
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal functions to start a trace (at the event origin), set/clear the trace ID for the
+# current thread and retrieve the trace ID for the current thread. Note that start_trace returns
+# None (and the other functions have no effect) if tracing has not been enabled
+#-----------------------------------------------------------------------------------------------
+
+def start_trace(origin:str):
+    global trace_counter
+    trace_id = None
+    if tracing_enabled:
+        with trace_lock:
+            trace_counter = trace_counter + 1
+            trace_id = trace_counter
+            active_traces[trace_id] = time.perf_counter()
+            if len(active_traces) > max_active_traces: active_traces.popitem(last=False)
+        logging.debug("Event Tracing: Starting trace "+str(trace_id)+" for "+origin)
+        thread_context.trace_id = trace_id
+    return(trace_id)
+
+def set_current_trace(trace_id):
+    thread_context.trace_id = trace_id
+    return()
+
+def end_current_trace():
+    thread_context.trace_id = None
+    return()
+
+def current_trace():
+    if not tracing_enabled: return(None)
+    return(getattr(thread_context, "trace_id", None))
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to record a stage for a trace (if no trace ID is specified then the trace
+# ID for the current thread is used). The elapsed time since the trace was started is added
+# to the statistics for the stage
+#-----------------------------------------------------------------------------------------------
+
+def record_trace_stage(stage:str, trace_id=None):
+    if tracing_enabled:
+        if trace_id is None: trace_id = getattr(thread_context, "trace_id", None)
+        if trace_id is not None:
+            timestamp = time.perf_counter()
+            with trace_lock:
+                if trace_id in active_traces:
+                    elapsed = (timestamp - active_traces[trace_id]) * 1000.0
+                    if stage not in stage_statistics:
+                        stage_statistics[stage] = {"count":0, "total":0.0, "min":elapsed, "max":elapsed,
+                                                   "histogram":[0] * len(histogram_buckets)}
+                    stage_data = stage_statistics[stage]
+                    stage_data["count"] += 1
+                    stage_data["total"] += elapsed
+                    stage_data["min"] = min(stage_data["min"], elapsed)
+                    stage_data["max"] = max(stage_data["max"], elapsed)
+                    for index, upper_bound in enumerate(histogram_buckets):
+                        if elapsed <= upper_bound:
+                            stage_data["histogram"][index] += 1
+                            break
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to "wrap" a callback function that is to be executed in another thread (i.e.
+# the main tkinter thread) so the trace ID for the current thread is carried across. If there is
+# no trace in progress then the callback function is returned unchanged
+#-----------------------------------------------------------------------------------------------
+
+def wrap_callback_with_current_trace(callback_function):
+    trace_id = current_trace()
+    if trace_id is None: return(callback_function)
+    def traced_callback():
+        set_current_trace(trace_id)
+        record_trace_stage("tkinter_thread_hop")
+        try: callback_function()
+        finally: end_current_trace()
+        return()
+    # The original function is retained so the callback can be identified (see callback_profiler)
+    traced_callback.__wrapped__ = callback_function
+    return(traced_callback)
+
+###############################################################################################
@@ -13,19 +13,70 @@
 #       file_name:str - to load/save - default = None (will default to 'main-python-script.sig')
 #       load_file_dialog:bool - Opens a 'load file' dialog to select a file - default = False
 #       save_file_dialog:bool - Opens a 'save file' dialog on application quit - default = False
+#       enable_journal:bool - Records all state changes to a journal file (as they happen) so the
+#                  layout state can be recovered following an unexpected shutdown (e.g. power cut).
+#                  The journal is replayed on load and periodically compacted into a snapshot file
+#                  (the files are '<file_name>.journal' and '<file_name>.journal.snapshot'). Note
+#                  that the '.sig' file itself is only ever written when the state is saved - so
+#                  quitting without saving still keeps the previously saved state - default = False
+#       compact_file:bool - Saves the layout state in a compact (rather than 'human readable')
+#                  json format - to minimise the file size for very large layouts - default = False
+#       binary_file:bool - Saves the layout state in a compact binary format (the format of the file
+#                  is automatically detected on load - so either format can be loaded) - default = False
+#
+# convert_layout_state_file - Converts a layout state file between the json and binary formats
+#                  (the format of the input file is automatically detected)
+#    Mandatory Parameters:
+#       input_file_name:str - The name of the layout state file to convert
+#       output_file_name:str - The name of the converted layout state file to create
+#    Optional Parameters:
+#       binary_file:bool - True to convert to binary format, False to convert to json - default = True
+#       compact_file:bool - Use the compact json format (if converting to json) - default = False
+#
+# load_state - Loads the initial state for all 'points', 'signals' and 'sections' from file without
+#              any user prompts or dialogs (for running signal boxes "headless"). As per the
+#              'load_layout_state' function this must be called before the items are created.
+#              Returns True if the layout state was successfully loaded (False otherwise)
+#    Mandatory Parameters:
+#       file_name:str - The name of the layout state file to load (and save on application quit)
+#    Optional Parameters:
+#       enable_journal:bool - Records all state changes to a journal file - default = False
+#       compact_file:bool - Saves the layout state in the compact json format - default = False
+#       binary_file:bool - Saves the layout state in the binary format - default = False
+#
+# save_state - Saves the current state for all 'points', 'signals' and 'sections' to file without
+#              any user prompts or dialogs. Returns True if the layout state was successfully saved
+#    Optional Parameters:
+#       file_name:str - The file to save - default = None (the file used for the load)
+#
+# configure_autosave - Periodically saves the current layout state to file (in the background). A
+#              save is triggered after the specified interval (if the state has changed) and/or after
+#              the specified number of state changes. All changes pending a save are coalesced into
+#              a single save and the file is written by a background thread. Set both 'interval' and
+#              'change_count' to zero to disable autosave.
+#    Optional Parameters:
+#       file_name:str - The file to save - default = None (the file used for the load)
+#       interval:float - The interval between saves (in seconds) - default = 60.0
+#       change_count:int - The number of state changes that triggers a save - default = 0 (disabled)
 #
 #------------------------------------------------------------------------------------------------
 
 import os
 import json
+import queue
+import threading
+import time
 import __main__
 import logging
 import tkinter.messagebox
 import tkinter.filedialog
+from . import common
 from . import signals_common
 from . import track_sections
 from . import block_instruments
 from . import points
+from . import binary_file_format
+from . import state_mirror
 
 #-------------------------------------------------------------------------------------------------
 # Global variables to define what options are presented to the user on application quit
@@ -33,6 +84,8 @@ from . import points
 
 filename_used_for_load = None
 save_as_option_enabled = True
+compact_file_format = False
+binary_file_selected = False
 
 #-------------------------------------------------------------------------------------------------
 # Global variable to hold the loaded layout state
@@ -40,6 +93,58 @@ save_as_option_enabled = True
 
 layout_state ={}
 
+# The loaded layout state is validated once (on load) into an index of the initial state for each
+# item - the key is the layout element and the value is a dictionary (keyed by the item ID) of the
+# validated item states. Layout elements not present in the loaded file are not included
+initial_state_index = {}
+
+#-------------------------------------------------------------------------------------------------
+# Global variables for the state journal. State changes are passed to a background writer thread
+# (via the queue) so that writing to the journal never blocks the main tkinter thread. The writer
+# thread applies each change to its own copy of the layout state ('journal_state') so it can
+# periodically compact the journal (by writing the complete state to the journal snapshot file)
+# without needing to access any of the data structures owned by the main tkinter thread. The
+# '.sig' file is never written by the journal (only when the user chooses to save the state)
+#-------------------------------------------------------------------------------------------------
+
+journal_config: dict = {}
+journal_config["journal_active"] = False
+journal_config["journal_filename"] = None
+journal_config["snapshot_filename"] = None
+journal_config["writer_thread"] = None
+journal_config["compact_on_start"] = False
+journal_config["sources"] = {}
+journal_queue = queue.Queue()
+journal_state = {}
+
+#-------------------------------------------------------------------------------------------------
+# Global variables for autosave. Snapshots of the layout state are taken in the main tkinter thread
+# and then passed to a background thread (via the queue) to be written to file. A save is only ever
+# requested if one isn't already pending - so a burst of changes results in a single save
+#-------------------------------------------------------------------------------------------------
+
+autosave_config: dict = {}
+autosave_config["autosave_enabled"] = False
+autosave_config["filename"] = None
+autosave_config["interval"] = 0.0
+autosave_config["change_count"] = 0
+autosave_config["changes_since_save"] = 0
+autosave_config["save_pending"] = False
+autosave_config["writer_thread"] = None
+autosave_queue = queue.Queue()
+
+# Lock for the autosave flags (changes are recorded in the application thread but are also read by
+# the autosave thread - which takes the snapshot itself if there is no tkinter root window)
+autosave_lock = threading.Lock()
+
+# Lock to ensure only one thread (autosave, journal compaction or save) writes a file at a time
+file_write_lock = threading.Lock()
+
+# The interval between journal writes (all changes in the interval are written with a single fsync)
+journal_sync_interval = 0.25
+# The number of journal records after which the journal is compacted into the snapshot file
+journal_compaction_threshold = 500
+
 #-------------------------------------------------------------------------------------------------
 # Define all the layout elements that needs to be saved/loaded for each module. This effectively
 # makes the remainder of the code generic. If we ever need to add another "layout_element" or
@@ -69,6 +174,10 @@ def get_sig_file_config(get_sig_file_data:bool = False):
         layout_elements["instruments"]["source"] = block_instruments.instruments
         
     return(layout_elements)
+
+# The "empty" initial state for each layout element (all item elements set to 'None')
+empty_item_states = { layout_element: dict.fromkeys([element[0] for element in element_config["elements"]])
+                          for layout_element, element_config in get_sig_file_config().items() }
     
 #-------------------------------------------------------------------------------------------------
 # Public API function to load the initial layout state from File (and also configure what options
@@ -77,18 +186,25 @@ def get_sig_file_config(get_sig_file_data:bool = False):
 
 def load_layout_state(file_name:str=None,
                       load_file_dialog:bool=False,
-                      save_file_dialog:bool=False):
+                      save_file_dialog:bool=False,
+                      enable_journal:bool=False,
+                      compact_file:bool=False,
+                      binary_file:bool=False):
     global logging
     global filename_used_for_load
     global save_as_option_enabled
-    global layout_state
+    global compact_file_format
+    global binary_file_selected
     # Get the name of the main python script as a string
     script_name = (__main__.__file__)
     default_file_name = script_name.rsplit('.',1)[0]+'.sig'
     # If the 'save_file_dialog' option has been specified then we save this to a global variable
     # to trigger the save file dialogue on quit of the application
     save_as_option_enabled = save_file_dialog
+    compact_file_format = compact_file
+    binary_file_selected = binary_file
     # We always prompt for load state on startup
+    state_loaded = False
     if not tkinter.messagebox.askokcancel("Load State","Do you want to load the last layout state?"):
         # if the user clicks on 'Cancel' then we still want to provide an option to save the layout
         # state on application quit - either using the filename passed to us or the default filename
@@ -129,26 +245,93 @@ def load_layout_state(file_name:str=None,
             else: filename = default_file_name
         else:
             # We have a valid filename so can proceed to try and open the file
+            state_loaded = True
             logging.info("Load File - Loading layout state information from '"+filename+"'")
-            try:
-                with open (filename,'r') as file:
-                    file_contents=file.read()
-                file.close
-            except Exception as exception:
-                logging.error("Load File - Error opening file - Layout will be created in its default state")
-                logging.error("Load File - Reported Exception: "+str(exception))
-            else:
-                # The file has been successfuly opened and loaded - Now convert it from the json format back
-                # into the dictionary of signals, points and sections - with exception handling in case it fails
-                try:
-                    layout_state = json.loads(file_contents)
-                except Exception as exception:
-                    logging.error("Load File - Couldn't read file - Layout will be created in its default state")
-                    logging.error("Load File - Reported exception: "+str(exception))
+            read_layout_state_file(filename)
     # store the filename that was used (or attempted) - to use on application quit
     filename_used_for_load = filename
+    # Replay any state changes recorded in the journal (following an unexpected shutdown) and then
+    # start journaling. If the user chose not to load the layout state then the journal is discarded
+    if enable_journal:
+        if state_loaded: replay_journal(filename+".journal")
+        start_journal(filename,compact_on_start=state_loaded)
+    # Validate the loaded state (once) so the initial state of each item can simply be looked up
+    build_initial_state_index()
     return()
 
+#-------------------------------------------------------------------------------------------------
+# Public API function to load the initial layout state from File without any user prompts or
+# dialogs (for signal boxes running "headless"). The file is also used for the save on quit
+#-------------------------------------------------------------------------------------------------
+
+def load_state(file_name:str,
+               enable_journal:bool=False,
+               compact_file:bool=False,
+               binary_file:bool=False):
+    global logging
+    global filename_used_for_load
+    global save_as_option_enabled
+    global compact_file_format
+    global binary_file_selected
+    save_as_option_enabled = False
+    compact_file_format = compact_file
+    binary_file_selected = binary_file
+    filename_used_for_load = file_name
+    logging.info("Load File - Loading layout state information from '"+file_name+"'")
+    state_loaded = read_layout_state_file(file_name)
+    if enable_journal:
+        replay_journal(file_name+".journal")
+        start_journal(file_name,compact_on_start=True)
+    build_initial_state_index()
+    return(state_loaded)
+
+#-------------------------------------------------------------------------------------------------
+# Internal function to read and decode a layout state file into the 'layout_state' global variable
+# Returns True if successful. Any errors are logged (and the layout created in its default state)
+#-------------------------------------------------------------------------------------------------
+
+def read_layout_state_file(filename:str):
+    global logging
+    global layout_state
+    state_loaded = False
+    try:
+        with open (filename,'rb') as file:
+            file_contents=file.read()
+    except Exception as exception:
+        logging.error("Load File - Error opening file - Layout will be created in its default state")
+        logging.error("Load File - Reported Exception: "+str(exception))
+    else:
+        # The file has been successfuly opened and loaded - Now convert it from the json (or binary) format
+        # back into the dictionary of signals, points and sections - with exception handling in case it fails
+        try:
+            layout_state = decode_layout_state_file(file_contents)
+            state_loaded = True
+        except Exception as exception:
+            logging.error("Load File - Couldn't read file - Layout will be created in its default state")
+            logging.error("Load File - Reported exception: "+str(exception))
+    return(state_loaded)
+
+#-------------------------------------------------------------------------------------------------
+# Public API function to save the current layout state to File without any user prompts or dialogs.
+# The file is written in the calling thread (so the state is on disk when the function returns)
+#-------------------------------------------------------------------------------------------------
+
+def save_state(file_name:str=None):
+    global logging
+    if file_name is None: file_name = filename_used_for_load
+    state_saved = False
+    if file_name is None:
+        logging.error("Save File - No file name specified and no layout state file has been loaded")
+    else:
+        logging.info("Saving Layout State Information as '"+file_name+"'")
+        try:
+            write_layout_state_file(file_name, take_layout_state_snapshot(),
+                        compact=compact_file_format, binary=binary_file_selected)
+            state_saved = True
+        except Exception as exception:
+            logging.error("Save File - Error saving file - Reported exception: "+str(exception))
+    return(state_saved)
+
 #-------------------------------------------------------------------------------------------------
 # Function called on application quit to save the current layout state to file. The actual options 
 # presented to the user will depend on the 'save_as_option_enabled' and 'filename' global variables
@@ -200,110 +383,471 @@ def save_state_and_quit():
                 path,name = os.path.split(filename)
                 filename = name            
                 logging.info("Saving Layout State Information as '"+filename+"'")
-                # Create a dictionary to hold the data we need to save 
-                dictionary_to_save ={"info": "Model Railway Signalling State File"}
-                # Retrieve the DEFINITION of all the data items we need to save to maintain state
-                # These are defined in a single function at the top of this source file. We also
-                # retrieve the source DATA we need to save from the various source dictionaries
-                layout_elements = get_sig_file_config(get_sig_file_data=True)
-                # Iterate through the main LAYOUT-ELEMENTS (e.g. signals, points, sections etc)
-                for layout_element in layout_elements:
-                    # For each LAYOUT ELEMENT create a sub-dictionary to hold the individual ITEMS
-                    # The individual ITEMS will be the individual points, signals, sections etc
-                    dictionary_to_save[layout_element] = {}
-                    # Get the dictionary containing the source data for this LAYOUT ELEMENT
-                    source_data_dictionary = layout_elements[layout_element]["source"]
-                    # Get the list of the ITEM ELEMENTS we need to save for this LAYOUT ELEMENT
-                    item_elements_to_save = layout_elements[layout_element]["elements"]
-                    # Iterate through the ITEMS that exist for this LAYOUT ELEMENT
-                    # Each ITEM represents a specific signal, point, section etc
-                    for item in source_data_dictionary:
-                        # For each ITEM, create a sub-dictionary to hold the individual ITEM ELEMENTS
-                        # Each ITEM ELEMENT represents a specific parameter for an ITEM (e.g."sigclear") 
-                        dictionary_to_save[layout_element][item] = {}
-                        # Iterate through the ITEM ELEMENTS to save for the specific ITEM
-                        for item_element in item_elements_to_save:
-                            # Value [0] is the element name, Value [1] is the element type
-                            if item_element[0] not in source_data_dictionary[item].keys():
-                                # if the element isn't present in the source dict then we save a NULL value
-                               dictionary_to_save[layout_element][item][item_element[0]] = None
-                            elif item_element[1]=="enum":
-                                # Enumeration values cannot be converted to json as is - we need to use the value
-                                parameter = source_data_dictionary[item][item_element[0]]
-                                dictionary_to_save[layout_element][item][item_element[0]] = parameter.value
-                            else:
-                                # The Json conversion should support all standard python types
-                                parameter = source_data_dictionary[item][item_element[0]]
-                                dictionary_to_save[layout_element][item][item_element[0]] = parameter
-                # convert the file to a human readable json format and save the file
-                file_contents = json.dumps(dictionary_to_save,indent=4,sort_keys=True)
-                try:
-                    with open (filename,'w') as file:
-                        file.write(file_contents)
-                    file.close
-                except Exception as exception:
-                    logging.error("Save File - Error saving file - Reported exception: "+str(exception))
+                # Take a snapshot of the current layout state (this is the only part of the save that
+                # needs to be done in the main tkinter thread) and then write the file from the snapshot
+                # in a worker thread. This is deliberately NOT a daemon thread - so the application will
+                # not exit until the file has been written. The journal (if enabled) is stopped first
+                # and then deleted (with the journal snapshot) once the file has been saved
+                layout_state_snapshot = take_layout_state_snapshot()
+                stop_autosave()
+                stop_journal(delete_journal=False)
+                save_thread = threading.Thread(target=thread_to_save_layout_state,
+                                args=(filename,layout_state_snapshot,compact_file_format,binary_file_selected))
+                save_thread.start()
+        # The journal is no longer needed if the user has chosen to quit without saving (the '.sig'
+        # file is never written by the journal so this still holds the previously saved state)
+        if quit_application and not save_application:
+            stop_autosave()
+            stop_journal(delete_journal=True)
     return (quit_application)
 
 #-------------------------------------------------------------------------------------------------
-# Function called on creation of a signal/point/section/instrument Object to return the initial state
-# from the loaded data. If no layout state has been loaded or the loaded data doesn't include an
-# entry for the Object then we return 'None' and the Object will retain its "as created" default state
+# Internal function to take a snapshot of the current layout state (to be saved to file). Rather
+# than building a complete nested copy of the layout, the snapshot is just a list of the element
+# (name, value) pairs for each item - in the form {layout_element: [(item_id, [(name, value),]),]}
 #-------------------------------------------------------------------------------------------------
 
-def get_initial_item_state(layout_element:str,item_id:int):
+def take_layout_state_snapshot():
+    snapshot = {}
+    # Retrieve the DEFINITION of all the data items we need to save to maintain state
+    # These are defined in a single function at the top of this source file. We also
+    # retrieve the source DATA we need to save from the various source dictionaries
+    layout_elements = get_sig_file_config(get_sig_file_data=True)
+    for layout_element, element_config in layout_elements.items():
+        snapshot[layout_element] = []
+        for item_id, source_item in element_config["source"].items():
+            item_elements = []
+            for element_name, element_type in element_config["elements"]:
+                # if the element isn't present in the source dict then we save a NULL value
+                if element_name not in source_item.keys(): item_elements.append((element_name, None))
+                # Enumeration values cannot be converted to json as is - we need to use the value
+                elif element_type == "enum": item_elements.append((element_name, source_item[element_name].value))
+                else: item_elements.append((element_name, source_item[element_name]))
+            snapshot[layout_element].append((item_id, item_elements))
+    return(snapshot)
+
+#-------------------------------------------------------------------------------------------------
+# Internal function to write a layout state snapshot to file. The items are serialised directly
+# to a temporary file (which then atomically replaces the '.sig' file - so an interruption part
+# way through the write can never leave us with a corrupted file). The default 'human readable'
+# format is identical to that produced by 'json.dumps(indent=4,sort_keys=True)'. The compact
+# format omits all the whitespace (to minimise the file size for very large layouts). The binary
+# format is encoded by the binary_file_format module (see that module for details of the format)
+#-------------------------------------------------------------------------------------------------
+
+def write_layout_state_file(filename:str, snapshot:dict, compact:bool=False, binary:bool=False):
+    with file_write_lock:
+        write_layout_state_to_temporary_file(filename, snapshot, compact, binary)
+        os.replace(filename+".tmp",filename)
+    return()
+
+def write_layout_state_to_temporary_file(filename:str, snapshot:dict, compact:bool, binary:bool):
+    temporary_filename = filename+".tmp"
+    if binary:
+        file_contents = binary_file_format.encode_layout_state(snapshot, get_sig_file_config())
+        with open (temporary_filename,'wb') as file:
+            file.write(file_contents)
+            file.flush()
+            os.fsync(file.fileno())
+        return()
+    if compact: indent1, indent2, indent3, separator = "", "", "", ":"
+    else: indent1, indent2, indent3, separator = "\n    ", "\n        ", "\n            ", ": "
+    with open (temporary_filename,'w') as file:
+        file.write("{"+indent1+json.dumps("info")+separator+json.dumps("Model Railway Signalling State File"))
+        for layout_element in sorted(snapshot.keys()):
+            file.write(","+indent1+json.dumps(layout_element)+separator+"{")
+            items = sorted(snapshot[layout_element], key=lambda item: str(item[0]))
+            for item_index, (item_id, item_elements) in enumerate(items):
+                if item_index > 0: file.write(",")
+                file.write(indent2+json.dumps(str(item_id))+separator+"{")
+                lines = [indent3+json.dumps(name)+separator+json.dumps(value) for name, value in sorted(item_elements)]
+                file.write(",".join(lines)+(indent2 if len(lines) > 0 else "")+"}")
+            file.write((indent1 if len(items) > 0 else "")+"}")
+        file.write(indent1[:1]+"}")
+        file.flush()
+        os.fsync(file.fileno())
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal function to decode the contents of a layout state file (automatically detecting whether
+# the file is in the binary or json format). Raises an exception if the file can't be decoded
+#-------------------------------------------------------------------------------------------------
+
+def decode_layout_state_file(file_contents:bytes):
+    if binary_file_format.is_binary_format(file_contents):
+        return(binary_file_format.decode_layout_state(file_contents))
+    return(json.loads(file_contents.decode("utf-8")))
+
+#-------------------------------------------------------------------------------------------------
+# Public API function to convert a layout state file between the json and binary formats
+#-------------------------------------------------------------------------------------------------
+
+def convert_layout_state_file(input_file_name:str, output_file_name:str,
+                              binary_file:bool=True, compact_file:bool=False):
     global logging
-    # Retrieve the DEFINITION of all the data items that are available
-    sig_file_config = get_sig_file_config()
-    # Check if the requested LAYOUT ELEMENT is a supported
-    if layout_element not in sig_file_config.keys():
-        logging.error("File Interface - Item type not supported : "+layout_element)
-        state_to_return = None
+    logging.info("Convert File - Converting '"+input_file_name+"' to '"+output_file_name+"'")
+    try:
+        with open (input_file_name,'rb') as file:
+            loaded_state = decode_layout_state_file(file.read())
+        snapshot = {}
+        for layout_element in get_sig_file_config().keys():
+            if isinstance(loaded_state.get(layout_element),dict):
+                snapshot[layout_element] = [(item_id, list(item_state.items()))
+                        for item_id, item_state in loaded_state[layout_element].items()]
+        write_layout_state_file(output_file_name, snapshot, compact=compact_file, binary=binary_file)
+    except Exception as exception:
+        logging.error("Convert File - Error converting file - Reported exception: "+str(exception))
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal thread to save the layout state (from a snapshot) on application quit - the journal
+# files (if they exist) are deleted once the layout state has been successfully saved
+#-------------------------------------------------------------------------------------------------
+
+def thread_to_save_layout_state(filename:str, snapshot:dict, compact:bool, binary:bool):
+    global logging
+    try:
+        write_layout_state_file(filename, snapshot, compact=compact, binary=binary)
+    except Exception as exception:
+        logging.error("Save File - Error saving file - Reported exception: "+str(exception))
     else:
-        # Create a dictionary to hold the state information we want to return
-        state_to_return = {}
-        # Iterate through the ITEM ELEMENTS we are interested in for the LAYOUT ELEMENT and
-        # set an initial value of NONE (to be returned if we fail to validate the loaded data)
-        for item_element in sig_file_config[layout_element]["elements"]:
-            # retrieve the required ITEM ELEMENT Name
-            item_element_name = item_element[0]
-            state_to_return[item_element_name] = None
-        # See if the specified LAYOUT ELEMENT exists in the loaded file 
-        if not layout_element in layout_state.keys():
-            # This could be a valid condition if no file has been loaded - fail silently
-            pass
-        # See if the specified ITEM (for the LAYOUT ELEMENT) exists in the loaded file
-        elif str(item_id) not in layout_state[layout_element].keys():
-            # We know a file is loaded - therefore this is a valid error to report
-            logging.warning("File Interface - Data missing for '"+layout_element+"-"
-                                                +str(item_id)+"' - Default values will be set")
+        delete_journal_files()
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal function called by the signals/points/sections/instruments modules whenever the state
+# of an item (i.e. one of the elements saved to file) has changed. If journaling is active then
+# the current state of the item is captured and queued for the background journal writer thread.
+# The shared memory state mirror (if enabled) is also updated
+#-------------------------------------------------------------------------------------------------
+
+def record_state_change(layout_element:str,item_id):
+    state_mirror.item_state_changed(layout_element,item_id)
+    if journal_config["journal_active"]:
+        source_item = journal_config["sources"][layout_element]["source"][str(item_id)]
+        item_state = {}
+        for element_name, element_type in journal_config["sources"][layout_element]["elements"]:
+            if element_name not in source_item.keys(): item_state[element_name] = None
+            elif element_type == "enum": item_state[element_name] = source_item[element_name].value
+            else: item_state[element_name] = source_item[element_name]
+        journal_queue.put((layout_element,str(item_id),item_state))
+    if autosave_config["autosave_enabled"]:
+        with autosave_lock:
+            autosave_config["changes_since_save"] = autosave_config["changes_since_save"] + 1
+            save_due = 0 < autosave_config["change_count"] <= autosave_config["changes_since_save"]
+        if save_due: request_autosave()
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal function to replay the state changes recorded in the journal into the loaded layout
+# state. If the journal has been compacted then the journal snapshot holds the complete state at
+# the time of the compaction (which supersedes the state loaded from the '.sig' file). Each journal
+# record is a single line of compact json - any incomplete/corrupted records (e.g. a record that
+# was only partially written at the time of a power cut) are ignored
+#-------------------------------------------------------------------------------------------------
+
+def replay_journal(journal_filename:str):
+    global logging
+    global layout_state
+    snapshot_filename = journal_filename+".snapshot"
+    if os.path.isfile(snapshot_filename):
+        try:
+            with open (snapshot_filename,'rb') as file:
+                layout_state = decode_layout_state_file(file.read())
+            logging.info("Load File - Loaded layout state from journal snapshot '"+snapshot_filename+"'")
+        except Exception as exception:
+            logging.error("Load File - Error reading journal snapshot - Reported Exception: "+str(exception))
+    if os.path.isfile(journal_filename):
+        replayed_records = 0
+        try:
+            with open (journal_filename,'r') as file:
+                for line in file:
+                    try:
+                        layout_element, item_id, item_state = json.loads(line)
+                    except Exception:
+                        logging.warning("Load File - Ignoring incomplete or corrupted journal record")
+                    else:
+                        if layout_element not in layout_state.keys(): layout_state[layout_element] = {}
+                        layout_state[layout_element][item_id] = item_state
+                        replayed_records = replayed_records + 1
+        except Exception as exception:
+            logging.error("Load File - Error reading journal file - Reported Exception: "+str(exception))
+        logging.info("Load File - Replayed "+str(replayed_records)+" state changes from journal '"+journal_filename+"'")
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal functions to start and stop the journal writer thread. When stopping, the thread writes
+# out any queued state changes before exiting (the journal files can then be deleted if required)
+#-------------------------------------------------------------------------------------------------
+
+def start_journal(filename:str,compact_on_start:bool=False):
+    global logging
+    global journal_state
+    if not journal_config["journal_active"]:
+        logging.info("Load File - Recording layout state changes to journal '"+filename+".journal'")
+        journal_config["compact_on_start"] = compact_on_start
+        journal_config["journal_filename"] = filename+".journal"
+        journal_config["snapshot_filename"] = filename+".journal.snapshot"
+        journal_config["sources"] = get_sig_file_config(get_sig_file_data=True)
+        # The writer thread maintains its own copy of the layout state (for compaction)
+        journal_state = json.loads(json.dumps(layout_state))
+        journal_config["journal_active"] = True
+        journal_config["writer_thread"] = threading.Thread(target=thread_to_write_journal)
+        journal_config["writer_thread"].daemon = True
+        journal_config["writer_thread"].start()
+    return()
+
+def stop_journal(delete_journal:bool=False):
+    global logging
+    if journal_config["journal_active"]:
+        journal_config["journal_active"] = False
+        journal_queue.put(None)
+        journal_config["writer_thread"].join()
+        journal_config["writer_thread"] = None
+        if delete_journal: delete_journal_files()
+    return()
+
+def delete_journal_files():
+    global logging
+    for filename in (journal_config["journal_filename"], journal_config["snapshot_filename"]):
+        if filename is not None and os.path.isfile(filename):
+            try: os.remove(filename)
+            except Exception as exception:
+                logging.error("Save File - Error deleting journal file - Reported exception: "+str(exception))
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal thread to write the queued state changes to the journal. All changes queued during the
+# sync interval are written together (with a single fsync) to limit the load on the SD card. The
+# journal is compacted (the complete state written to the journal snapshot file and the journal
+# truncated) once the number of records exceeds the threshold - and also when the journal is
+# started if the state was loaded (so any state changes replayed on load are written to the
+# snapshot straight away). If the user chose not to load the state then the existing journal
+# (and journal snapshot) are simply discarded
+#-------------------------------------------------------------------------------------------------
+
+def thread_to_write_journal():
+    global logging
+    records_in_journal = 0
+    try:
+        journal_file = open(journal_config["journal_filename"],'a')
+        if journal_config["compact_on_start"]:
+            compact_journal(journal_file)
+        else:
+            journal_file.truncate(0)
+            if os.path.isfile(journal_config["snapshot_filename"]): os.remove(journal_config["snapshot_filename"])
+    except Exception as exception:
+        logging.error("Save File - Error opening journal file - Reported exception: "+str(exception))
+        journal_config["journal_active"] = False
+        return()
+    stop_requested = False
+    while not stop_requested:
+        records = [journal_queue.get()]
+        while not journal_queue.empty(): records.append(journal_queue.get())
+        lines = []
+        for record in records:
+            if record is None:
+                stop_requested = True
+            else:
+                layout_element, item_id, item_state = record
+                if layout_element not in journal_state.keys(): journal_state[layout_element] = {}
+                journal_state[layout_element][item_id] = item_state
+                lines.append(json.dumps(record,separators=(',',':'))+"\n")
+        try:
+            if len(lines) > 0:
+                journal_file.write("".join(lines))
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+                records_in_journal = records_in_journal + len(lines)
+            if records_in_journal >= journal_compaction_threshold:
+                compact_journal(journal_file)
+                records_in_journal = 0
+        except Exception as exception:
+            logging.error("Save File - Error writing journal file - Reported exception: "+str(exception))
+        if not stop_requested: time.sleep(journal_sync_interval)
+    journal_file.close()
+    return()
+
+def compact_journal(journal_file):
+    global logging
+    logging.debug("Save File - Compacting journal into '"+journal_config["snapshot_filename"]+"'")
+    # Write the complete state to the snapshot (via a temporary file) and then truncate the journal
+    snapshot = {}
+    for layout_element in journal_state.keys():
+        if isinstance(journal_state[layout_element],dict):
+            snapshot[layout_element] = [(item_id, list(item_state.items()))
+                        for item_id, item_state in journal_state[layout_element].items()]
+    write_layout_state_file(journal_config["snapshot_filename"], snapshot, compact=compact_file_format, binary=binary_file_selected)
+    journal_file.seek(0)
+    journal_file.truncate()
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Public API function to configure autosave. The background autosave thread is started (or
+# re-configured) - and stopped if both the interval and the change count are zero
+#-------------------------------------------------------------------------------------------------
+
+def configure_autosave(file_name:str=None, interval:float=60.0, change_count:int=0):
+    global logging
+    stop_autosave()
+    if file_name is None: file_name = filename_used_for_load
+    if file_name is None:
+        logging.error("Autosave - No file name specified and no layout state file has been loaded")
+    elif interval > 0 or change_count > 0:
+        logging.info("Autosave - Saving layout state to '"+file_name+"' - interval="+str(interval)+
+                                 " secs, change count="+str(change_count))
+        autosave_config["filename"] = file_name
+        autosave_config["interval"] = interval
+        autosave_config["change_count"] = change_count
+        with autosave_lock:
+            autosave_config["changes_since_save"] = 0
+            autosave_config["save_pending"] = False
+        autosave_config["autosave_enabled"] = True
+        autosave_config["writer_thread"] = threading.Thread(target=thread_to_autosave_layout_state)
+        autosave_config["writer_thread"].daemon = True
+        autosave_config["writer_thread"].start()
+    return()
+
+def stop_autosave():
+    if autosave_config["autosave_enabled"]:
+        autosave_config["autosave_enabled"] = False
+        autosave_queue.put(None)
+        autosave_config["writer_thread"].join()
+        autosave_config["writer_thread"] = None
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal functions to request an autosave (from any thread) and to take the snapshot for the
+# autosave (in the main tkinter thread). A save is only requested if one isn't already pending.
+# If there is no tkinter root window then the snapshot is taken in the requesting thread (which
+# may be the autosave thread) - so the layout may be changing whilst the snapshot is being taken.
+# Any error taking the snapshot is logged and the changes are left outstanding (to be saved with
+# the next snapshot) - so a failed snapshot can never stop the autosave thread
+#-------------------------------------------------------------------------------------------------
+
+def request_autosave():
+    with autosave_lock:
+        save_requested = autosave_config["autosave_enabled"] and not autosave_config["save_pending"]
+        if save_requested: autosave_config["save_pending"] = True
+    if save_requested:
+        if common.root_window is not None:
+            if not common.shutdown_initiated:
+                common.execute_function_in_tkinter_thread(take_autosave_snapshot)
         else:
-            # Iterate through the ITEM ELEMENTS we are interested in for the LAYOUT ELEMENT
-            for item_element in sig_file_config[layout_element]["elements"]:
-                # retrieve the required ITEM ELEMENT Name and expected ITEM ELEMENT Type
-                element_name = item_element[0]
-                element_type = item_element[1]
-                # Test to see if the required ITEM ELEMENT is present for the ITEM
-                if element_name not in layout_state[layout_element][str(item_id)]:
-                    logging.warning("File Interface - Data missing for '"+layout_element +"-"
-                            +str(item_id)+"-"+element_name+"' - Default value will be set")
+            take_autosave_snapshot()
+    return()
+
+def take_autosave_snapshot():
+    global logging
+    with autosave_lock:
+        autosave_config["save_pending"] = False
+        changes_in_snapshot = autosave_config["changes_since_save"]
+    if autosave_config["autosave_enabled"]:
+        try:
+            snapshot = take_layout_state_snapshot()
+        except Exception as exception:
+            logging.error("Autosave - Error taking layout state snapshot - Reported exception: "+str(exception))
+        else:
+            with autosave_lock:
+                autosave_config["changes_since_save"] = autosave_config["changes_since_save"] - changes_in_snapshot
+            autosave_queue.put(snapshot)
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal thread to write the autosave snapshots to file. If the interval expires without a save
+# having been triggered (by the change count) then a save is requested if the state has changed.
+# If several snapshots have been queued then only the latest one needs to be written
+#-------------------------------------------------------------------------------------------------
+
+def thread_to_autosave_layout_state():
+    global logging
+    timeout = autosave_config["interval"] if autosave_config["interval"] > 0 else None
+    stop_requested = False
+    while not stop_requested:
+        try:
+            snapshot = autosave_queue.get(timeout=timeout)
+        except queue.Empty:
+            with autosave_lock: save_due = autosave_config["changes_since_save"] > 0
+            if save_due: request_autosave()
+            continue
+        snapshots = [snapshot]
+        while not autosave_queue.empty(): snapshots.append(autosave_queue.get())
+        if None in snapshots:
+            stop_requested = True
+            snapshots.remove(None)
+        if len(snapshots) > 0:
+            snapshot = snapshots[-1]
+            logging.debug("Autosave - Saving layout state to '"+autosave_config["filename"]+"'")
+            try:
+                write_layout_state_file(autosave_config["filename"], snapshot,
+                            compact=compact_file_format, binary=binary_file_selected)
+            except Exception as exception:
+                logging.error("Autosave - Error saving file - Reported exception: "+str(exception))
+    return()
+
+#-------------------------------------------------------------------------------------------------
+# Internal function to validate the loaded layout state (once) and build the index of the initial
+# state for each item. Elements that are missing or fail the basic type validation are set to 'None'
+# (so the item will retain its "as created" default for that element). All the problems found are
+# reported together (as a single warning) rather than as each item is created
+#-------------------------------------------------------------------------------------------------
+
+def build_initial_state_index():
+    global logging
+    global initial_state_index
+    initial_state_index = {}
+    problems_found = []
+    for layout_element, element_config in get_sig_file_config().items():
+        # This could be a valid condition if no file has been loaded (or an element type wasn't saved)
+        if not isinstance(layout_state,dict) or not isinstance(layout_state.get(layout_element),dict): continue
+        initial_state_index[layout_element] = {}
+        for item_id, loaded_item in layout_state[layout_element].items():
+            item_state = dict(empty_item_states[layout_element])
+            if not isinstance(loaded_item,dict):
+                problems_found.append("Data corrupted for '"+layout_element+"-"+str(item_id)+"'")
+                loaded_item = dict(item_state)
+            for element_name, element_type in element_config["elements"]:
+                if element_name not in loaded_item.keys():
+                    problems_found.append("Data missing for '"+layout_element+"-"+str(item_id)+"-"+element_name+"'")
                 else:
-                    # Retrieve the ITEM ELEMENT Value from the loaded data
-                    element_value = layout_state[layout_element][str(item_id)][element_name]
-                    # We can do some basic validation on the loaded data to check the expected type 
-                    if element_type == "bool" and not isinstance(element_value,bool) and element_value is not None:
-                        logging.warning("File Interface - Data corrupted for '"+layout_element
-                                +"-"+str(item_id)+"-"+element_name+"' - Default value will be set")
-                    elif element_type == "str" and not isinstance(element_value,str) and element_value is not None: 
-                        logging.warning("File Interface - Data corrupted for '"+layout_element
-                                +"-"+str(item_id)+"-"+element_name+"' - Default value will be set")
-                    elif element_type == "enum" and not isinstance(element_value,int) and element_value is not None:
-                        logging.warning("File Interface - Data corrupted for '"+layout_element
-                                +"-"+str(item_id)+"-"+element_name+"' - Default value will be set")
+                    element_value = loaded_item[element_name]
+                    # We can do some basic validation on the loaded data to check the expected type
+                    if ( element_value is not None and
+                         ( (element_type == "bool" and not isinstance(element_value,bool)) or
+                           (element_type == "str" and not isinstance(element_value,str)) or
+                           (element_type == "enum" and not isinstance(element_value,int)) ) ):
+                        problems_found.append("Data corrupted for '"+layout_element+"-"+str(item_id)+"-"+element_name+"'")
                     else:
-                        # Add the ITEM ELEMENT (and the loaded ITEM VALUE) to the dictionary
-                        state_to_return[element_name] = element_value
+                        item_state[element_name] = element_value
+            initial_state_index[layout_element][str(item_id)] = item_state
+    if len(problems_found) > 0:
+        logging.warning("File Interface - "+str(len(problems_found))+" problem(s) found in the loaded layout state"+
+                        " - Default values will be set:\n    "+"\n    ".join(problems_found))
+    return()
 
-    return(state_to_return)
+#-------------------------------------------------------------------------------------------------
+# Function called on creation of a signal/point/section/instrument Object to return the initial state
+# from the loaded data. If no layout state has been loaded or the loaded data doesn't include an
+# entry for the Object then we return 'None' and the Object will retain its "as created" default state
+# The loaded data is validated on load - so this is just a lookup (we return a copy of the item state
+# as some of the calling functions convert the loaded values - e.g. into the Enum types)
+#-------------------------------------------------------------------------------------------------
+
+def get_initial_item_state(layout_element:str,item_id:int):
+    global logging
+    if layout_element in initial_state_index.keys():
+        item_state = initial_state_index[layout_element].get(str(item_id))
+        if item_state is not None:
+            return(dict(item_state))
+        # We know a file is loaded - therefore this is a valid error to report
+        logging.warning("File Interface - Data missing for '"+layout_element+"-"
+                                            +str(item_id)+"' - Default values will be set")
+    elif layout_element not in empty_item_states.keys():
+        logging.error("File Interface - Item type not supported : "+layout_element)
+        return(None)
+    # Return the "empty" state (all elements set to 'None') so the default values will be used
+    return(dict(empty_item_states[layout_element]))
 
 ############################################################################################################
\ No newline at end of file
@@ -0,0 +1,190 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides a lightweight "in-process" stand-in for the RPi.GPIO package. It is selected
+# by calling 'configure_gpio_backend' (in the track_sensors module) with simulated=True and allows
+# the track sensor debounce/timeout behaviour and throughput to be tested and benchmarked on any
+# machine (not just a Raspberry Pi). Input edges are injected programmatically - either by setting
+# the input levels directly or by running a timed "script" of input level changes (which can
+# include bounce/noise patterns created with 'create_bounce_pattern').
+#
+# In the same way as RPi.GPIO, the edge callbacks are made from a single background "callback
+# thread" (edges are queued for this thread so the thread injecting the edges is never blocked).
+# Only the subset of the RPi.GPIO interface used by the track_sensors module is supported -
+# setmode, setup, add_event_detect and input (with the BCM, IN, PUD_UP and FALLING constants)
+#
+# Simulated input banks (16 bit port expanders - see 'create_input_bank' in the track_sensors
+# module - created with a device of "simulated") are also supported. The inputs of an input bank
+# are specified as a tuple of (bank_id, input) wherever a GPIO channel can be specified.
+#
+# Public types and functions:
+#
+# set_simulated_input - Sets the level of a simulated GPIO input (falling edges are detected)
+#   Mandatory Parameters:
+#       gpio_channel:int - The GPIO port number (or a tuple of (bank_id, input) for an input bank)
+#       level:int - The input level (0 = Low = sensor active, 1 = High = sensor inactive)
+#
+# pulse_simulated_input - Makes a simulated GPIO input active (low) for the specified duration.
+#                         The function blocks until the pulse has completed
+#   Mandatory Parameters:
+#       gpio_channel:int - The GPIO port number
+#   Optional Parameters:
+#       active_duration:float - The duration of the pulse (seconds) - default = 0.1
+#       bounces:int - The number of "bounces" at the start/end of the pulse - default = 0
+#       bounce_interval:float - The time between each bounce transition (seconds) - default = 0.0005
+#
+# create_bounce_pattern - Returns a script (see 'run_simulated_input_script') for a single pulse
+#                         on an input - with optional "bounces" (short transitions between the
+#                         levels) at the start and end of the pulse to simulate switch/sensor noise
+#   Mandatory Parameters:
+#       gpio_channel:int - The GPIO port number
+#   Optional Parameters:
+#       start_time:float - The time offset (seconds) for the start of the pulse - default = 0.0
+#       active_duration:float - The duration of the pulse (seconds) - default = 0.1
+#       bounces:int - The number of "bounces" at the start/end of the pulse - default = 0
+#       bounce_interval:float - The time between each bounce transition (seconds) - default = 0.0005
+#
+# run_simulated_input_script - Runs a timed script of input level changes
+#   Mandatory Parameters:
+#       script:list - a list of (time_offset:float, gpio_channel:int, level:int) - the time
+#                     offsets are in seconds from the start of the script (in any order)
+#   Optional Parameters:
+#       speed:float - The speed factor for running the script (2.0 = twice as fast) - default = 1.0
+#       blocking:bool - Wait for the script to complete before returning - default = True
+#-----------------------------------------------------------------------------------------------
+
+import threading
+import queue
+import time
+import logging
+
+#-----------------------------------------------------------------------------------------------
+# The subset of the RPi.GPIO constants used by the track_sensors module
+#-----------------------------------------------------------------------------------------------
+
+BCM = 11
+IN = 1
+PUD_UP = 22
+FALLING = 32
+
+#-----------------------------------------------------------------------------------------------
+# Global variables for the simulated GPIO inputs. The callback thread is started when the first
+# edge detection callback is added
+#-----------------------------------------------------------------------------------------------
+
+gpio_lock = threading.Lock()
+input_levels: dict = {}
+bank_levels: dict = {}
+edge_callbacks: dict = {}
+edge_queue = queue.Queue()
+callback_thread = None
+
+#-----------------------------------------------------------------------------------------------
+# The RPi.GPIO functions used by the track_sensors module
+#-----------------------------------------------------------------------------------------------
+
+def setmode(mode:int):
+    return()
+
+def setup(gpio_channel:int, direction:int, pull_up_down:int=PUD_UP):
+    # Inputs are pulled up (inactive) when they are set up
+    with gpio_lock:
+        input_levels[gpio_channel] = 1 if pull_up_down == PUD_UP else 0
+    return()
+
+def add_event_detect(gpio_channel:int, edge:int, callback=None, bouncetime:int=None):
+    global callback_thread
+    with gpio_lock:
+        if edge != FALLING: raise ValueError("GPIO Simulator: Only FALLING edge detection is supported")
+        edge_callbacks[gpio_channel] = callback
+        if callback_thread is None:
+            callback_thread = threading.Thread(target=thread_to_make_edge_callbacks, daemon=True)
+            callback_thread.start()
+    return()
+
+def input(gpio_channel:int):
+    return(input_levels.get(gpio_channel, 1))
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to read a simulated input bank (returns the 16 bit reading)
+#-----------------------------------------------------------------------------------------------
+
+def read_simulated_bank(bank_id:int):
+    return(bank_levels.get(bank_id, 0xFFFF))
+
+#-----------------------------------------------------------------------------------------------
+# Internal thread to make the edge callbacks (in the order the edges were detected)
+#-----------------------------------------------------------------------------------------------
+
+def thread_to_make_edge_callbacks():
+    global logging
+    while True:
+        gpio_channel, callback = edge_queue.get()
+        try: callback(gpio_channel)
+        except Exception as exception:
+            logging.error("GPIO Simulator: Exception in edge callback for GPIO "+str(gpio_channel)+
+                                                " - Reported exception: "+str(exception))
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Public API functions to inject input level changes
+#-----------------------------------------------------------------------------------------------
+
+def set_simulated_input(gpio_channel:int, level:int):
+    # Input bank inputs are polled (by the track_sensors module) so we just update the level
+    if isinstance(gpio_channel, tuple):
+        bank_id, bank_input = gpio_channel
+        with gpio_lock:
+            if level: bank_levels[bank_id] = bank_levels.get(bank_id, 0xFFFF) | (1 << bank_input)
+            else: bank_levels[bank_id] = bank_levels.get(bank_id, 0xFFFF) & ~(1 << bank_input)
+        return()
+    with gpio_lock:
+        falling_edge = input_levels.get(gpio_channel, 1) and not level
+        input_levels[gpio_channel] = 1 if level else 0
+        callback = edge_callbacks.get(gpio_channel)
+    if falling_edge and callback is not None: edge_queue.put((gpio_channel, callback))
+    return()
+
+def pulse_simulated_input(gpio_channel:int, active_duration:float=0.1, bounces:int=0, bounce_interval:float=0.0005):
+    run_simulated_input_script(create_bounce_pattern(gpio_channel, active_duration=active_duration,
+                                        bounces=bounces, bounce_interval=bounce_interval))
+    return()
+
+def create_bounce_pattern(gpio_channel:int, start_time:float=0.0, active_duration:float=0.1,
+                                          bounces:int=0, bounce_interval:float=0.0005):
+    script = []
+    time_offset = start_time
+    # Each bounce at the start of the pulse is a short active period followed by an inactive period
+    for bounce in range(bounces):
+        script.append((time_offset, gpio_channel, 0))
+        script.append((time_offset + bounce_interval, gpio_channel, 1))
+        time_offset = time_offset + 2 * bounce_interval
+    script.append((time_offset, gpio_channel, 0))
+    end_time = max(time_offset, start_time + active_duration)
+    # Each bounce at the end of the pulse is a short inactive period followed by an active period
+    for bounce in range(bounces):
+        script.append((end_time, gpio_channel, 1))
+        script.append((end_time + bounce_interval, gpio_channel, 0))
+        end_time = end_time + 2 * bounce_interval
+    script.append((end_time, gpio_channel, 1))
+    return(script)
+
+def run_simulated_input_script(script:list, speed:float=1.0, blocking:bool=True):
+    if blocking:
+        thread_to_run_input_script(script, speed)
+    else:
+        script_thread = threading.Thread(target=thread_to_run_input_script, args=(script, speed), daemon=True)
+        script_thread.start()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to run a script of input level changes (at the specified times)
+#-----------------------------------------------------------------------------------------------
+
+def thread_to_run_input_script(script:list, speed:float):
+    start_time = time.perf_counter()
+    for time_offset, gpio_channel, level in sorted(script, key=lambda entry: entry[0]):
+        delay = start_time + time_offset / speed - time.perf_counter()
+        if delay > 0: time.sleep(delay)
+        set_simulated_input(gpio_channel, level)
+    return()
+
+###############################################################################################
@@ -0,0 +1,238 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides in-memory "checkpoints" of the layout state - so the state of all the
+# signals, points, sections and block instruments can be saved to a named slot during a running
+# session and then restored later (for example to reset the layout for a timetable run). The
+# elements saved for each item are defined by 'file_interface.get_sig_file_config' (i.e. exactly
+# the same elements that are saved to the '.sig' file on application quit).
+#
+# On restore, only the items (and item elements) that differ from the checkpoint are changed -
+# and the changes are applied via the normal functions so the displayed state, the DCC commands
+# and the MQTT publishing are all kept consistent. Each signal is only refreshed once (however
+# many of its elements have changed) so the minimum set of DCC commands is sent to the layout.
+# Items created after the checkpoint was saved (not in the checkpoint) are left unchanged.
+#
+# Public types and functions:
+#
+# save_checkpoint - Saves the current layout state to a named checkpoint slot (if the slot
+#                   already exists then the existing checkpoint is overwritten)
+#   Mandatory Parameters:
+#       slot_name:str - The name of the checkpoint slot
+#
+# restore_checkpoint - Restores the layout state from a named checkpoint slot. Returns the
+#                   number of items that were changed (or -1 if the slot does not exist)
+#   Mandatory Parameters:
+#       slot_name:str - The name of the checkpoint slot
+#
+# delete_checkpoint - Deletes a named checkpoint slot
+#   Mandatory Parameters:
+#       slot_name:str - The name of the checkpoint slot
+#
+# list_checkpoints - Returns a list of the names of all the checkpoint slots
+#-----------------------------------------------------------------------------------------------
+
+from . import file_interface
+from . import signals_common
+from . import signals
+from . import points
+from . import track_sections
+from . import block_instruments
+
+import logging
+import enum
+import time
+
+#-----------------------------------------------------------------------------------------------
+# Global dictionary to hold the checkpoints. The key is the slot name and the value is the
+# layout state in the form {layout_element: {item_id: {element_name: value}}}
+#-----------------------------------------------------------------------------------------------
+
+checkpoints: dict = {}
+
+#-----------------------------------------------------------------------------------------------
+# Public API functions to save, delete and list the checkpoints
+#-----------------------------------------------------------------------------------------------
+
+def save_checkpoint(slot_name:str):
+    global logging
+    logging.info("Checkpoints: Saving layout state to checkpoint '"+slot_name+"'")
+    snapshot = file_interface.take_layout_state_snapshot()
+    checkpoints[slot_name] = { layout_element: {str(item_id): dict(item_elements) for item_id, item_elements in items}
+                                                        for layout_element, items in snapshot.items() }
+    return()
+
+def delete_checkpoint(slot_name:str):
+    global logging
+    if slot_name not in checkpoints.keys():
+        logging.error("Checkpoints: delete_checkpoint - Checkpoint '"+slot_name+"' does not exist")
+    else:
+        logging.info("Checkpoints: Deleting checkpoint '"+slot_name+"'")
+        del checkpoints[slot_name]
+    return()
+
+def list_checkpoints():
+    return(list(checkpoints.keys()))
+
+#-----------------------------------------------------------------------------------------------
+# Public API function to restore the layout state from a checkpoint. The state of each item is
+# compared with the checkpoint (at the time the item is restored - as restoring one item can
+# change another - e.g. points that are 'also switched' or linked block instruments). Only items
+# created on the local schematic are restored (remote items are updated from the remote node)
+#-----------------------------------------------------------------------------------------------
+
+def restore_checkpoint(slot_name:str):
+    global logging
+    if slot_name not in checkpoints.keys():
+        logging.error("Checkpoints: restore_checkpoint - Checkpoint '"+slot_name+"' does not exist")
+        items_changed = -1
+    else:
+        logging.info("Checkpoints: Restoring layout state from checkpoint '"+slot_name+"'")
+        start_time = time.perf_counter()
+        checkpoint = checkpoints[slot_name]
+        items_changed = 0
+        for point_id, target_state in checkpoint.get("points",{}).items():
+            if (point_id.isdigit() and points.point_exists(point_id) and
+                      restore_point(point_id, target_state)): items_changed += 1
+        for sig_id, target_state in checkpoint.get("signals",{}).items():
+            if (sig_id.isdigit() and signals_common.sig_exists(sig_id) and
+                      restore_signal(sig_id, target_state)): items_changed += 1
+        for section_id, target_state in checkpoint.get("sections",{}).items():
+            if (section_id.isdigit() and track_sections.section_exists(section_id) and
+                      restore_section(section_id, target_state)): items_changed += 1
+        for block_id, target_state in checkpoint.get("instruments",{}).items():
+            if (block_id.isdigit() and block_instruments.instrument_exists(block_id) and
+                      restore_instrument(block_id, target_state)): items_changed += 1
+        logging.info("Checkpoints: Restored checkpoint '"+slot_name+"' - "+str(items_changed)+" items changed in "
+                                    +format((time.perf_counter()-start_time)*1000.0,".1f")+"ms")
+    return(items_changed)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to test whether an element needs to be restored. Elements that weren't
+# present for the item at the time the checkpoint was saved ('None') are not restored. Note that
+# Enum elements (e.g. the signal route) are saved in the checkpoint as the VALUE of the Enum
+# (as per the '.sig' file) so we need to compare the value of the current element
+#-----------------------------------------------------------------------------------------------
+
+def element_changed(current_item:dict, target_state:dict, element_name:str):
+    target_value = target_state.get(element_name)
+    if target_value is None or element_name not in current_item.keys(): return(False)
+    current_value = current_item[element_name]
+    if isinstance(current_value, enum.Enum): current_value = current_value.value
+    return(current_value != target_value)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to restore a point. The point is unlocked and the FPL released (if required)
+# before the point is switched and then re-applied afterwards. 'Automatic' points are not switched
+# directly (they will have already been switched by the point they are 'also switched' with)
+#-----------------------------------------------------------------------------------------------
+
+def restore_point(point_id:str, target_state:dict):
+    point = points.points[point_id]
+    switch_point = element_changed(point, target_state, "switched") and not point["automatic"]
+    change_fpl = point["hasfpl"] and element_changed(point, target_state, "fpllock")
+    change_lock = element_changed(point, target_state, "locked")
+    locked = point["locked"]
+    if not (switch_point or change_fpl or change_lock): return(False)
+    if point["locked"]: points.unlock_point(int(point_id))
+    if point["hasfpl"] and point["fpllock"] and (switch_point or target_state.get("fpllock") == False):
+        points.toggle_fpl(int(point_id))
+    if switch_point:
+        points.toggle_point(int(point_id))
+    if point["hasfpl"] and not point["fpllock"] and target_state.get("fpllock") == True:
+        points.toggle_fpl(int(point_id))
+    if target_state.get("locked") == True or (target_state.get("locked") is None and locked):
+        points.lock_point(int(point_id))
+    return(True)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to restore a signal. The route is set first, then all the other changes to
+# the signal state are made and the signal is then refreshed (once) to update the aspect
+#-----------------------------------------------------------------------------------------------
+
+def restore_signal(sig_id:str, target_state:dict):
+    signal = signals_common.signals[sig_id]
+    changed_elements = [element_name for element_name in target_state.keys()
+                                if element_changed(signal, target_state, element_name)]
+    if len(changed_elements) == 0: return(False)
+    # Unlock the signal/subsidary first (so they can be changed) - they are re-locked at the end
+    signal_locked, subsidary_locked = signal["siglocked"], signal["sublocked"]
+    if signal["siglocked"]: signals_common.unlock_signal(int(sig_id))
+    if signal["hassubsidary"] and signal["sublocked"]: signals_common.unlock_subsidary(int(sig_id))
+    if "routeset" in changed_elements or "theatretext" in changed_elements:
+        if "routeset" in changed_elements: route = signals_common.route_type(target_state["routeset"])
+        else: route = signal.get("routeset")
+        if "theatretext" in changed_elements: theatre_text = target_state["theatretext"]
+        else: theatre_text = signal.get("theatretext")
+        signals.set_route(int(sig_id), route=route, theatre_text=theatre_text)
+    refresh_signal = False
+    if "releaseonred" in changed_elements or "releaseonyel" in changed_elements:
+        if target_state.get("releaseonyel"): signals_common.set_approach_control(int(sig_id), release_on_yellow=True)
+        elif target_state.get("releaseonred"): signals_common.set_approach_control(int(sig_id), release_on_yellow=False)
+        else: signals_common.clear_approach_control(int(sig_id))
+        refresh_signal = True
+    if "override" in changed_elements:
+        if target_state["override"]: signals_common.set_signal_override(int(sig_id))
+        else: signals_common.clear_signal_override(int(sig_id))
+        refresh_signal = True
+    if "sigclear" in changed_elements:
+        signals_common.toggle_signal(int(sig_id))
+        refresh_signal = True
+    if refresh_signal:
+        signals_common.auto_refresh_signal(int(sig_id))
+    if "subclear" in changed_elements and signal["hassubsidary"]:
+        signals.toggle_subsidary(int(sig_id))
+    # Re-apply the locks as required by the checkpoint (or as they were if not in the checkpoint)
+    lock_signal = target_state.get("siglocked")
+    if lock_signal is None: lock_signal = signal_locked
+    lock_subsidary = target_state.get("sublocked")
+    if lock_subsidary is None: lock_subsidary = subsidary_locked
+    if lock_signal: signals_common.lock_signal(int(sig_id))
+    if signal["hassubsidary"] and lock_subsidary: signals_common.lock_subsidary(int(sig_id))
+    return(True)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to restore a track section (state changes are published via the normal
+# functions). If the label has changed for a section that is to be CLEAR then we update the
+# label first and then clear the section (so only a single update is published)
+#-----------------------------------------------------------------------------------------------
+
+def restore_section(section_id:str, target_state:dict):
+    section = track_sections.sections[section_id]
+    change_state = element_changed(section, target_state, "occupied")
+    change_label = element_changed(section, target_state, "labeltext")
+    if not (change_state or change_label): return(False)
+    occupied = target_state["occupied"] if change_state else section["occupied"]
+    if occupied:
+        track_sections.set_section_occupied(int(section_id), label=target_state.get("labeltext"))
+    else:
+        if change_label:
+            section["labeltext"] = target_state["labeltext"]
+            file_interface.record_state_change("sections",section_id)
+            track_sections.update_section_button(section_id)
+        if change_state: track_sections.clear_section_occupied(int(section_id))
+        else: track_sections.send_mqtt_section_updated_event(int(section_id))
+    return(True)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to restore a block instrument. The section state is restored via the normal
+# functions (so any linked instrument is updated). The repeater state is only restored for double
+# line instruments (for single line instruments the repeater state follows the section state)
+#-----------------------------------------------------------------------------------------------
+
+def restore_instrument(block_id:str, target_state:dict):
+    instrument = block_instruments.instruments[block_id]
+    item_changed = False
+    # Note that 'None' is a valid state for instruments (LINE BLOCKED) so we can't use 'element_changed'
+    if "sectionstate" in target_state.keys() and instrument["sectionstate"] != target_state["sectionstate"]:
+        if target_state["sectionstate"] is None: block_instruments.set_section_blocked(int(block_id))
+        elif target_state["sectionstate"]: block_instruments.set_section_clear(int(block_id))
+        else: block_instruments.set_section_occupied(int(block_id))
+        item_changed = True
+    if ("repeaterstate" in target_state.keys() and not instrument["singleline"] and
+                  instrument["repeaterstate"] != target_state["repeaterstate"]):
+        if target_state["repeaterstate"] is None: block_instruments.set_repeater_blocked(int(block_id),make_callback=False)
+        elif target_state["repeaterstate"]: block_instruments.set_repeater_clear(int(block_id),make_callback=False)
+        else: block_instruments.set_repeater_occupied(int(block_id),make_callback=False)
+        item_changed = True
+    return(item_changed)
+
+###############################################################################################
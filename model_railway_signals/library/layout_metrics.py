@@ -0,0 +1,236 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides a simple registry of counters and gauges for the layout - so we can see how
+# often things happen (signal aspect changes, point throws, section occupancy transitions, DCC
+# commands per address, MQTT messages in/out etc) to spot decoder hotspots and bus saturation.
+#
+# The counters are incremented from the "hot path" of the other library modules (which may be
+# the tkinter thread, the MQTT network thread or the Pi-SPROG threads) so no locks are taken when
+# a counter is incremented - each thread increments its own "shard" of the counters (held in
+# thread-local storage) and the shards are only summed when a snapshot of the metrics is taken.
+# Gauges (e.g. the Pi-SPROG output queue depth) are simply set to the latest value.
+#
+# The following metrics are maintained by the library (the label for each is shown in brackets):
+#    signal_aspect_changes (sig_id)         - Displayed aspect changes for each signal
+#    point_throws (point_id)                - Point switches (NORMAL <=> SWITCHED) for each point
+#    section_transitions (section_id)       - Occupancy changes (CLEAR <=> OCCUPIED) for each section
+#    dcc_commands_sent (address)            - DCC accessory commands queued for the Pi-SPROG
+#    dcc_commands_published (address)       - DCC accessory commands published to the MQTT broker
+#    sprog_messages_transmitted             - CBUS messages written to the Pi-SPROG serial port
+#    sprog_queue_depth                      - CBUS messages waiting in the Pi-SPROG output queue
+#    mqtt_messages_received (message_type)  - MQTT messages received from the broker
+#    mqtt_messages_published (message_type) - MQTT messages published to the broker
+#
+# Public types and functions:
+#
+# get_metrics - Returns a snapshot of all metrics as a dictionary of {metric_name: {label: value}}
+#               where the label is the item ID / DCC address / message type as a string (or None
+#               for metrics without a label). Counts are since application start (or the last reset)
+#
+# reset_metrics - Resets all counters to zero (gauges are unaffected)
+#
+# start_metrics_exporter - Starts a simple HTTP server (in a background thread) to serve the metrics
+#                          in the Prometheus text exposition format (all metric names are prefixed
+#                          with 'model_railway_' and counters are suffixed with '_total')
+#   Optional Parameters:
+#       port:int - The TCP port to listen on - default = 9100
+#       host:str - The address to listen on - default = "127.0.0.1" (local connections only)
+#
+# stop_metrics_exporter - Stops the HTTP server (if it is running)
+#-----------------------------------------------------------------------------------------------
+
+import http.server
+import threading
+import logging
+
+#-----------------------------------------------------------------------------------------------
+# Definitions of the metrics maintained by the library (type, label name, help text). Metrics
+# incremented/set without a definition are still included (exported as 'untyped' metrics)
+#-----------------------------------------------------------------------------------------------
+
+metric_definitions: dict = {}
+metric_definitions["signal_aspect_changes"] = ("counter", "sig_id", "Signal aspect changes")
+metric_definitions["point_throws"] = ("counter", "point_id", "Point throws")
+metric_definitions["section_transitions"] = ("counter", "section_id", "Track section occupancy transitions")
+metric_definitions["dcc_commands_sent"] = ("counter", "address", "DCC accessory commands queued for the Pi-SPROG")
+metric_definitions["dcc_commands_published"] = ("counter", "address", "DCC accessory commands published via MQTT")
+metric_definitions["sprog_messages_transmitted"] = ("counter", None, "CBUS messages transmitted to the Pi-SPROG")
+metric_definitions["sprog_queue_depth"] = ("gauge", None, "CBUS messages waiting in the Pi-SPROG output queue")
+metric_definitions["mqtt_messages_received"] = ("counter", "message_type", "MQTT messages received")
+metric_definitions["mqtt_messages_published"] = ("counter", "message_type", "MQTT messages published")
+
+#-----------------------------------------------------------------------------------------------
+# Global variables used by the module. Each thread's counters (the "shard") are held in thread
+# local storage and also registered in 'counter_shards' (as a list of [thread, counters]) so they
+# can be summed for a snapshot. The shards of threads that have since finished are merged into
+# 'retired_counters' so the list doesn't grow with short-lived threads (e.g. timeout threads)
+#-----------------------------------------------------------------------------------------------
+
+thread_shard = threading.local()
+counter_shards: list = []
+retired_counters: dict = {}
+reset_baseline: dict = {}
+gauges: dict = {}
+shards_lock = threading.Lock()
+max_live_shards = 64
+
+exporter_config: dict = {}
+exporter_config["http_server"] = None
+exporter_config["server_thread"] = None
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to create the counter shard for the current thread (on first use)
+#-----------------------------------------------------------------------------------------------
+
+def create_thread_shard():
+    counters = {}
+    thread_shard.counters = counters
+    with shards_lock:
+        if len(counter_shards) >= max_live_shards: retire_finished_shards()
+        counter_shards.append([threading.current_thread(), counters])
+    return(counters)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to merge the shards of finished threads into the retired counters. Must be
+# called with the shards_lock held (the shard can't change as the owning thread has finished)
+#-----------------------------------------------------------------------------------------------
+
+def retire_finished_shards():
+    for shard in list(counter_shards):
+        thread, counters = shard
+        if not thread.is_alive():
+            for key, value in counters.items():
+                retired_counters[key] = retired_counters.get(key, 0) + value
+            counter_shards.remove(shard)
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal functions called by the other library modules to increment a counter / set a gauge.
+# Labels are normalised to strings when the snapshot is taken (not on the hot path)
+#-----------------------------------------------------------------------------------------------
+
+def increment_counter(metric_name:str, label=None, amount:int=1):
+    try: counters = thread_shard.counters
+    except AttributeError: counters = create_thread_shard()
+    key = (metric_name, label)
+    counters[key] = counters.get(key, 0) + amount
+    return()
+
+def set_gauge(metric_name:str, value, label=None):
+    gauges[(metric_name, label)] = value
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to sum all the counter shards - returns a dict of {(metric_name, label): value}
+# Note that copying each dict (rather than iterating over it) is safe whilst other threads update
+# their shards (the copy is made in a single operation whilst the interpreter lock is held)
+#-----------------------------------------------------------------------------------------------
+
+def sum_counter_shards():
+    with shards_lock:
+        retire_finished_shards()
+        shard_copies = [dict(counters) for thread, counters in counter_shards]
+        shard_copies.append(dict(retired_counters))
+    totals = {}
+    for counters in shard_copies:
+        for (metric_name, label), value in counters.items():
+            key = (metric_name, None if label is None else str(label))
+            totals[key] = totals.get(key, 0) + value
+    return(totals)
+
+#-----------------------------------------------------------------------------------------------
+# Public API functions to take a snapshot of the metrics and to reset the counters. Rather than
+# clearing the shards (which are owned by other threads) we save the current totals as a baseline
+# to be subtracted from subsequent snapshots
+#-----------------------------------------------------------------------------------------------
+
+def get_metrics():
+    metrics = {}
+    for (metric_name, label), value in sum_counter_shards().items():
+        value = value - reset_baseline.get((metric_name, label), 0)
+        if metric_name not in metrics.keys(): metrics[metric_name] = {}
+        metrics[metric_name][label] = value
+    for (metric_name, label), value in list(gauges.items()):
+        if metric_name not in metrics.keys(): metrics[metric_name] = {}
+        metrics[metric_name][None if label is None else str(label)] = value
+    return(metrics)
+
+def reset_metrics():
+    global reset_baseline
+    global logging
+    logging.info("Metrics: Resetting all layout metrics counters")
+    reset_baseline = sum_counter_shards()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to generate the metrics in the Prometheus text exposition format
+#-----------------------------------------------------------------------------------------------
+
+def escape_label_value(label:str):
+    return(label.replace("\\","\\\\").replace("\"","\\\"").replace("\n","\\n"))
+
+def create_prometheus_text():
+    lines = []
+    for metric_name, values in sorted(get_metrics().items()):
+        metric_type, label_name, help_text = metric_definitions.get(metric_name, ("untyped", "label", metric_name))
+        exported_name = "model_railway_" + metric_name
+        if metric_type == "counter": exported_name = exported_name + "_total"
+        lines.append("# HELP "+exported_name+" "+help_text)
+        lines.append("# TYPE "+exported_name+" "+metric_type)
+        for label, value in sorted(values.items(), key=lambda item: "" if item[0] is None else item[0]):
+            if label is None or label_name is None:
+                lines.append(exported_name+" "+str(value))
+            else:
+                lines.append(exported_name+"{"+label_name+"=\""+escape_label_value(label)+"\"} "+str(value))
+    return("\n".join(lines)+"\n")
+
+#-----------------------------------------------------------------------------------------------
+# Internal class to handle the HTTP requests for the Prometheus exporter (any path returns the
+# metrics). Request logging is suppressed (so we don't fill the console on every scrape)
+#-----------------------------------------------------------------------------------------------
+
+class metrics_request_handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        content = create_prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        return()
+
+    def log_message(self, format, *args):
+        return()
+
+#-----------------------------------------------------------------------------------------------
+# Public API functions to start/stop the Prometheus exporter
+#-----------------------------------------------------------------------------------------------
+
+def start_metrics_exporter(port:int=9100, host:str="127.0.0.1"):
+    global logging
+    stop_metrics_exporter()
+    try:
+        http_server = http.server.ThreadingHTTPServer((host, port), metrics_request_handler)
+    except Exception as exception:
+        logging.error("Metrics: Error starting metrics exporter on "+host+":"+str(port)+
+                                        " - Reported exception: "+str(exception))
+    else:
+        logging.info("Metrics: Serving layout metrics on http://"+host+":"+str(port)+"/metrics")
+        http_server.daemon_threads = True
+        server_thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+        server_thread.start()
+        exporter_config["http_server"] = http_server
+        exporter_config["server_thread"] = server_thread
+    return()
+
+def stop_metrics_exporter():
+    global logging
+    if exporter_config["http_server"] is not None:
+        logging.info("Metrics: Stopping the metrics exporter")
+        exporter_config["http_server"].shutdown()
+        exporter_config["http_server"].server_close()
+        exporter_config["server_thread"].join()
+        exporter_config["http_server"] = None
+        exporter_config["server_thread"] = None
+    return()
+
+###############################################################################################
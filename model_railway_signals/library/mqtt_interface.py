@@ -29,7 +29,8 @@
 #
 # configure_networking - Configures the local client and opens a connection to the MQTT broker
 #   Mandatory Parameters:
-#       broker_host:str - The name/IP address of the MQTT broker host to be used
+#       broker_host:str - The name/IP address of the MQTT broker host to be used. Specify "local"
+#                         to use the in-process broker stand-in (for testing and benchmarking)
 #       network_identifier:str - The name to use for this signalling network (any string)
 #       node_identifier:str - The name to use for this node on the network (can be any string)
 #   Optional Parameters:
@@ -42,9 +43,14 @@
 #-----------------------------------------------------------------------------------------------
 
 from . import common
+from . import mqtt_local_broker
+from . import event_tracing
+from . import event_recorder
+from . import layout_metrics
 import json
 import logging
 import time
+import threading
 import paho.mqtt.client
 
 #-----------------------------------------------------------------------------------------------
@@ -60,6 +66,13 @@ node_config["connected_to_broker"] = False
 node_config["list_of_published_topics"] = []
 node_config["list_of_subscribed_topics"] = []
 node_config["callbacks"] = {}
+node_config["coalesced_topics"] = set()
+node_config["network_thread_topics"] = set()
+node_config["message_queue"] = {}
+node_config["message_count"] = 0
+
+# Lock for the queue of decoded messages (passed from the mqtt event thread to the tkinter thread)
+message_queue_lock = threading.Lock()
 
 # ---------------------------------------------------------------------------------------------
 # Common Function to create a external item identifier from the Item_ID and the remote Node.
@@ -134,37 +147,64 @@ def on_connect(mqtt_client, userdata, flags, rc):
     return()
 
 #--------------------------------------------------------------------------------------------------------
-# Internal function to process messages received from the MQTT Broker - unpacking the message and then
-# making the registered callback to pass the message back to the main application. Note that this function
-# is executed in the main tkinter thread (as long as we know the main root window) to make it threadsafe
-# If we don't know the main root window then the function is executed in the current mqtt event thread.
+# Internal function to decode messages received from the MQTT Broker - unpacking the json payload,
+# validating the content and looking up the registered callback for the topic. This function is
+# executed in the mqtt network thread so none of this work lands on the main tkinter thread.
+# Returns a (callback, coalesce, network_thread, unpacked_json) tuple - or None if the message is discarded
 #--------------------------------------------------------------------------------------------------------
 
-def process_message(msg):
+def decode_message(msg):
     global logging
     # Unpack the json message so we can extract the contents (with exception handling)
     try:
         unpacked_json = json.loads(msg.payload)
     except Exception as exception:
         logging.error("MQTT-Client: Exception unpacking json - "+str(exception))
+        return(None)
+    # All messages published by the package are dictionaries that include the source identifier
+    if not isinstance(unpacked_json,dict) or not isinstance(unpacked_json.get("sourceidentifier"),str):
+        logging.error("MQTT-Client: Invalid message received on topic:"+str(msg.topic))
+        return(None)
+    if node_config["enhanced_debugging"]:
+        logging.debug("MQTT-Client: Successfully parsed message:"+str(unpacked_json))
+    # Find the callback (that was registered when the calling programme subscribed to the feed)
+    # Note that we also need to test to see if the the topic is a partial match to cover the
+    # case of subscribing to all subtopics for an specified item (with the '+' wildcard)
+    if msg.topic in node_config["callbacks"]:
+        subscribed_topic = msg.topic
+    elif msg.topic.rpartition('/')[0]+"/+" in node_config["callbacks"]:
+        subscribed_topic = msg.topic.rpartition('/')[0]+"/+"
     else:
-        if node_config["enhanced_debugging"]:
-            logging.debug("MQTT-Client: Successfully parsed message:"+str(unpacked_json))
-        # Make the callback (that was registered when the calling programme subscribed to the feed)
-        # Note that we also need to test to see if the the topic is a partial match to cover the
-        # case of subscribing to all subtopics for an specified item (with the '+' wildcard)
-        if msg.topic in node_config["callbacks"]:
-            node_config["callbacks"][msg.topic] (unpacked_json)
-        elif msg.topic.rpartition('/')[0]+"/+" in node_config["callbacks"]:
-            node_config["callbacks"][msg.topic.rpartition('/')[0]+"/+"] (unpacked_json)
-        else:
-             logging.warning("MQTT-Client: unhandled message topic:"+str(msg.topic))
+        logging.warning("MQTT-Client: unhandled message topic:"+str(msg.topic))
+        return(None)
+    callback = node_config["callbacks"][subscribed_topic]
+    coalesce = subscribed_topic in node_config["coalesced_topics"]
+    network_thread = subscribed_topic in node_config["network_thread_topics"]
+    return(callback, coalesce, network_thread, unpacked_json)
+
+#--------------------------------------------------------------------------------------------------------
+# Internal function to make the callbacks for all of the decoded messages waiting in the queue. This
+# is executed in the main tkinter thread (as long as we know the root window). We take everything
+# that is queued in a single pass so a flood of messages only needs a single tkinter event
+#--------------------------------------------------------------------------------------------------------
+
+def process_queued_messages():
+    global node_config
+    with message_queue_lock:
+        queued_messages = list(node_config["message_queue"].values())
+        node_config["message_queue"].clear()
+    for callback, unpacked_json in queued_messages:
+        callback(unpacked_json)
     return()
 
 #--------------------------------------------------------------------------------------------------------
-# Internal function to handle messages received from the MQTT Broker. Note that we "pass" the
-# execution for processing the function back into the main Tkinter thread (assuming we know the
-# root window (if not, then as a fallback we raise a callback in the current mqtt event thread)
+# Internal function to handle messages received from the MQTT Broker. Messages are decoded in the mqtt
+# event thread and then queued for processing in the main Tkinter thread (assuming we know the root
+# window - if not, then as a fallback we make the callback in the current mqtt event thread). State
+# updates for the same item (i.e. the same topic) are coalesced whilst queued - so only the latest
+# state is applied (in the position of the latest update in the queue). Transitory events (e.g. signal passed events) are always queued individually.
+# Callbacks for topics subscribed with the 'network_thread' flag are always made in the mqtt event
+# thread (these callbacks must not manipulate any tkinter objects - e.g. forwarding DCC commands)
 #--------------------------------------------------------------------------------------------------------
 
 def on_message(mqtt_client,obj,msg):
@@ -173,10 +213,30 @@ def on_message(mqtt_client,obj,msg):
     # Only process the message if there is a payload - If there is no payload then the message is
     # a "null message" - sent to purge retained messages from the broker on application exit
     if msg.payload:
-        if common.root_window is not None:
-            common.execute_function_in_tkinter_thread (lambda:process_message(msg)) 
-        else:
-            process_message(msg)
+        # Record the message (if the event recorder is active) so it can be replayed later
+        event_recorder.record_input_event("mqtt_message",msg.topic,msg.payload.decode("utf-8"))
+        layout_metrics.increment_counter("mqtt_messages_received",msg.topic.partition("/")[0])
+        decoded_message = decode_message(msg)
+        if decoded_message is not None:
+            callback, coalesce, network_thread, unpacked_json = decoded_message
+            if common.root_window is None or network_thread:
+                callback(unpacked_json)
+            else:
+                with message_queue_lock:
+                    # We only need to raise a tkinter event if the queue was empty - otherwise an event
+                    # will already be pending (and will pick up this message when it gets processed)
+                    event_needed = len(node_config["message_queue"]) == 0
+                    # A coalesced update replaces any queued update for the topic - but is moved to the
+                    # end of the queue (so it is never applied before the events received before it)
+                    if coalesce:
+                        message_key = msg.topic
+                        node_config["message_queue"].pop(message_key, None)
+                    else:
+                        node_config["message_count"] += 1
+                        message_key = node_config["message_count"]
+                    node_config["message_queue"][message_key] = (callback, unpacked_json)
+                if event_needed:
+                    common.execute_function_in_tkinter_thread(process_queued_messages)
     return()
 
 #-----------------------------------------------------------------------------------------------
@@ -195,7 +255,9 @@ def configure_networking (broker_host:str,
     global node_config
     global mqtt_client
     logging.info("MQTT-Client: Connecting to Broker \'"+broker_host+"\'")
-    mqtt_client = paho.mqtt.client.Client(clean_session=True)
+    # A broker host of "local" selects the in-process broker stand-in (for testing/benchmarking)
+    if broker_host == "local": mqtt_client = mqtt_local_broker.local_mqtt_client(clean_session=True)
+    else: mqtt_client = paho.mqtt.client.Client(clean_session=True)
     mqtt_client.on_message = on_message    
     mqtt_client.on_connect = on_connect    
     mqtt_client.on_disconnect = on_disconnect    
@@ -265,9 +327,14 @@ def mqtt_shutdown():
 # the content of the received messages. The optional subtopic flag enables you to subscribe
 # to all sub-topics from a particular item. This is used in the Model Railway Signalling Package
 # for subscribing to all DCC address messages (where each DCC address is a seperate subtopic)
+# The optional coalesce flag should be set for topics that carry the latest "state" of an item
+# (rather than transitory events) so that queued updates for the item can be coalesced. The
+# optional network_thread flag should be set for topics where the callback is thread safe and
+# does not need to be made in the main tkinter thread (i.e. it doesn't touch any tkinter objects)
 #-----------------------------------------------------------------------------------------------
 
-def subscribe_to_mqtt_messages (message_type:str,item_node:str,item_id:int,callback,subtopics:bool=False):
+def subscribe_to_mqtt_messages (message_type:str,item_node:str,item_id:int,callback,
+                                subtopics:bool=False,coalesce:bool=False,network_thread:bool=False):
     global logging
     global node_config
     global mqtt_client
@@ -285,6 +352,10 @@ def subscribe_to_mqtt_messages (message_type:str,item_node:str,item_id:int,callb
         node_config["list_of_subscribed_topics"].append(topic)
         # Save the callback details for when we receive a message on the topic
         node_config["callbacks"][topic] = callback
+        # State updates can be coalesced whilst queued for processing (only the latest state matters)
+        if coalesce: node_config["coalesced_topics"].add(topic)
+        # Thread safe callbacks can be made directly in the mqtt event thread
+        if network_thread: node_config["network_thread_topics"].add(topic)
         return()
 
 #-----------------------------------------------------------------------------------------------
@@ -319,6 +390,8 @@ def publish_message (topic:str,payload:str,log_message:str=None,retain:bool=Fals
         else: logging.debug("MQTT-Client: Publishing JSON message to MQTT broker: "+payload)
     # Publish the message to the broker
     mqtt_client.publish(topic,payload,retain=retain,qos=1)
+    event_tracing.record_trace_stage("mqtt_publish")
+    layout_metrics.increment_counter("mqtt_messages_published",topic.partition("/")[0])
     # Add to the list of published topics if this is a retained message so we
     # can 'Clean up' the MQTT broker by publishing empty messages on shutdown
     if topic not in node_config["list_of_published_topics"]:
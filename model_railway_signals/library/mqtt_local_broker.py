@@ -0,0 +1,167 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides a lightweight "in-process" stand-in for an MQTT broker. It is selected by
+# calling 'configure_networking' with a broker_host of "local" and is intended for testing and
+# benchmarking multi-node signalling schemes without needing an external broker on the network.
+#
+# All clients created in the same python process share the single local broker, so a test or
+# benchmark harness can create as many simulated "signal boxes" (clients) as required. The broker
+# supports retained messages (including clearing them by publishing a null message), QoS 1 (all
+# messages are delivered reliably and in order as nothing ever leaves the process) and the '+' and
+# '#' topic wildcards. Each client has its own "network thread" (started by 'loop_start') which
+# makes the on_connect/on_message/on_disconnect callbacks - in the same way as the paho client.
+#
+# Only the subset of the paho.mqtt.client.Client interface used by the mqtt_interface module is
+# supported - connect, disconnect, loop_start, loop_stop, subscribe and publish
+#-----------------------------------------------------------------------------------------------
+
+import threading
+import queue
+import time
+import logging
+
+#-----------------------------------------------------------------------------------------------
+# Global variables for the local broker (shared by all clients in the process)
+#-----------------------------------------------------------------------------------------------
+
+broker_lock = threading.Lock()
+retained_messages: dict = {}
+subscriptions: list = []
+
+#-----------------------------------------------------------------------------------------------
+# Class to represent a message delivered to a client (mirrors the paho MQTTMessage attributes)
+#-----------------------------------------------------------------------------------------------
+
+class local_mqtt_message():
+    def __init__(self, topic:str, payload:bytes, qos:int, retain:bool):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.timestamp = time.monotonic()
+
+#-----------------------------------------------------------------------------------------------
+# Function to test whether a topic matches a subscription (including the MQTT wildcards)
+# '+' matches exactly one topic level and '#' (last level only) matches any remaining levels
+#-----------------------------------------------------------------------------------------------
+
+def topic_matches(subscription:str, topic:str):
+    subscription_levels = subscription.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(subscription_levels):
+        if level == "#":
+            return(True)
+        if index >= len(topic_levels):
+            return(False)
+        if level != "+" and level != topic_levels[index]:
+            return(False)
+    return(len(subscription_levels) == len(topic_levels))
+
+#-----------------------------------------------------------------------------------------------
+# Internal functions to publish a message to all matching subscribers (retaining if required)
+# and to reset the broker (clearing down all retained messages and subscriptions)
+#-----------------------------------------------------------------------------------------------
+
+def publish_to_subscribers(topic:str, payload:bytes, qos:int, retain:bool):
+    with broker_lock:
+        if retain:
+            # A null (empty) retained message clears out the retained message for the topic
+            if payload: retained_messages[topic] = (payload, qos)
+            elif topic in retained_messages: del retained_messages[topic]
+        for client, subscription, subscription_qos in subscriptions:
+            if topic_matches(subscription, topic):
+                client.deliver(local_mqtt_message(topic, payload, min(qos,subscription_qos), False))
+    return()
+
+def reset_local_broker():
+    global retained_messages
+    global subscriptions
+    with broker_lock:
+        retained_messages.clear()
+        subscriptions.clear()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Class to provide the subset of the paho.mqtt.client.Client interface used by mqtt_interface
+#-----------------------------------------------------------------------------------------------
+
+class local_mqtt_client():
+    def __init__(self, clean_session:bool=True):
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.on_log = None
+        self.connected = False
+        self.event_queue = queue.Queue()
+        self.network_thread = None
+
+    # Connection parameters are accepted (for compatibility) but have no effect
+    def reconnect_delay_set(self, min_delay:int=1, max_delay:int=120):
+        return()
+
+    def username_pw_set(self, username:str, password:str=None):
+        return()
+
+    def connect(self, host:str="local", port:int=1883, keepalive:int=60):
+        self.connected = True
+        self.event_queue.put(("connect", None))
+        return(0)
+
+    def disconnect(self):
+        # Remove all subscriptions for the client (as we use 'clean_session=true')
+        with broker_lock:
+            subscriptions[:] = [entry for entry in subscriptions if entry[0] is not self]
+        self.connected = False
+        self.event_queue.put(("disconnect", None))
+        return(0)
+
+    def loop_start(self):
+        if self.network_thread is None:
+            self.network_thread = threading.Thread(target=self.thread_to_process_events)
+            self.network_thread.daemon = True
+            self.network_thread.start()
+        return()
+
+    def loop_stop(self):
+        if self.network_thread is not None:
+            self.event_queue.put(("stop", None))
+            if self.network_thread is not threading.current_thread():
+                self.network_thread.join()
+            self.network_thread = None
+        return()
+
+    def subscribe(self, topic:str, qos:int=0):
+        with broker_lock:
+            subscriptions.append((self, topic, qos))
+            # Any retained messages matching the subscription are delivered straight away
+            for retained_topic, (payload, retained_qos) in retained_messages.items():
+                if topic_matches(topic, retained_topic):
+                    self.deliver(local_mqtt_message(retained_topic, payload, min(qos,retained_qos), True))
+        return((0, 0))
+
+    def publish(self, topic:str, payload=None, qos:int=0, retain:bool=False):
+        if payload is None: payload = b""
+        elif isinstance(payload, str): payload = payload.encode()
+        if self.on_log is not None:
+            self.on_log(self, None, logging.DEBUG, "Local broker - Publishing to topic "+topic)
+        publish_to_subscribers(topic, payload, qos, retain)
+        return()
+
+    def deliver(self, message:local_mqtt_message):
+        self.event_queue.put(("message", message))
+        return()
+
+    # The "network thread" for the client - makes all callbacks in the same way as the paho client
+    def thread_to_process_events(self):
+        while True:
+            event, message = self.event_queue.get()
+            if event == "stop":
+                break
+            elif event == "connect" and self.on_connect is not None:
+                self.on_connect(self, None, {}, 0)
+            elif event == "disconnect" and self.on_disconnect is not None:
+                self.on_disconnect(self, None, 0)
+            elif event == "message" and self.on_message is not None:
+                self.on_message(self, None, message)
+        return()
+
+###############################################################################################
@@ -0,0 +1,221 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides "snapshot" synchronisation of layout state across the MQTT network. When
+# enabled on a node, a single compact snapshot of the state of all the signals, track sections
+# and block instruments that the node publishes is sent as a retained message. The snapshot is
+# re-published whenever the published state changes (coalesced so a burst of changes only
+# results in a single snapshot), periodically (as a "heartbeat") and on request.
+#
+# Nodes subscribing to signal/section/instrument updates from a remote node are automatically
+# subscribed to that node's snapshot - and request a fresh snapshot when they subscribe. The
+# snapshot is applied as a single batch (with callbacks only being made for the items whose state
+# has changed) so the time taken for a signal box to synchronise on startup is independent of
+# the number of items. Incremental (per item) updates continue to be used for subsequent changes
+# and are still published as retained messages (so nodes that only subscribe to the per item
+# updates - or that don't support snapshots - still pick up the latest state when they subscribe).
+#
+# Public types and functions:
+#
+# set_node_to_publish_snapshots - Enables publishing of layout state snapshots to other nodes
+#                       (networking must have been configured before calling this function)
+#   Optional Parameters:
+#       publish_snapshots:bool - 'True' to Publish / 'False' to stop publishing (default=True)
+#       snapshot_interval:float - Interval between 'heartbeat' snapshots in seconds (default=30.0)
+#-----------------------------------------------------------------------------------------------
+
+from . import common
+from . import mqtt_interface
+from . import signals_common
+from . import track_sections
+from . import block_instruments
+
+import logging
+import json
+
+#-----------------------------------------------------------------------------------------------
+# Global variables used by the module
+#-----------------------------------------------------------------------------------------------
+
+snapshot_config: dict = {}
+snapshot_config["publish_snapshots"] = False
+snapshot_config["snapshot_interval"] = 30.0
+snapshot_config["snapshot_pending"] = False
+snapshot_config["heartbeat_scheduled"] = False
+snapshot_config["sequence_number"] = 0
+snapshot_config["subscribed_nodes"] = []
+
+# Delay (in milliseconds) before publishing a snapshot following a state change - so
+# that all the state changes resulting from a single event are sent in one snapshot
+snapshot_coalesce_delay = 100
+
+#-----------------------------------------------------------------------------------------------
+# Public API Function to enable/disable the publishing of snapshots for this node
+#-----------------------------------------------------------------------------------------------
+
+def set_node_to_publish_snapshots(publish_snapshots:bool=True, snapshot_interval:float=30.0):
+    global logging
+    if publish_snapshots:
+        logging.info("MQTT-Client: Configuring Application to publish layout state snapshots to MQTT broker")
+    else:
+        logging.info("MQTT-Client: Configuring Application NOT to publish layout state snapshots to MQTT broker")
+    if publish_snapshots and not snapshot_config["publish_snapshots"]:
+        # Subscribe to snapshot requests from other nodes (requests are sent to our node's topic)
+        mqtt_interface.subscribe_to_mqtt_messages("snapshot_request_event",mqtt_interface.node_config["node_identifier"],
+                                                   0,handle_mqtt_snapshot_request_event)
+    snapshot_config["publish_snapshots"] = publish_snapshots
+    snapshot_config["snapshot_interval"] = snapshot_interval
+    if publish_snapshots:
+        publish_snapshot()
+        schedule_heartbeat_snapshot()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function called by the other modules whenever the state of a published item has
+# changed. We schedule a single snapshot to be published after a short delay so all the
+# changes resulting from an event are coalesced into a single snapshot
+#-----------------------------------------------------------------------------------------------
+
+def published_state_changed():
+    if snapshot_config["publish_snapshots"] and not snapshot_config["snapshot_pending"]:
+        if common.root_window is not None and not common.shutdown_initiated:
+            snapshot_config["snapshot_pending"] = True
+            common.root_window.after(snapshot_coalesce_delay,publish_snapshot)
+        elif common.root_window is None:
+            publish_snapshot()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to schedule the periodic "heartbeat" snapshots (using the tkinter 'after'
+# method). We stop re-scheduling when the application is shutting down
+#-----------------------------------------------------------------------------------------------
+
+def schedule_heartbeat_snapshot():
+    if common.root_window is not None and not snapshot_config["heartbeat_scheduled"]:
+        snapshot_config["heartbeat_scheduled"] = True
+        common.root_window.after(int(snapshot_config["snapshot_interval"]*1000),publish_heartbeat_snapshot)
+    return()
+
+def publish_heartbeat_snapshot():
+    snapshot_config["heartbeat_scheduled"] = False
+    if snapshot_config["publish_snapshots"] and not common.shutdown_initiated:
+        publish_snapshot()
+        schedule_heartbeat_snapshot()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to build and publish the snapshot of all published items as a single
+# retained message. Section state is published as [occupied, labeltext] and instrument state
+# is keyed by the identifier of the remote instrument it is linked to (as per the incremental
+# instrument_updated_event messages)
+#-----------------------------------------------------------------------------------------------
+
+def publish_snapshot():
+    snapshot_config["snapshot_pending"] = False
+    if snapshot_config["publish_snapshots"] and not common.shutdown_initiated:
+        snapshot_config["sequence_number"] = snapshot_config["sequence_number"] + 1
+        data = {}
+        data["sequence"] = snapshot_config["sequence_number"]
+        data["signals"] = {}
+        for sig_id in signals_common.list_of_signals_to_publish_state_changes:
+            if signals_common.sig_exists(sig_id):
+                data["signals"][str(sig_id)] = signals_common.signals[str(sig_id)]["sigstate"].value
+        data["sections"] = {}
+        for sec_id in track_sections.list_of_sections_to_publish:
+            if track_sections.section_exists(sec_id):
+                data["sections"][str(sec_id)] = [track_sections.sections[str(sec_id)]["occupied"],
+                                                 track_sections.sections[str(sec_id)]["labeltext"]]
+        data["instruments"] = {}
+        for block_id in block_instruments.instruments.keys():
+            linked_to = block_instruments.instruments[block_id]["linkedto"]
+            if isinstance(linked_to,str):
+                data["instruments"][linked_to] = block_instruments.instruments[block_id]["sectionstate"]
+        log_message = "MQTT-Client: Publishing layout state snapshot "+str(data["sequence"])+" to MQTT Broker"
+        mqtt_interface.send_mqtt_message("layout_snapshot_event",0,data=data,log_message=log_message,retain=True)
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function (called by the signals, track_sections and block_instruments modules when
+# subscribing to updates from a remote node) to subscribe to the snapshot from the remote node
+# and to request a fresh snapshot. We only subscribe to each remote node once
+#-----------------------------------------------------------------------------------------------
+
+def subscribe_to_node_snapshot(node:str):
+    if mqtt_interface.node_config["network_configured"] and node not in snapshot_config["subscribed_nodes"]:
+        snapshot_config["subscribed_nodes"].append(node)
+        mqtt_interface.subscribe_to_mqtt_messages("layout_snapshot_event",node,0,
+                                    handle_mqtt_layout_snapshot_event,coalesce=True)
+        # The request is sent to the topic for the remote node (which subscribes to its own topic)
+        topic = ("snapshot_request_event/"+mqtt_interface.node_config["network_identifier"]+"/"+
+                  mqtt_interface.create_remote_item_identifier(0,node))
+        data = {"sourceidentifier":mqtt_interface.create_remote_item_identifier(0,mqtt_interface.node_config["node_identifier"])}
+        log_message = "MQTT-Client: Requesting layout state snapshot from '"+node+"'"
+        mqtt_interface.publish_message(topic,json.dumps(data),log_message,retain=False)
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Callback for handling snapshot requests from other nodes
+#-----------------------------------------------------------------------------------------------
+
+def handle_mqtt_snapshot_request_event(message):
+    global logging
+    if "sourceidentifier" in message.keys():
+        logging.info("MQTT-Client: Layout state snapshot requested by '"+message["sourceidentifier"]+"'")
+        publish_snapshot()
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to validate a received snapshot - to make sure a malformed snapshot can't
+# raise an exception part way through being applied. Signal states are the VALUES of the signal
+# state enumeration, section states are [occupied:bool, labeltext:str] and instrument states are
+# None (LINE BLOCKED), True (LINE CLEAR) or False (TRAIN ON LINE)
+#-----------------------------------------------------------------------------------------------
+
+def valid_layout_snapshot(message):
+    signal_states = [sig_state.value for sig_state in signals_common.signal_state_type]
+    return( isinstance(message.get("sourceidentifier"),str) and
+            mqtt_interface.split_remote_item_identifier(message["sourceidentifier"]) is not None and
+            isinstance(message.get("signals"),dict) and isinstance(message.get("sections",{}),dict) and
+            isinstance(message.get("instruments",{}),dict) and
+            all(isinstance(sig_state,int) and not isinstance(sig_state,bool) and sig_state in signal_states
+                       for sig_state in message["signals"].values()) and
+            all(isinstance(section_state,list) and len(section_state) == 2 and isinstance(section_state[0],bool)
+                   and isinstance(section_state[1],str) for section_state in message.get("sections",{}).values()) and
+            all(section_state is None or isinstance(section_state,bool)
+                       for section_state in message.get("instruments",{}).values()) )
+
+#-----------------------------------------------------------------------------------------------
+# Callback for handling a snapshot received from a remote node. The snapshot is applied as a
+# single batch - only items we have subscribed to (and whose state has changed) are updated.
+# The updates are applied via the standard handlers for the incremental updates so all the
+# normal callbacks are made (for the changed items). Invalid snapshots are discarded
+#-----------------------------------------------------------------------------------------------
+
+def handle_mqtt_layout_snapshot_event(message):
+    global logging
+    if not valid_layout_snapshot(message):
+        logging.warning("MQTT-Client: Discarding invalid layout state snapshot received from '"+
+                                                str(message.get("sourceidentifier"))+"'")
+    else:
+        node, item_id = mqtt_interface.split_remote_item_identifier(message["sourceidentifier"])
+        logging.info("MQTT-Client: Applying layout state snapshot "+str(message.get("sequence"))+" from '"+node+"'")
+        for sig_id, sig_state in message["signals"].items():
+            sig_identifier = mqtt_interface.create_remote_item_identifier(sig_id,node)
+            if (signals_common.sig_exists(sig_identifier) and
+                    signals_common.signals[sig_identifier]["sigstate"].value != sig_state):
+                signals_common.handle_mqtt_signal_updated_event({"sourceidentifier":sig_identifier,"sigstate":sig_state})
+        for sec_id, (occupied, label_text) in message.get("sections",{}).items():
+            sec_identifier = mqtt_interface.create_remote_item_identifier(sec_id,node)
+            if (track_sections.section_exists(sec_identifier) and
+                    (track_sections.sections[sec_identifier]["occupied"] != occupied or
+                     track_sections.sections[sec_identifier]["labeltext"] != label_text)):
+                track_sections.handle_mqtt_section_updated_event({"sourceidentifier":sec_identifier,
+                                                "occupied":occupied,"labeltext":label_text})
+        for block_identifier, section_state in message.get("instruments",{}).items():
+            block_node, block_id = mqtt_interface.split_remote_item_identifier(block_identifier) or (None, None)
+            if (block_node == mqtt_interface.node_config["node_identifier"] and
+                    block_instruments.instrument_exists(block_id) and
+                    block_instruments.instruments[str(block_id)]["repeaterstate"] != section_state):
+                block_instruments.handle_mqtt_instrument_updated_event({"instrumentid":block_identifier,
+                                                                        "sectionstate":section_state})
+    return()
+
+###############################################################################################
@@ -65,6 +65,8 @@ import serial
 import time
 import logging
 import queue
+from . import event_tracing
+from . import layout_metrics
 
 # Create a new class of the Serial Port (port is configured/opened later)
 serial_port = serial.Serial ()
@@ -82,6 +84,8 @@ service_mode_status = 0       # The response code from programming a CV
 
 # This is the output buffer for messages to be sent to the SPROG
 # We use a buffer so we can throttle the transmit rate without blocking
+# Each entry is a tuple of (command_string, trace_id) - the trace ID being
+# None unless event tracing has been enabled (see the event_tracing module)
 output_buffer = queue.Queue()
 
 #------------------------------------------------------------------------------
@@ -98,11 +102,14 @@ def thread_to_send_buffered_data ():
     global debug
     
     while True:
-        command_string = output_buffer.get()
+        command_string, trace_id = output_buffer.get()
+        layout_metrics.set_gauge("sprog_queue_depth",output_buffer.qsize())
         #Print the Transmitted message (if the appropriate debug level is set)
         if debug:logging.debug ("Pi-SPROG - Transmit CBUS Message: " + command_string)
         # Write the CBUS Message to the serial port
         serial_port.write(bytes(command_string,"Ascii"))
+        if trace_id is not None: event_tracing.record_trace_stage("sprog_transmit", trace_id)
+        layout_metrics.increment_counter("sprog_messages_transmitted")
         # Sleep before sending the next CBUS message
         time.sleep(transmit_delay)
     return()
@@ -240,7 +247,9 @@ def send_cbus_command (mj_pri:int, min_pri:int, op_code:int, *data_bytes:int):
         # Finally - add the command string termination character
         command_string = command_string + ";"
         # Add the command to the output buffer (to be picked up by the Tx thread)
-        output_buffer.put(command_string)
+        event_tracing.record_trace_stage("sprog_queued")
+        output_buffer.put((command_string, event_tracing.current_trace()))
+        layout_metrics.set_gauge("sprog_queue_depth",output_buffer.qsize())
     return()
 
 #------------------------------------------------------------------------------
@@ -366,6 +375,7 @@ def send_accessory_short_event (address:int, active:bool):
         byte2 = (pi_cbus_node & 0x00ff)
         byte3 = (address & 0xff00) >> 8
         byte4 = (address & 0x00ff)
+        layout_metrics.increment_counter("dcc_commands_sent",address)
         #  Send a ASON or ASOF Command (Accessoy Short On or Accessory Short Off)
         if active:
             logging.debug ("Pi-SPROG: Sending DCC command ASON (Accessory Short ON) to DCC address: "+ str(address))
@@ -375,6 +385,23 @@ def send_accessory_short_event (address:int, active:bool):
             send_cbus_command (2, 3, 153, byte1, byte2, byte3, byte4)
     return ()
 
+#------------------------------------------------------------------------------
+# Externally Called Function to send a batch of Accessory Short CBUS On/Off Events
+# The commands are a list of [address:int, active:bool] - and are added to the
+# output buffer in the order specified (so they are transmitted consecutively)
+#------------------------------------------------------------------------------
+
+def send_accessory_short_events (commands:list):
+
+    global track_power_on
+    global logging
+
+    # Only try to send the commands if the PI-SPROG-3 has initialised correctly
+    if track_power_on:
+        logging.debug ("Pi-SPROG: Sending batch of "+str(len(commands))+" DCC Accessory Short commands")
+        for address, active in commands: send_accessory_short_event(address, active)
+    return ()
+
 #------------------------------------------------------------------------------
 # Externally Called Function to programme a single CV (used for testing)
 #------------------------------------------------------------------------------
@@ -51,6 +51,10 @@
 from . import dcc_control
 from . import common
 from . import file_interface
+from . import event_recorder
+from . import layout_metrics
+from . import callback_profiler
+from . import track_sections
 
 from tkinter import *
 import enum
@@ -99,6 +103,7 @@ def null_callback(point_id:int,callback_type):
 def fpl_button_event (point_id:int):
     global logging
     logging.info("Point "+str(point_id)+": FPL Button Event *******************************************")
+    event_recorder.record_input_event("point_fpl_button",point_id)
     toggle_fpl(point_id)
     points[str(point_id)]["extcallback"] (point_id,point_callback_type.fpl_switched)
     return ()
@@ -106,6 +111,7 @@ def fpl_button_event (point_id:int):
 def change_button_event (point_id:int):
     global logging
     logging.info("Point "+str(point_id)+": Change Button Event ****************************************")
+    event_recorder.record_input_event("point_change_button",point_id)
     toggle_point(point_id)
     points[str(point_id)]["extcallback"] (point_id,point_callback_type.point_switched)
     return ()
@@ -132,11 +138,13 @@ def toggle_fpl (point_id:int):
             points[str(point_id)]["changebutton"].config(state="disabled") 
             points[str(point_id)]["lockbutton"].config(relief="sunken",bg="white") 
             points[str(point_id)]["fpllock"]=True 
+            file_interface.record_state_change("points",point_id)
         else:
             logging.info ("Point "+str(point_id)+": Clearing FPL")
             points[str(point_id)]["changebutton"].config(state="normal")  
             points[str(point_id)]["lockbutton"].config(relief="raised",bg="grey85")
             points[str(point_id)]["fpllock"]=False
+            file_interface.record_state_change("points",point_id)
     return()
 
 # -------------------------------------------------------------------------
@@ -157,6 +165,7 @@ def toggle_point_state (point_id:int, switched_by_another_point = False):
             logging.info ("Point "+str(point_id)+": Changing point to SWITCHED")
         points[str(point_id)]["changebutton"].config(relief="sunken",bg="white")
         points[str(point_id)]["switched"] = True
+        file_interface.record_state_change("points",point_id)
         points[str(point_id)]["canvas"].itemconfig(points[str(point_id)]["blade2"],state="normal") #switched
         points[str(point_id)]["canvas"].itemconfig(points[str(point_id)]["blade1"],state="hidden") #normal
         dcc_control.update_dcc_point(point_id,True)
@@ -167,9 +176,13 @@ def toggle_point_state (point_id:int, switched_by_another_point = False):
             logging.info ("Point "+str(point_id)+": Changing point to NORMAL")
         points[str(point_id)]["changebutton"].config(relief="raised",bg="grey85") 
         points[str(point_id)]["switched"] = False
+        file_interface.record_state_change("points",point_id)
         points[str(point_id)]["canvas"].itemconfig(points[str(point_id)]["blade2"],state="hidden") #switched 
         points[str(point_id)]["canvas"].itemconfig(points[str(point_id)]["blade1"],state="normal") #normal
         dcc_control.update_dcc_point(point_id,False)
+    layout_metrics.increment_counter("point_throws",point_id)
+    # Re-evaluate any signals protected by track sections on a route through the point
+    track_sections.update_point_protections(point_id)
     return
 
 # -------------------------------------------------------------------------
@@ -320,6 +333,8 @@ def create_point (canvas, point_id:int, pointtype:point_type,
         # Hide the line for the switched route (display it later when we need it)
         canvas.itemconfig(blade2,state="hidden")
                 
+        # Wrap the external callback so it can be profiled (see callback_profiler)
+        point_callback = callback_profiler.profile_callback(point_callback,"point_callback")
         # Compile a dictionary of everything we need to track
         new_point = {"canvas" : canvas,                # canvas object
                       "blade1" : blade1,               # drawing object
@@ -383,6 +398,7 @@ def lock_point (*point_ids:int):
             # Now inhibit the FPL button to stop it being manually unlocked
             points[str(point_id)]["lockbutton"].config(state="disabled") 
             points[str(point_id)]["locked"] = True
+            file_interface.record_state_change("points",point_id)
     return()
 
 # -------------------------------------------------------------------------
@@ -405,6 +421,7 @@ def unlock_point (*point_ids:int):
                 # If the point has FPL we just need to re-enable the FPL button
                 points[str(point_id)]["lockbutton"].config(state="normal") 
             points[str(point_id)]["locked"] = False
+            file_interface.record_state_change("points",point_id)
     return ()
 
 # -------------------------------------------------------------------------
@@ -319,6 +319,9 @@ from . import signals_ground_position
 from . import signals_ground_disc
 from . import signals_semaphores
 from . import mqtt_interface
+from . import network_snapshots
+from . import event_recorder
+from . import callback_profiler
 
 from typing import Union
 from tkinter import *
@@ -738,6 +741,8 @@ def trigger_timed_signal (sig_id:int,start_delay:int=0,time_delay:int=5):
     elif signals_common.signals[str(sig_id)]["override"]:
         logging.error ("Signal "+str(sig_id)+": trigger_timed_signal - Signal is already overriden - not triggering")
     else:
+        # Record the trigger (if the event recorder is active) so it can be replayed later
+        event_recorder.record_timed_signal_trigger(sig_id,start_delay,time_delay)
         # call the signal type-specific functions to update the signal
         if signals_common.signals[str(sig_id)]["sigtype"] == signals_common.sig_type.colour_light:
             logging.info ("Signal "+str(sig_id)+": Triggering Timed Signal")
@@ -756,7 +761,7 @@ def trigger_timed_signal (sig_id:int,start_delay:int=0,time_delay:int=5):
 def subscribe_to_signal_updates (node:str,sig_callback,*sig_ids:int):    
     for sig_id in sig_ids:
         mqtt_interface.subscribe_to_mqtt_messages("signal_updated_event",node,sig_id,
-                                                signals_common.handle_mqtt_signal_updated_event)
+                                    signals_common.handle_mqtt_signal_updated_event,coalesce=True)
         # Create a dummy signal object to hold the state of the remote signal
         # The Identifier is a string combining the the Node-ID and Section-ID
         sig_identifier = mqtt_interface.create_remote_item_identifier(sig_id,node)
@@ -764,7 +769,9 @@ def subscribe_to_signal_updates (node:str,sig_callback,*sig_ids:int):
             signals_common.signals[sig_identifier] = {}
             signals_common.signals[sig_identifier]["sigtype"] = signals_common.sig_type.remote_signal
             signals_common.signals[sig_identifier]["sigstate"] = signals_common.signal_state_type.DANGER
-            signals_common.signals[sig_identifier]["extcallback"] = sig_callback
+            signals_common.signals[sig_identifier]["extcallback"] = callback_profiler.profile_callback(sig_callback,"signal_callback")
+    # Subscribe to the layout state snapshot from the remote node (for fast synchronisation)
+    network_snapshots.subscribe_to_node_snapshot(node)
     return()
 
 #-----------------------------------------------------------------------------------------------
@@ -782,7 +789,7 @@ def subscribe_to_signal_passed_events (node:str, sig_callback, *sig_ids:int):
             signals_common.signals[sig_identifier] = {}
             signals_common.signals[sig_identifier]["sigtype"] = signals_common.sig_type.remote_signal
             signals_common.signals[sig_identifier]["sigstate"] = signals_common.signal_state_type.DANGER
-            signals_common.signals[sig_identifier]["extcallback"] = sig_callback
+            signals_common.signals[sig_identifier]["extcallback"] = callback_profiler.profile_callback(sig_callback,"signal_callback")
     return()
 
 #-----------------------------------------------------------------------------------------------
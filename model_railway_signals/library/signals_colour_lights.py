@@ -6,6 +6,9 @@ from . import common
 from . import signals_common
 from . import dcc_control
 from . import file_interface
+from . import event_tracing
+from . import state_mirror
+from . import layout_metrics
 
 from typing import Union
 from tkinter import *
@@ -359,6 +362,9 @@ def update_colour_light_signal (sig_id:int, sig_ahead_id:Union[str,int]=None):
         # Update the current aspect - note that this dictionary element is also used by the Flash Aspects Thread
         signals_common.signals[str(sig_id)]["sigstate"] = new_aspect
         refresh_signal_aspects (sig_id)
+        event_tracing.record_trace_stage("signal_aspect_update")
+        state_mirror.item_state_changed("signals",sig_id)
+        layout_metrics.increment_counter("signal_aspect_changes",sig_id)
         # Update the Theatre & Feather route indications as these are inhibited/enabled for transitions to/from DANGER
         enable_disable_feather_route_indication(sig_id)
         signals_common.enable_disable_theatre_route_indication(sig_id)
@@ -459,6 +465,7 @@ def update_feather_route_indication (sig_id:int,route_to_set):
         # Deal with route changes - but only if the Route has actually been changed
         if route_to_set != signals_common.signals[str(sig_id)]["routeset"]:
             signals_common.signals[str(sig_id)]["routeset"] = route_to_set
+            file_interface.record_state_change("signals",sig_id)
             if signals_common.signals[str(sig_id)]["featherenabled"] == True:
                 logging.info ("Signal "+str(sig_id)+": Changing feather route display to "+ str(route_to_set).rpartition('.')[-1])
                 dcc_control.update_dcc_signal_route (sig_id, signals_common.signals[str(sig_id)]["routeset"],
@@ -550,6 +557,7 @@ def trigger_timed_colour_light_signal (sig_id:int,start_delay:int=0,time_delay:i
             
         # Override the signal (to display its overridden aspect
         signals_common.signals[str(sig_id)]["override"] = True
+        file_interface.record_state_change("signals",sig_id)
         signals_common.signals[str(sig_id)]["sigbutton"].config(fg="red",disabledforeground="red")
         
         # If a start delay of zero has been specified then we assume the intention is not to make any callbacks
@@ -604,6 +612,7 @@ def trigger_timed_colour_light_signal (sig_id:int,start_delay:int=0,time_delay:i
         global logging
         # We've finished - Clear the signal override and set the Overriden aspect back to its initial condition
         signals_common.signals[str(sig_id)]["override"] = False
+        file_interface.record_state_change("signals",sig_id)
         signals_common.signals[str(sig_id)]["sigbutton"].config(fg="black",disabledforeground="grey50")
         if signals_common.signals[str(sig_id)]["subtype"] == signal_sub_type.distant:
             signals_common.signals[str(sig_id)]["overriddenaspect"] = signals_common.signal_state_type.CAUTION
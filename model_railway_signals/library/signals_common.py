@@ -6,6 +6,12 @@
 from . import common
 from . import dcc_control
 from . import mqtt_interface
+from . import event_tracing
+from . import event_recorder
+from . import callback_profiler
+from . import network_snapshots
+from . import file_interface
+from . import track_sections
 from . import signals_colour_lights
 from . import signals_semaphores
 from . import signals_ground_position
@@ -102,16 +108,24 @@ def null_callback (sig_id:int,callback_type):
 def signal_button_event (sig_id:int):
     global logging
     logging.info("Signal "+str(sig_id)+": Signal Change Button Event ***************************************")
-    # toggle the signal state and refresh the signal
-    toggle_signal(sig_id)
-    auto_refresh_signal(sig_id)
-    # Make the external callback (if one was specified at signal creation time)
-    signals[str(sig_id)]['extcallback'] (sig_id,sig_callback_type.sig_switched)
+    event_recorder.record_input_event("signal_button",sig_id)
+    # Start a new event trace (only if event tracing has been enabled)
+    # The trace is always ended (even if an exception is raised in the external callback)
+    event_tracing.start_trace("Signal "+str(sig_id))
+    try:
+        # toggle the signal state and refresh the signal
+        toggle_signal(sig_id)
+        auto_refresh_signal(sig_id)
+        # Make the external callback (if one was specified at signal creation time)
+        signals[str(sig_id)]['extcallback'] (sig_id,sig_callback_type.sig_switched)
+    finally:
+        event_tracing.end_current_trace()
     return ()
 
 def subsidary_button_event (sig_id:int):
     global logging
     logging.info("Signal "+str(sig_id)+": Subsidary Change Button Event ************************************")
+    event_recorder.record_input_event("subsidary_button",sig_id)
     toggle_subsidary(sig_id)
     #  call the signal type-specific functions to update the signal
     if signals[str(sig_id)]["sigtype"] == sig_type.colour_light:
@@ -125,6 +139,7 @@ def subsidary_button_event (sig_id:int):
 def sig_passed_button_event (sig_id:int):
     global logging
     logging.info("Signal "+str(sig_id)+": Signal Passed Event **********************************************")
+    event_recorder.record_input_event("sig_passed_button",sig_id)
     # Pulse the signal passed button to provide a visual indication (but not if a shutdown has been initiated)
     if not common.shutdown_initiated:
         signals[str(sig_id)]["passedbutton"].config(bg="red")
@@ -132,6 +147,9 @@ def sig_passed_button_event (sig_id:int):
     # Publish the signal passed event via the mqtt interface. Note that the event will only be published if the
     # mqtt interface has been successfully configured and the signal has been set to publish passed events
     publish_signal_passed_event(sig_id)
+    # Process any track section transitions mapped to the signal passed event (so the section
+    # occupancy and any signal overrides are up to date by the time the external callback is made)
+    track_sections.process_occupancy_event("sig_passed",sig_id)
     # Make the external callback (if one was specified at signal creation time)
     signals[str(sig_id)]['extcallback'] (sig_id,sig_callback_type.sig_passed)
     return ()
@@ -139,6 +157,7 @@ def sig_passed_button_event (sig_id:int):
 def approach_release_button_event (sig_id:int):
     global logging
     logging.info("Signal "+str(sig_id)+": Approach Release Event *******************************************")
+    event_recorder.record_input_event("approach_release_button",sig_id)
     # Pulse the approach release button to provide a visual indication
     if not common.shutdown_initiated:
         signals[str(sig_id)]["releasebutton"].config(bg="red")
@@ -179,12 +198,14 @@ def toggle_signal (sig_id:int):
     if signals[str(sig_id)]["sigclear"]:
         logging.info ("Signal "+str(sig_id)+": Toggling signal to ON")
         signals[str(sig_id)]["sigclear"] = False
+        file_interface.record_state_change("signals",sig_id)
         if not signals[str(sig_id)]["automatic"]:
             signals[str(sig_id)]["sigbutton"].config(bg=common.bgraised)
             signals[str(sig_id)]["sigbutton"].config(relief="raised")
     else:
         logging.info ("Signal "+str(sig_id)+": Toggling signal to OFF")
         signals[str(sig_id)]["sigclear"] = True
+        file_interface.record_state_change("signals",sig_id)
         if not signals[str(sig_id)]["automatic"]:
             signals[str(sig_id)]["sigbutton"].config(relief="sunken")
             signals[str(sig_id)]["sigbutton"].config(bg=common.bgsunken)
@@ -202,10 +223,12 @@ def toggle_subsidary (sig_id:int):
     if signals[str(sig_id)]["subclear"]:
         logging.info ("Signal "+str(sig_id)+": Toggling subsidary to ON")
         signals[str(sig_id)]["subclear"] = False
+        file_interface.record_state_change("signals",sig_id)
         signals[str(sig_id)]["subbutton"].config(relief="raised",bg=common.bgraised)
     else:
         logging.info ("Signal "+str(sig_id)+": Toggling subsidary to OFF")
         signals[str(sig_id)]["subclear"] = True
+        file_interface.record_state_change("signals",sig_id)
         signals[str(sig_id)]["subbutton"].config(relief="sunken",bg=common.bgsunken)
     return ()
 
@@ -226,10 +249,12 @@ def set_approach_control (sig_id:int, release_on_yellow:bool = False):
             logging.info ("Signal "+str(sig_id)+": Setting approach control (release on yellow)")
             signals[str(sig_id)]["releaseonyel"] = True
             signals[str(sig_id)]["releaseonred"] = False
+            file_interface.record_state_change("signals",sig_id)
         else:
             logging.info ("Signal "+str(sig_id)+": Setting approach control (release on red)")
             signals[str(sig_id)]["releaseonred"] = True
             signals[str(sig_id)]["releaseonyel"] = False
+            file_interface.record_state_change("signals",sig_id)
     return()
 
 #-------------------------------------------------------------------------
@@ -245,6 +270,7 @@ def clear_approach_control (sig_id:int):
         logging.info ("Signal "+str(sig_id)+": Clearing approach control")
         signals[str(sig_id)]["releaseonyel"] = False
         signals[str(sig_id)]["releaseonred"] = False
+        file_interface.record_state_change("signals",sig_id)
         signals[str(sig_id)]["sigbutton"].config(font=('Courier',common.fontsize,"normal"))
     return()
 
@@ -260,6 +286,7 @@ def set_signal_override (sig_id:int):
         logging.info ("Signal "+str(sig_id)+": Setting override")
         # Set the override state and change the button text to indicate override
         signals[str(sig_id)]["override"] = True
+        file_interface.record_state_change("signals",sig_id)
         signals[str(sig_id)]["sigbutton"].config(fg="red", disabledforeground="red")
     return()
 
@@ -275,6 +302,7 @@ def clear_signal_override (sig_id:int):
         logging.info ("Signal "+str(sig_id)+": Clearing override")
         # Clear the override and change the button colour
         signals[str(sig_id)]["override"] = False
+        file_interface.record_state_change("signals",sig_id)
         signals[str(sig_id)]["sigbutton"].config(fg="black",disabledforeground="grey50")
     return()
 
@@ -295,6 +323,7 @@ def lock_signal (sig_id:int):
         # Disable the Signal button to lock it
         signals[str(sig_id)]["sigbutton"].config(state="disabled")
         signals[str(sig_id)]["siglocked"] = True
+        file_interface.record_state_change("signals",sig_id)
     return()
 
 # -------------------------------------------------------------------------
@@ -311,6 +340,7 @@ def unlock_signal (sig_id:int):
         if not signals[str(sig_id)]["automatic"]:
             signals[str(sig_id)]["sigbutton"].config(state="normal")
         signals[str(sig_id)]["siglocked"] = False
+        file_interface.record_state_change("signals",sig_id)
     return() 
 
 # -------------------------------------------------------------------------
@@ -330,6 +360,7 @@ def lock_subsidary (sig_id:int):
         # Disable the Button to lock the subsidary signal
         signals[str(sig_id)]["subbutton"].config(state="disabled")        
         signals[str(sig_id)]["sublocked"] = True
+        file_interface.record_state_change("signals",sig_id)
     return()
 
 # -------------------------------------------------------------------------
@@ -345,6 +376,7 @@ def unlock_subsidary (sig_id:int):
         # Re-enable the Button to unlock the subsidary signal
         signals[str(sig_id)]["subbutton"].config(state="normal")
         signals[str(sig_id)]["sublocked"] = False
+        file_interface.record_state_change("signals",sig_id)
     return()
 
 # -------------------------------------------------------------------------
@@ -369,6 +401,8 @@ def create_common_signal_elements (canvas,
     tag = "signal"+str(sig_id)
     # If no callback has been specified, use the null callback to do nothing
     if ext_callback is None: ext_callback = null_callback
+    # Wrap the external callback so it can be profiled (see callback_profiler)
+    ext_callback = callback_profiler.profile_callback(ext_callback,"signal_callback")
     # Assign the button labels. if a distant_button_offset has been defined then this represents the 
     # special case of a semaphore distant signal being created on the same "post" as a semaphore
     # home signal. On this case we label the button as "D" to differentiate it from the main
@@ -502,6 +536,7 @@ def update_theatre_route_indication (sig_id,theatre_text:str):
         if theatre_text != signals[str(sig_id)]["theatretext"]:
             signals[str(sig_id)]["canvas"].itemconfig(signals[str(sig_id)]["theatreobject"],text=theatre_text)
             signals[str(sig_id)]["theatretext"] = theatre_text
+            file_interface.record_state_change("signals",sig_id)
             if signals[str(sig_id)]["theatreenabled"] == True:
                 logging.info ("Signal "+str(sig_id)+": Changing theatre route display to \'" + theatre_text + "\'")
                 dcc_control.update_dcc_signal_theatre(sig_id,signals[str(sig_id)]["theatretext"],signal_change=False,sig_at_danger=False)
@@ -579,6 +614,7 @@ def publish_signal_state(sig_id:int):
         log_message = "Signal "+str(sig_id)+": Publishing signal state to MQTT Broker"
         # Publish as "retained" messages so remote items that subscribe later will always pick up the latest state
         mqtt_interface.send_mqtt_message("signal_updated_event",sig_id,data=data,log_message=log_message,retain=True)
+        network_snapshots.published_state_changed()
         return()
 
 def publish_signal_passed_event(sig_id:int):
@@ -6,6 +6,9 @@ from . import signals_common
 from . import dcc_control
 from . import file_interface
 from . import common
+from . import event_tracing
+from . import state_mirror
+from . import layout_metrics
 
 from tkinter import *
 import logging
@@ -146,6 +149,9 @@ def update_ground_position_signal (sig_id:int):
     if aspect_to_set != signals_common.signals[str(sig_id)]["sigstate"]:
         logging.info ("Signal "+str(sig_id)+": Changing aspect to " + str(aspect_to_set).rpartition('.')[-1] + log_message)
         signals_common.signals[str(sig_id)]["sigstate"] = aspect_to_set
+        event_tracing.record_trace_stage("signal_aspect_update")
+        state_mirror.item_state_changed("signals",sig_id)
+        layout_metrics.increment_counter("signal_aspect_changes",sig_id)
 
         if signals_common.signals[str(sig_id)]["sigstate"] == signals_common.signal_state_type.PROCEED:
             signals_common.signals[str(sig_id)]["canvas"].itemconfig(signals_common.signals[str(sig_id)]["sigoff1"],state="normal")
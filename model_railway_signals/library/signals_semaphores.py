@@ -6,6 +6,9 @@ from . import common
 from . import signals_common
 from . import dcc_control
 from . import file_interface
+from . import event_tracing
+from . import state_mirror
+from . import layout_metrics
 
 from typing import Union
 from tkinter import *
@@ -591,6 +594,9 @@ def update_semaphore_signal (sig_id:int, sig_ahead_id:Union[int,str]=None, updat
     # Now refresh the displayed aspect (passing in the log message to be displayed) if the aspect has changed
     if new_aspect != current_aspect:
         signals_common.signals[str(sig_id)]["sigstate"] = new_aspect
+        event_tracing.record_trace_stage("signal_aspect_update")
+        state_mirror.item_state_changed("signals",sig_id)
+        layout_metrics.increment_counter("signal_aspect_changes",sig_id)
         update_main_signal_arms (sig_id,log_message)
         # If this signal is an associated with another signal then we also need to refresh the other signal
         # Associated distant signals need to be updated as they are "slotted" with the home signal - i.e. if the
@@ -626,6 +632,7 @@ def update_semaphore_route_indication (sig_id,route_to_set = None):
     if route_to_set is not None and signals_common.signals[str(sig_id)]["routeset"] != route_to_set:
         logging.info ("Signal "+str(sig_id)+": Setting semaphore route to "+str(route_to_set).rpartition('.')[-1])
         signals_common.signals[str(sig_id)]["routeset"] = route_to_set
+        file_interface.record_state_change("signals",sig_id)
         # Refresh the signal drawing objects (which will also send the DCC commands to change the arms accordingly)
         # Log messages will also be generated for each change - so we don't need lo log anything extra here
         update_main_signal_arms(sig_id," (route has been changed to "+str(route_to_set).rpartition('.')[-1]+")")
@@ -656,6 +663,7 @@ def trigger_timed_semaphore_signal (sig_id:int,start_delay:int=0,time_delay:int=
         
         # Override the signal (to display its overridden aspect
         signals_common.signals[str(sig_id)]["override"] = True
+        file_interface.record_state_change("signals",sig_id)
         signals_common.signals[str(sig_id)]["sigbutton"].config(fg="red",disabledforeground="red")
         
         # If a start delay of zero has been specified then we assume the intention is not to make any callbacks
@@ -681,6 +689,7 @@ def trigger_timed_semaphore_signal (sig_id:int,start_delay:int=0,time_delay:int=
         global logging
         # We've finished - Clear the signal override and set the Overriden aspect back to its initial condition
         signals_common.signals[str(sig_id)]["override"] = False
+        file_interface.record_state_change("signals",sig_id)
         signals_common.signals[str(sig_id)]["sigbutton"].config(fg="black",disabledforeground="grey50")
         logging.info("Signal "+str(sig_id)+": Timed Signal - Signal Updated Event *************************")
         update_semaphore_signal(sig_id)
@@ -0,0 +1,188 @@
+#-----------------------------------------------------------------------------------------------
+# This module provides an optional shared-memory "mirror" of the layout state - so external tools
+# running on the same machine (e.g. departure boards or a web dashboard) can poll the state of the
+# signals, points, sections and block instruments without any MQTT broker traffic and without any
+# load on the main tkinter thread. The mirror is a memory mapped file (use a file in '/dev/shm' on
+# Linux for a file that is only ever held in memory) with a fixed layout - a byte per item for each
+# item type, indexed by the item ID. The mirror is updated whenever the state of an item changes.
+#
+# A sequence counter (a "seqlock") is used so readers never need to take a lock - the counter is
+# incremented (to an odd value) before an update and incremented again (to an even value) once the
+# update is complete. A reader reads the counter, copies the data and then re-reads the counter -
+# if the counter is odd or has changed then an update happened during the read and it re-tries.
+#
+# File Layout (all multi-byte integers are little-endian):
+#    Header       - Magic bytes "MRSM" (4 bytes), format version (1 byte), padding (3 bytes),
+#                   max_items (4 bytes), padding (4 bytes), sequence counter (8 bytes)
+#    Signals      - 'max_items' bytes - the displayed aspect (signal_state_type value), 0 = No signal
+#    Points       - 'max_items' bytes - bit 0 = point exists, bit 1 = switched, bit 2 = FPL active,
+#                                       bit 3 = locked
+#    Sections     - 'max_items' bytes - bit 0 = section exists, bit 1 = occupied
+#    Instruments  - 'max_items' bytes - bits 0-1 = section state, bits 2-3 = repeater state
+#                                       (0 = No instrument, 1 = BLOCKED, 2 = CLEAR, 3 = OCCUPIED)
+#
+# Public types and functions:
+#
+# enable_state_mirror - Creates the shared memory mirror and populates it with the current state of
+#                       all items (so should be called once the layout has been created). Any items
+#                       created afterwards are added to the mirror when their state first changes
+#   Mandatory Parameters:
+#       file_name:str - The name of the file to map (e.g. '/dev/shm/layout_state')
+#   Optional Parameters:
+#       max_items:int - The maximum item ID (for each item type) + 1 - default = 1024
+#
+# disable_state_mirror - Stops updating the mirror and closes the memory mapped file
+#
+# read_state_mirror - Returns a consistent copy of the mirror (for use by external tools). The
+#                     memory mapped file is opened on the first call and kept open for later calls
+#   Mandatory Parameters:
+#       file_name:str - The name of the memory mapped file
+#   Returned dictionary:
+#       "sequence":int - the sequence counter (incremented twice for every update)
+#       "signals":bytes - the signal aspects (as above) - indexed by signal ID
+#       "points":bytes - the point states (as above) - indexed by point ID
+#       "sections":bytes - the section states (as above) - indexed by section ID
+#       "instruments":bytes - the instrument states (as above) - indexed by instrument ID
+#-----------------------------------------------------------------------------------------------
+
+from . import signals_common
+from . import points
+from . import track_sections
+from . import block_instruments
+
+import logging
+import struct
+import mmap
+import time
+
+#-----------------------------------------------------------------------------------------------
+# Global variables used by the module
+#-----------------------------------------------------------------------------------------------
+
+mirror_config: dict = {}
+mirror_config["mirror_active"] = False
+mirror_config["mirror_file"] = None
+mirror_config["mirror_map"] = None
+mirror_config["max_items"] = 0
+mirror_config["sequence"] = 0
+mirror_config["items_out_of_range"] = set()
+
+# Memory mapped files opened by 'read_state_mirror' (key is the file name)
+reader_maps: dict = {}
+
+mirror_magic = b"MRSM"
+mirror_version = 1
+header_format = struct.Struct("<4sB3xI4xQ")
+sequence_offset = 16
+layout_elements = ("signals", "points", "sections", "instruments")
+instrument_states = {None: 1, True: 2, False: 3}
+
+#-----------------------------------------------------------------------------------------------
+# Public API functions to enable/disable the state mirror
+#-----------------------------------------------------------------------------------------------
+
+def enable_state_mirror(file_name:str, max_items:int=1024):
+    global logging
+    disable_state_mirror()
+    try:
+        mirror_file = open(file_name,'w+b')
+        mirror_file.truncate(header_format.size + max_items * len(layout_elements))
+        mirror_map = mmap.mmap(mirror_file.fileno(), header_format.size + max_items * len(layout_elements))
+    except Exception as exception:
+        logging.error("State Mirror: Error creating shared memory mirror - Reported exception: "+str(exception))
+    else:
+        logging.info("State Mirror: Mirroring layout state to '"+file_name+"' (max items "+str(max_items)+")")
+        header_format.pack_into(mirror_map, 0, mirror_magic, mirror_version, max_items, 0)
+        mirror_config["mirror_file"] = mirror_file
+        mirror_config["mirror_map"] = mirror_map
+        mirror_config["max_items"] = max_items
+        mirror_config["sequence"] = 0
+        mirror_config["items_out_of_range"] = set()
+        mirror_config["mirror_active"] = True
+        for sig_id in list(signals_common.signals.keys()): item_state_changed("signals", sig_id)
+        for point_id in list(points.points.keys()): item_state_changed("points", point_id)
+        for section_id in list(track_sections.sections.keys()): item_state_changed("sections", section_id)
+        for block_id in list(block_instruments.instruments.keys()): item_state_changed("instruments", block_id)
+    return()
+
+def disable_state_mirror():
+    global logging
+    if mirror_config["mirror_active"]:
+        logging.info("State Mirror: Stopping the shared memory mirror")
+        mirror_config["mirror_active"] = False
+        mirror_config["mirror_map"].close()
+        mirror_config["mirror_file"].close()
+        mirror_config["mirror_map"] = None
+        mirror_config["mirror_file"] = None
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Internal function to encode the current state of an item (as a single byte)
+#-----------------------------------------------------------------------------------------------
+
+def encode_item_state(layout_element:str, item_id:str):
+    if layout_element == "signals":
+        item = signals_common.signals[item_id]
+        encoded_state = item["sigstate"].value if item["sigstate"] is not None else 0
+    elif layout_element == "points":
+        item = points.points[item_id]
+        encoded_state = 0x01 | (item["switched"] << 1) | (item["fpllock"] << 2) | (item["locked"] << 3)
+    elif layout_element == "sections":
+        item = track_sections.sections[item_id]
+        encoded_state = 0x01 | (item["occupied"] << 1)
+    else:
+        item = block_instruments.instruments[item_id]
+        encoded_state = instrument_states[item["sectionstate"]] | (instrument_states[item["repeaterstate"]] << 2)
+    return(encoded_state)
+
+#-----------------------------------------------------------------------------------------------
+# Internal function called by the other modules whenever the state of an item changes. Only items
+# created on the local schematic (with an ID less than max_items) are mirrored. The sequence counter
+# is incremented (to an odd value) before the update and again (to an even value) afterwards
+#-----------------------------------------------------------------------------------------------
+
+def item_state_changed(layout_element:str, item_id):
+    global logging
+    if mirror_config["mirror_active"]:
+        item_id = str(item_id)
+        if item_id.isdigit():
+            if int(item_id) >= mirror_config["max_items"]:
+                if (layout_element, item_id) not in mirror_config["items_out_of_range"]:
+                    mirror_config["items_out_of_range"].add((layout_element, item_id))
+                    logging.warning("State Mirror: "+layout_element+" ID "+item_id+" is out of range - not mirrored")
+            else:
+                offset = (header_format.size + layout_elements.index(layout_element) * mirror_config["max_items"]
+                                                                                       + int(item_id))
+                mirror_map = mirror_config["mirror_map"]
+                mirror_config["sequence"] = mirror_config["sequence"] + 1
+                struct.pack_into("<Q", mirror_map, sequence_offset, mirror_config["sequence"])
+                mirror_map[offset] = encode_item_state(layout_element, item_id)
+                mirror_config["sequence"] = mirror_config["sequence"] + 1
+                struct.pack_into("<Q", mirror_map, sequence_offset, mirror_config["sequence"])
+    return()
+
+#-----------------------------------------------------------------------------------------------
+# Public API function to read the mirror (for external tools). We re-try the read if the mirror
+# was updated whilst we were reading it (the sequence counter was odd or changed during the read)
+#-----------------------------------------------------------------------------------------------
+
+def read_state_mirror(file_name:str):
+    if file_name not in reader_maps.keys():
+        with open(file_name,'rb') as mirror_file:
+            reader_maps[file_name] = mmap.mmap(mirror_file.fileno(), 0, access=mmap.ACCESS_READ)
+    mirror_map = reader_maps[file_name]
+    magic, version, max_items, sequence = header_format.unpack_from(mirror_map, 0)
+    if magic != mirror_magic or version > mirror_version:
+        raise ValueError("'"+file_name+"' is not a layout state mirror file")
+    while True:
+        sequence = struct.unpack_from("<Q", mirror_map, sequence_offset)[0]
+        if sequence % 2 == 0:
+            data = mirror_map[header_format.size:header_format.size + max_items * len(layout_elements)]
+            if struct.unpack_from("<Q", mirror_map, sequence_offset)[0] == sequence: break
+        time.sleep(0)
+    mirror_state = {"sequence": sequence}
+    for index, layout_element in enumerate(layout_elements):
+        mirror_state[layout_element] = data[index * max_items:(index + 1) * max_items]
+    return(mirror_state)
+
+###############################################################################################
@@ -38,6 +38,61 @@
 #                   Returns the current value of the Section Lable (as a string) to allow this
 #                   to be 'passed' to the next section (via the set_section_occupied function)  
 # 
+# set_sections - Applies a batch of section updates in one go. The section buttons are updated
+#                and the changes published to the MQTT broker once all updates have been applied
+#                (so each changed section is only re-drawn and published once)
+#   Mandatory Parameters:
+#       updates:[(section_id:int, occupied:bool, label:str),] - The updates to apply. The label
+#                is optional (i.e. (section_id, occupied) can be used to leave the label unchanged)
+#   Optional Parameters:
+#       sections_callback - A function to call once the updates have been applied - default = None
+#                Note that the callback function returns ([section_id,], section_callback_type.section_updated)
+#                with the list of sections whose state or label have actually changed
+# 
+# ------------------------------------------------------------------------------------------
+#
+# The following functions are associated with the Occupancy Automation Feature - rather than
+# writing the code to move the section labels along the line in the signal passed / sensor
+# callbacks, the movements can be declared up-front and the library will apply them. Each
+# "event" (signal passed or sensor triggered) is processed as a single batched update - the
+# label is moved from one section to the next and then any signals protected by the affected
+# sections are overridden (or the override is cleared) and refreshed once. The transitions for
+# an event are processed before the external callback for the event is made (so the callback
+# will see the updated section occupancy and signal overrides).
+#
+# add_section_transition - Declares a movement of a train (the section label) from one section to
+#                 the next when the specified signal passed or track sensor event occurs
+#   Mandatory Parameters:
+#       from_section:int - The section the train is leaving (0 = entering from off the schematic)
+#       to_section:int - The section the train is entering (0 = leaving the schematic)
+#   Optional Parameters:
+#       sig_passed:int - The signal whose 'signal passed' event triggers the transition - default = 0
+#       sensor:int - The track sensor whose 'triggered' event triggers the transition - default = 0
+#       points_normal:[int,] - Points that must be NORMAL for the transition to apply - default = []
+#       points_switched:[int,] - Points that must be SWITCHED for the transition to apply - default = []
+#       signals_clear:[int,] - Signals that must be OFF for the transition to apply - default = []
+#       bidirectional:bool - The transition also applies in the reverse direction (i.e. to_section
+#                 OCCUPIED and from_section CLEAR) for trains running the other way - default = False
+#   Note that either a sig_passed or a sensor event must be specified (but not both). Sensors
+#   mapped to signal passed/approach events can't be used (specify the signal via 'sig_passed'
+#   instead). If more than one transition is declared for an event then the first one (in the
+#   order they were declared) whose conditions are met and whose 'from' section is OCCUPIED (or
+#   whose 'to' section is CLEAR when entering the schematic) is applied.
+#
+# add_section_protection - Overrides a signal (to DANGER) whenever a section ahead is OCCUPIED. The
+#                 override is set and cleared automatically as the section and point states change.
+#                 Note that any override applied by the application for the signal will also be
+#                 cleared when the section is cleared (so use one mechanism or the other)
+#   Mandatory Parameters:
+#       section_id:int - The section protected by the signal
+#       sig_id:int - The signal to override when the section is OCCUPIED
+#   Optional Parameters:
+#       points_normal:[int,] - Points that must be NORMAL for the section to be on the route
+#                 ahead of the signal (i.e. for the protection to apply) - default = []
+#       points_switched:[int,] - Points that must be SWITCHED for the section to be on the route
+#                 ahead of the signal (i.e. for the protection to apply) - default = []
+#   If more than one protection is added for a signal, the signal is overridden if ANY apply.
+#
 # ------------------------------------------------------------------------------------------
 #
 # The following functions are associated with the MQTT networking Feature:
@@ -60,8 +115,16 @@
 from . import common
 from . import mqtt_interface
 from . import file_interface
+from . import network_snapshots
+from . import event_recorder
+from . import layout_metrics
+from . import callback_profiler
+from . import signals_common
+from . import points
+from . import track_sensors
 from tkinter import *
 from typing import Union
+import tkinter.font
 import enum
 import logging
 
@@ -82,12 +145,35 @@ sections: dict = {}
 # Global variables used by the Track Sections Module
 # -------------------------------------------------------------------------
 
-# Global references to the Tkinter Entry box and the associated window
-text_entry_box = None
-entry_box_window = None
+# The Tkinter Entry boxes (for editing the section labels) are created on first use and then
+# re-used (hidden when not in use) - key is the canvas, value is a dictionary of the Entry box,
+# the canvas window it is displayed in and the section currently being edited (0 = not in use)
+entry_boxes: dict = {}
+# The fonts for the section buttons are shared by all sections (key is the font size)
+section_fonts: dict = {}
+# The configuration of the section buttons for each state (CLEAR and OCCUPIED)
+clear_button_config = {"relief":"raised", "bg":"grey", "fg":"grey40",
+                       "activebackground":"grey", "activeforeground":"grey40"}
+occupied_button_config = {"relief":"sunken", "bg":"black", "fg":"white",
+                          "activebackground":"black", "activeforeground":"white"}
 # Global list of track sections to publish to the MQTT Broker
 list_of_sections_to_publish=[]
 
+# Global dictionaries for the Occupancy Automation Engine. The transitions are indexed by the
+# event that triggers them - key is (event_type, item_id) where the event type is "sig_passed" or
+# "sensor". The protections are held for each signal and indexed by the sections/points they use
+section_transitions: dict = {}
+signal_protections: dict = {}
+section_protected_signals: dict = {}
+point_protected_signals: dict = {}
+# Section updates made by the engine (for an event) or by 'set_sections' are applied as a batch -
+# the section buttons, MQTT publications and protected signals are only updated at the end
+section_batch: dict = {}
+section_batch["batch_active"] = False
+section_batch["buttons_to_update"] = set()
+section_batch["sections_to_publish"] = {}
+section_batch["signals_to_update"] = set()
+
 # -------------------------------------------------------------------------
 # The default "External" callback for the section buttons
 # Used if this is not specified when the section is created
@@ -104,6 +190,37 @@ def null_callback(section_id:int, callback_type):
 def section_exists(section_id:int):
     return (str(section_id) in sections.keys() )
 
+# -------------------------------------------------------------------------
+# Internal function to get the (shared) font for the section buttons
+# -------------------------------------------------------------------------
+
+def get_section_font(font_size:int):
+    if font_size not in section_fonts.keys():
+        section_fonts[font_size] = tkinter.font.Font(family="Ariel", size=font_size, weight="normal")
+    return(section_fonts[font_size])
+
+# -------------------------------------------------------------------------
+# Internal function to update the section button to reflect the current state
+# and label. The displayed configuration is cached so we only call 'config' for
+# the options that have actually changed (and only ever call it once)
+# -------------------------------------------------------------------------
+
+def update_section_button(section_id:int):
+    if section_batch["batch_active"]:
+        section_batch["buttons_to_update"].add(str(section_id))
+        return()
+    section = sections[str(section_id)]
+    if section["occupied"]: button_config = dict(occupied_button_config)
+    else: button_config = dict(clear_button_config)
+    button_config["text"] = section["labeltext"]
+    changed_config = {}
+    for option, value in button_config.items():
+        if section["displayed"].get(option) != value: changed_config[option] = value
+    if changed_config:
+        section["button1"].config(**changed_config)
+        section["displayed"].update(changed_config)
+    return()
+
 # -------------------------------------------------------------------------
 # Callback for processing Button presses (manual toggling of Track Sections)
 # -------------------------------------------------------------------------
@@ -111,6 +228,7 @@ def section_exists(section_id:int):
 def section_button_event (section_id:int):
     global logging
     logging.info ("Section "+str(section_id)+": Track Section Toggled *******************************************")
+    event_recorder.record_input_event("section_button",section_id)
     toggle_section(section_id)
     # Publish the state changes to the broker (for other nodes to consume). Note that changes will only
     # be published if the MQTT interface has been configured for publishing updates for this track section
@@ -131,15 +249,19 @@ def toggle_section (section_id:int):
         logging.info ("Section "+str(section_id)+": Changing to CLEAR - Label \'"
                                          +sections[str(section_id)]["labeltext"]+"\'")
         sections[str(section_id)]["occupied"] = False
-        sections[str(section_id)]["button1"].config(relief="raised", bg="grey", fg="grey40",
-                                            activebackground="grey", activeforeground="grey40")
+        file_interface.record_state_change("sections",section_id)
     else:
         # section is off
         logging.info ("Section "+str(section_id)+": Changing to OCCUPIED - Label \'"
                                          +sections[str(section_id)]["labeltext"]+"\'")
         sections[str(section_id)]["occupied"] = True
-        sections[str(section_id)]["button1"].config(relief="sunken", bg="black",fg="white",
-                                            activebackground="black", activeforeground="white")
+        file_interface.record_state_change("sections",section_id)
+    # Update the button colours (and the label text if that has also been changed)
+    update_section_button(section_id)
+    layout_metrics.increment_counter("section_transitions",section_id)
+    # Update any signals protected by the section (deferred if we are processing an event)
+    if str(section_id) in section_protected_signals.keys():
+        update_protected_signals(section_protected_signals[str(section_id)])
     return()
 
 # -------------------------------------------------------------------------
@@ -148,40 +270,42 @@ def toggle_section (section_id:int):
 
 def update_identifier(section_id):
     global sections 
-    global text_entry_box
-    global entry_box_window
     logging.info ("Section "+str(section_id)+": Track Section Label Updated **************************************")
-    # Set the new label for the section button and set the width to the width it was created with
+    # Set the new label for the section (the button width is fixed when the section is created)
     # If we get back an empty string then set the label back to the default (OCCUPIED)
-    new_section_label =text_entry_box.get()
+    entry_box = entry_boxes[sections[str(section_id)]["canvas"]]
+    new_section_label = entry_box["entry"].get()
     if new_section_label=="": new_section_label="OCCUPIED"
+    # Hide the entry box first (in case it is re-opened from one of the callbacks below)
+    close_entry_box(entry_box)
     sections[str(section_id)]["labeltext"] = new_section_label
-    sections[str(section_id)]["button1"]["text"] = new_section_label
-    sections[str(section_id)]["button1"].config(width=sections[str(section_id)]["labellength"])
+    file_interface.record_state_change("sections",section_id)
     # Assume that by entering a value the user wants to set the section to OCCUPIED. Note that the
-    # toggle_section function will also publish the section state & label changes to the MQTT Broker
+    # toggle_section function will update the section button text and colours in a single call
     if not sections[str(section_id)]["occupied"]:
         toggle_section(section_id)
+    else:
+        update_section_button(section_id)
     # Publish the label changes to the broker (for other nodes to consume). Note that changes will only
     # be published if the MQTT interface has been configured for publishing updates for this track section
     send_mqtt_section_updated_event(section_id)
     # Make an external callback to indicate the section has been switched
     sections[str(section_id)]["extcallback"] (section_id,section_callback_type.section_updated)
-    # Clean up by destroying the entry box and the window we created it in
-    text_entry_box.destroy()
-    sections[str(section_id)]["canvas"].delete(entry_box_window)
     return()
 
 # -------------------------------------------------------------------------
-# Internal function to close the entry widget (on ESCAPE)
+# Internal functions to close the entry widget (on ESCAPE). Rather than being
+# destroyed, the entry box is hidden so it can be re-used for the next edit
 # -------------------------------------------------------------------------
 
 def cancel_update(section_id):
-    global text_entry_box
-    global entry_box_window
-    # Clean up by destroying the entry box and the window we created it in
-    text_entry_box.destroy()
-    sections[str(section_id)]["canvas"].delete(entry_box_window)
+    close_entry_box(entry_boxes[sections[str(section_id)]["canvas"]])
+    return()
+
+def close_entry_box(entry_box:dict):
+    if entry_box["section_id"] != 0:
+        entry_box["canvas"].itemconfigure(entry_box["window"], state="hidden")
+        entry_box["section_id"] = 0
     return()
 
 # -------------------------------------------------------------------------
@@ -189,30 +313,37 @@ def cancel_update(section_id):
 # -------------------------------------------------------------------------
 
 def open_entry_box(section_id):
-    global text_entry_box
-    global entry_box_window
     canvas = sections[str(section_id)]["canvas"]
     # If another text entry box is already open then close that first
-    if entry_box_window is not None:
-        text_entry_box.destroy()
-        canvas.delete(entry_box_window)
-    # Set the font size and length for the text entry box
-    font_size = common.fontsize
+    for entry_box in entry_boxes.values(): close_entry_box(entry_box)
+    # Create the entry box for the canvas on first use and bind the RETURN and ESCAPE events to it
+    # The events are processed for whichever section the entry box is currently being used for
+    if canvas not in entry_boxes.keys():
+        entry_box = {"canvas":canvas, "section_id":0, "width":0}
+        entry_box["entry"] = Entry(canvas,font=get_section_font(common.fontsize))
+        entry_box["entry"].bind('<Return>', lambda event:update_identifier(entry_box["section_id"]))
+        entry_box["entry"].bind('<Escape>', lambda event:cancel_update(entry_box["section_id"]))
+        entry_box["window"] = canvas.create_window (0,0,window=entry_box["entry"],state="hidden")
+        entry_boxes[canvas] = entry_box
+    entry_box = entry_boxes[canvas]
+    entry_box["section_id"] = section_id
+    # Set the length for the text entry box (only if it has changed)
     label_length = sections[str(section_id)]["labellength"]
-    # Create the entry box and bind the RETURN and ESCAPE events to it
-    text_entry_box = Entry(canvas,width=label_length,font=('Ariel',font_size,"normal"))
-    text_entry_box.bind('<Return>', lambda event:update_identifier(section_id))
-    text_entry_box.bind('<Escape>', lambda event:cancel_update(section_id))
+    if entry_box["width"] != label_length:
+        entry_box["entry"].config(width=label_length)
+        entry_box["width"] = label_length
     # if the section button is already showing occupied then we EDIT the value
+    entry_box["entry"].delete(0,END)
     if sections[str(section_id)]["occupied"]:
-        text_entry_box.insert(0,sections[str(section_id)]["labeltext"])
-    # Create a window on the canvas for the Entry box (overlaying the section button)
-    bbox = sections[str(section_id)]["canvas"].bbox("section"+str(section_id))
+        entry_box["entry"].insert(0,sections[str(section_id)]["labeltext"])
+    # Move the window on the canvas for the Entry box (overlaying the section button) and show it
+    bbox = canvas.bbox("section"+str(section_id))
     x = bbox[0] + (bbox[2]-bbox[0]) / 2
     y = bbox[1] + (bbox[3]-bbox[1]) / 2
-    entry_box_window = canvas.create_window (x,y,window=text_entry_box)
+    canvas.coords(entry_box["window"],x,y)
+    canvas.itemconfigure(entry_box["window"],state="normal")
     # Force focus on the entry box so it will accept the keyboard entry immediately
-    text_entry_box.focus()
+    entry_box["entry"].focus()
     return()
 
 # -------------------------------------------------------------------------
@@ -236,12 +367,13 @@ def create_section (canvas, section_id:int, x:int, y:int,
     else:
         # Create the button objects and their callbacks
         font_size = common.fontsize
-        section_button = Button (canvas, text=label, state="normal", relief="raised",
-                    padx=common.xpadding, pady=common.ypadding, font=('Ariel',font_size,"normal"),
-                    bg="grey", fg="grey40", activebackground="grey", activeforeground="grey40",
+        section_button = Button (canvas, text=label, state="normal", padx=common.xpadding,
+                    pady=common.ypadding, font=get_section_font(font_size), **clear_button_config,
                     command = lambda:section_button_event(section_id), width = len(label))
         # Note the "Tag" for the drawing objects for this track section (i.e. this window)
         canvas.create_window (x,y,window=section_button,tags="section"+str(section_id))
+        # Wrap the external callback so it can be profiled (see callback_profiler)
+        section_callback = callback_profiler.profile_callback(section_callback,"section_callback")
         # Compile a dictionary of everything we need to track
         sections[str(section_id)] = {"canvas" : canvas,                   # canvas object
                                      "button1" : section_button,          # drawing object
@@ -250,7 +382,8 @@ def create_section (canvas, section_id:int, x:int, y:int,
                                      "labellength" : len(label),          # The fixed length for the button
                                      "positionx" : x,                     # Position of the button on the canvas
                                      "positiony" : y,                     # Position of the button on the canvas
-                                     "occupied" : False }                 # Current state
+                                     "occupied" : False,                  # Current state
+                                     "displayed" : dict(clear_button_config, text=label) } # Displayed button config
         # Bind the Middle and Right Mouse buttons to the section_button if the
         # Section is editable so that a "right click" will open the entry box 
         # Disable the button(so the section cannot be toggled) if not editable
@@ -264,7 +397,7 @@ def create_section (canvas, section_id:int, x:int, y:int,
         # Set the label to the loaded_label (loaded_label will be 'None' if no data was loaded)
         if loaded_state["labeltext"]:
             sections[str(section_id)]["labeltext"] = loaded_state["labeltext"]
-            sections[str(section_id)]["button1"]["text"] = loaded_state["labeltext"]
+            update_section_button(section_id)
         # Toggle the section if OCCUPIED (loaded_state_occupied will be 'None' if no data was loaded)
         if loaded_state["occupied"]: toggle_section(section_id)
         # Publish the initial state to the broker (for other nodes to consume). Note that changes will only
@@ -315,17 +448,19 @@ def set_section_occupied (section_id:int,label:str=None):
     else:
         if not section_occupied(section_id):
             # Need to toggle the section - ALSO update the label if that has been changed
+            # Note that toggle_section updates the button text and colours in a single call
             if label is not None and sections[str(section_id)]["labeltext"] != label:
-                sections[str(section_id)]["button1"]["text"] = label
                 sections[str(section_id)]["labeltext"]= label
+                file_interface.record_state_change("sections",section_id)
             toggle_section(section_id)
             # Publish the state changes to the broker (for other nodes to consume). Note that changes will only
             # be published if the MQTT interface has been configured for publishing updates for this track section
             send_mqtt_section_updated_event(section_id)
         elif label is not None and sections[str(section_id)]["labeltext"] != label:
             # Section state remains unchanged but we need to update the Label
-            sections[str(section_id)]["button1"]["text"] = label
             sections[str(section_id)]["labeltext"]= label
+            file_interface.record_state_change("sections",section_id)
+            update_section_button(section_id)
             # Publish the label changes to the broker (for other nodes to consume). Note that changes will only
             # be published if the MQTT interface has been configured for publishing updates for this track section
             send_mqtt_section_updated_event(section_id)
@@ -351,6 +486,236 @@ def clear_section_occupied (section_id:int):
         section_label = sections[str(section_id)]["labeltext"]
     return(section_label)
 
+# -------------------------------------------------------------------------
+# Internal function to check the route conditions for a transition / protection
+# -------------------------------------------------------------------------
+
+def route_conditions_met (points_normal:list, points_switched:list, signals_clear:list=[]):
+    for point_id in points_normal:
+        if points.points[str(point_id)]["switched"]: return(False)
+    for point_id in points_switched:
+        if not points.points[str(point_id)]["switched"]: return(False)
+    for sig_id in signals_clear:
+        if not signals_common.signals[str(sig_id)]["sigclear"]: return(False)
+    return(True)
+
+# -------------------------------------------------------------------------
+# Internal functions to set/clear the override of the protected signals. If the
+# engine is processing an event then the signals are just added to the batch
+# (and updated once the event has been processed). Otherwise they are updated
+# straight away (the section has been changed manually or by the application)
+# -------------------------------------------------------------------------
+
+def update_protected_signals (sig_ids):
+    if section_batch["batch_active"]:
+        section_batch["signals_to_update"].update(sig_ids)
+    else:
+        for sig_id in sig_ids: update_protected_signal(sig_id)
+    return()
+
+def update_protected_signal (sig_id:int):
+    override = False
+    for protection in signal_protections[str(sig_id)]:
+        if (sections[str(protection["section"])]["occupied"] and
+              route_conditions_met(protection["points_normal"], protection["points_switched"])):
+            override = True
+            break
+    if override != signals_common.signals[str(sig_id)]["override"]:
+        if override: signals_common.set_signal_override(sig_id)
+        else: signals_common.clear_signal_override(sig_id)
+        signals_common.auto_refresh_signal(sig_id)
+    return()
+
+def update_point_protections (point_id:int):
+    if str(point_id) in point_protected_signals.keys():
+        update_protected_signals(point_protected_signals[str(point_id)])
+    return()
+
+# -------------------------------------------------------------------------
+# Internal function to move the train (label) from one section to another
+# (section 0 is "off the schematic") - returns True if the move was made
+# -------------------------------------------------------------------------
+
+def move_section_label (from_section:int, to_section:int):
+    global logging
+    if from_section == 0:
+        if to_section == 0 or sections[str(to_section)]["occupied"]: return(False)
+        logging.info ("Section "+str(to_section)+": Occupancy transition - train entering the schematic")
+        set_section_occupied(to_section)
+    elif not sections[str(from_section)]["occupied"]:
+        return(False)
+    elif to_section == 0:
+        logging.info ("Section "+str(from_section)+": Occupancy transition - train leaving the schematic")
+        clear_section_occupied(from_section)
+    else:
+        logging.info ("Section "+str(from_section)+": Occupancy transition - moving label \'"
+                      +sections[str(from_section)]["labeltext"]+"\' to Section "+str(to_section))
+        set_section_occupied(to_section, label=clear_section_occupied(from_section))
+    return(True)
+
+# -------------------------------------------------------------------------
+# Internal functions to start and complete a batch of section updates. Once the
+# batch is complete each changed section button is re-configured once, the final
+# state of each changed section is published once and then the protected signals
+# are updated. 'start_section_batch' returns False if a batch is already active
+# (in which case the updates just become part of the batch already in progress)
+# -------------------------------------------------------------------------
+
+def start_section_batch():
+    if section_batch["batch_active"]: return(False)
+    section_batch["batch_active"] = True
+    return(True)
+
+def complete_section_batch():
+    section_batch["batch_active"] = False
+    buttons_to_update = section_batch["buttons_to_update"]
+    sections_to_publish = section_batch["sections_to_publish"]
+    signals_to_update = section_batch["signals_to_update"]
+    section_batch["buttons_to_update"] = set()
+    section_batch["sections_to_publish"] = {}
+    section_batch["signals_to_update"] = set()
+    for section_id in buttons_to_update:
+        if section_exists(section_id): update_section_button(section_id)
+    for section_id in sections_to_publish.keys(): send_mqtt_section_updated_event(section_id)
+    for sig_id in sorted(signals_to_update): update_protected_signal(sig_id)
+    return()
+
+# -------------------------------------------------------------------------
+# Internal function called by the signals_common and track_sensors modules
+# whenever a signal passed / sensor triggered event occurs. The first matching
+# transition is applied and then the affected signals are updated in one go
+# -------------------------------------------------------------------------
+
+def process_occupancy_event (event_type:str, item_id:int):
+    transitions = section_transitions.get((event_type, str(item_id)))
+    if transitions is not None:
+        # If a batch is already active then the updates just become part of that batch
+        batch_started = start_section_batch()
+        try:
+            for transition in transitions:
+                if route_conditions_met(transition["points_normal"], transition["points_switched"],
+                                                                    transition["signals_clear"]):
+                    if move_section_label(transition["from_section"], transition["to_section"]): break
+                    if (transition["bidirectional"] and
+                          move_section_label(transition["to_section"], transition["from_section"])): break
+        finally:
+            if batch_started: complete_section_batch()
+    return()
+
+# -------------------------------------------------------------------------
+# Public API function to declare a section transition
+# -------------------------------------------------------------------------
+
+def add_section_transition (from_section:int, to_section:int,
+                            sig_passed:int = 0,
+                            sensor:int = 0,
+                            points_normal:list = [],
+                            points_switched:list = [],
+                            signals_clear:list = [],
+                            bidirectional:bool = False):
+    global logging
+    logging.info ("Section "+str(from_section)+": Adding transition to Section "+str(to_section))
+    if from_section == 0 and to_section == 0:
+        logging.error ("Section "+str(from_section)+": add_section_transition - No sections specified")
+    elif from_section != 0 and not section_exists(from_section):
+        logging.error ("Section "+str(from_section)+": add_section_transition - Section does not exist")
+    elif to_section != 0 and not section_exists(to_section):
+        logging.error ("Section "+str(from_section)+": add_section_transition - Section "+str(to_section)+" does not exist")
+    elif (sig_passed > 0) == (sensor > 0):
+        logging.error ("Section "+str(from_section)+": add_section_transition - Must specify a sig_passed OR a sensor event")
+    elif sig_passed > 0 and not signals_common.sig_exists(sig_passed):
+        logging.error ("Section "+str(from_section)+": add_section_transition - Signal "+str(sig_passed)+" does not exist")
+    elif sensor > 0 and not track_sensors.sensor_exists(sensor):
+        logging.error ("Section "+str(from_section)+": add_section_transition - Sensor "+str(sensor)+" does not exist")
+    elif sensor > 0 and track_sensors.sensor_mapped_to_signal(sensor):
+        logging.error ("Section "+str(from_section)+": add_section_transition - Sensor "+str(sensor)+
+                       " is mapped to a signal event (use 'sig_passed' to specify the signal passed event)")
+    elif not all(points.point_exists(point_id) for point_id in points_normal + points_switched):
+        logging.error ("Section "+str(from_section)+": add_section_transition - Point does not exist")
+    elif not all(signals_common.sig_exists(sig_id) for sig_id in signals_clear):
+        logging.error ("Section "+str(from_section)+": add_section_transition - Signal does not exist")
+    else:
+        if sig_passed > 0:
+            event = ("sig_passed", str(sig_passed))
+        else:
+            event = ("sensor", str(sensor))
+            track_sensors.enable_sensor_events(sensor)
+        if event not in section_transitions.keys(): section_transitions[event] = []
+        section_transitions[event].append({"from_section"    : from_section,
+                                           "to_section"      : to_section,
+                                           "points_normal"   : list(points_normal),
+                                           "points_switched" : list(points_switched),
+                                           "signals_clear"   : list(signals_clear),
+                                           "bidirectional"   : bidirectional})
+    return()
+
+# -------------------------------------------------------------------------
+# Public API function to declare a signal protected by a section
+# -------------------------------------------------------------------------
+
+def add_section_protection (section_id:int, sig_id:int,
+                            points_normal:list = [],
+                            points_switched:list = []):
+    global logging
+    logging.info ("Section "+str(section_id)+": Adding protection for Signal "+str(sig_id))
+    if not section_exists(section_id):
+        logging.error ("Section "+str(section_id)+": add_section_protection - Section does not exist")
+    elif not signals_common.sig_exists(sig_id):
+        logging.error ("Section "+str(section_id)+": add_section_protection - Signal "+str(sig_id)+" does not exist")
+    elif not all(points.point_exists(point_id) for point_id in points_normal + points_switched):
+        logging.error ("Section "+str(section_id)+": add_section_protection - Point does not exist")
+    else:
+        if str(sig_id) not in signal_protections.keys(): signal_protections[str(sig_id)] = []
+        signal_protections[str(sig_id)].append({"section"         : section_id,
+                                                "points_normal"   : list(points_normal),
+                                                "points_switched" : list(points_switched)})
+        section_protected_signals.setdefault(str(section_id), set()).add(sig_id)
+        for point_id in points_normal + points_switched:
+            point_protected_signals.setdefault(str(point_id), set()).add(sig_id)
+        # Apply the protection for the current state of the section
+        update_protected_signals([sig_id])
+    return()
+
+# -------------------------------------------------------------------------
+# Public API function to apply a batch of section updates in one go
+# -------------------------------------------------------------------------
+
+def set_sections (updates:list, sections_callback = None):
+    global logging
+    logging.info ("Sections: Applying batch of "+str(len(updates))+" section updates")
+    # The state of each section before the batch (so we can work out which have actually changed)
+    initial_states = {}
+    started = start_section_batch()
+    try:
+        for update in updates:
+            section_id, occupied = update[0], update[1]
+            label = update[2] if len(update) > 2 else None
+            if not section_exists(section_id):
+                logging.error ("Section "+str(section_id)+": set_sections - Section does not exist")
+                continue
+            if section_id not in initial_states.keys():
+                initial_states[section_id] = (sections[str(section_id)]["occupied"], sections[str(section_id)]["labeltext"])
+            if occupied:
+                set_section_occupied(section_id, label=label)
+            else:
+                # Update the label first (if required) - the button is only updated at the end of the batch
+                if label is not None and sections[str(section_id)]["labeltext"] != label:
+                    sections[str(section_id)]["labeltext"] = label
+                    file_interface.record_state_change("sections",section_id)
+                    update_section_button(section_id)
+                    send_mqtt_section_updated_event(section_id)
+                clear_section_occupied(section_id)
+    finally:
+        if started: complete_section_batch()
+    # Make a single callback for all the sections that have been changed
+    changed_sections = [section_id for section_id, initial_state in initial_states.items() if initial_state !=
+                        (sections[str(section_id)]["occupied"], sections[str(section_id)]["labeltext"])]
+    if sections_callback is not None and changed_sections:
+        # Wrap the external callback so it can be profiled (see callback_profiler)
+        sections_callback = callback_profiler.profile_callback(sections_callback,"section_callback")
+        sections_callback(changed_sections, section_callback_type.section_updated)
+    return()
+
 #-----------------------------------------------------------------------------------------------
 # Public API Function to "subscribe" to section updates published by remote MQTT "Node"
 #-----------------------------------------------------------------------------------------------
@@ -359,7 +724,7 @@ def subscribe_to_section_updates (node:str,sec_callback,*sec_ids:int):
     global sections
     for sec_id in sec_ids:
         mqtt_interface.subscribe_to_mqtt_messages("section_updated_event",node,sec_id,
-                                                  handle_mqtt_section_updated_event)
+                                    handle_mqtt_section_updated_event,coalesce=True)
         # Create a dummy section object to hold the state of the remote track occupancy section
         # The Identifier for a remote Section is a string combining the the Node-ID and Section-ID
         section_identifier = mqtt_interface.create_remote_item_identifier(sec_id,node)
@@ -367,7 +732,9 @@ def subscribe_to_section_updates (node:str,sec_callback,*sec_ids:int):
             sections[section_identifier] = {}
             sections[section_identifier]["occupied"] = False
             sections[section_identifier]["labeltext"] = "OCCUPIED"
-            sections[section_identifier]["extcallback"] = sec_callback
+            sections[section_identifier]["extcallback"] = callback_profiler.profile_callback(sec_callback,"section_callback")
+    # Subscribe to the layout state snapshot from the remote node (for fast synchronisation)
+    network_snapshots.subscribe_to_node_snapshot(node)
     return()
 
 #-----------------------------------------------------------------------------------------------
@@ -407,13 +774,17 @@ def handle_mqtt_section_updated_event(message):
 # --------------------------------------------------------------------------------
 
 def send_mqtt_section_updated_event(section_id:int):
-    if section_id in list_of_sections_to_publish:
+    if section_id in list_of_sections_to_publish and section_batch["batch_active"]:
+        # Only the final state of each section is published at the end of the batch
+        section_batch["sections_to_publish"][section_id] = True
+    elif section_id in list_of_sections_to_publish:
         data = {}
         data["occupied"] = sections[str(section_id)]["occupied"]
         data["labeltext"] = sections[str(section_id)]["labeltext"]
         log_message = "Section "+str(section_id)+": Publishing section state to MQTT Broker"
         # Publish as "retained" messages so remote items that subscribe later will always pick up the latest state
         mqtt_interface.send_mqtt_message("section_updated_event",section_id,data=data,log_message=log_message,retain=True)
+        network_snapshots.published_state_changed()
     return()
 
 # ------------------------------------------------------------------------------------------
@@ -425,6 +796,9 @@ def send_mqtt_section_updated_event(section_id:int):
 def delete_section(section_id:int):
     global sections
     if section_exists(section_id):
+        # Close the entry box if it is open for the section (the entry box is retained for re-use)
+        entry_box = entry_boxes.get(sections[str(section_id)]["canvas"])
+        if entry_box is not None and entry_box["section_id"] == section_id: close_entry_box(entry_box)
         # Delete all the tkinter canvas drawing objects associated with the section
         sections[str(section_id)]["canvas"].delete("section"+str(section_id))
         # Delete all the tkinter button objects created for the section
@@ -1,5 +1,9 @@
 # ------------------------------------------------------------------------------------------
-# This module is used for creating Track Sensor objects (Sensors) mapped to GPIO Pins
+# This module is used for creating Track Sensor objects (Sensors) mapped to GPIO Pins - or mapped
+# to the inputs of an "input bank" (an MCP23017 16 bit I2C port expander) for larger layouts.
+# The GPIO inputs each generate an interrupt (edge callback) whereas the input banks are read in
+# bulk (a whole 16 bit port at a time) by a single background poller - which compares each reading
+# with the previous one and raises sensor events only for the inputs that have changed.
 # ------------------------------------------------------------------------------------------
 #
 # Public types and functions:
@@ -11,7 +15,9 @@
 #   Mandatory Parameters:
 #       sensor_id:int - The ID to be used for the sensor 
 #       gpio_channel:int - The GPIO port number for the sensor (not the physical pin number)
+#                          or the input number (0-15) if the sensor is mapped to an input bank
 #   Optional Parameters:
+#       input_bank:int       - The ID of the input bank to use (0 = Raspberry Pi GPIO) - default = 0
 #       sensor_timeout:float - Time period for ignoring further triggers - default = 3.0 secs
 #       trigger_period:float - Active duration for sensor before triggering - default = 0.001 secs
 #       signal_passed:int    - Raise a "signal passed" event for a signal ID - default = None
@@ -22,14 +28,43 @@
 # 
 # sensor_active (sensor_id:int) - Returns the current state of the sensor (True/False)
 # 
+# track_sensors_active (*sensor_ids:int) - Returns a list of the current states of the specified
+#                              sensors (True/False) - in the order specified - reading all the GPIO
+#                              inputs in a single pass (for callbacks that need to test several sensors)
+# 
+# configure_gpio_backend - Selects the GPIO backend to use for the sensors - the RPi.GPIO package (the
+#                          default if running on a Raspberry Pi) or the in-process GPIO simulator (for
+#                          testing and benchmarking on any machine - see the gpio_simulator module).
+#                          Must be called before any sensors are created
+#   Optional Parameters:
+#       simulated:bool - True to use the GPIO simulator, False to use RPi.GPIO - default = False
+# 
+# create_input_bank - Creates a bank of 16 inputs (an MCP23017 I2C port expander with all pins
+#                     configured as inputs with pull-ups) - the inputs are active low (as for GPIO)
+#   Mandatory Parameters:
+#       bank_id:int - The ID to be used for the input bank
+#   Optional Parameters:
+#       device:str - The I2C device file (or "simulated" for the GPIO simulator) - default = "/dev/i2c-1"
+#       address:int - The I2C address of the port expander (0x20-0x27) - default = 0x20
+#       poll_interval:float - The time between readings of the bank - default = 0.005 secs
+#                             (the poller reads all banks at the shortest interval specified)
+# 
 # ------------------------------------------------------------------------------------------
 
 import enum
 import time
+import heapq
 import threading
 import logging
+import os
+import fcntl
 from . import common
 from . import signals_common
+from . import track_sections
+from . import event_tracing
+from . import event_recorder
+from . import callback_profiler
+from . import gpio_simulator
 
 # We can only use GPIO interface if we're running on a Raspberry Pi
 # Other Platforms don't include the RPi specific GPIO package
@@ -43,6 +78,32 @@ def is_raspberrypi():
     return (False)
 raspberry_pi = is_raspberrypi()
 
+# The GPIO inputs are available if we are running on a Raspberry Pi (or the simulator has been selected)
+gpio_available = raspberry_pi
+
+# -------------------------------------------------------------------------
+# Externally called function to select the GPIO backend. The GPIO simulator
+# provides the same interface as the subset of RPi.GPIO that we use
+# -------------------------------------------------------------------------
+
+def configure_gpio_backend (simulated:bool = False):
+
+    global GPIO
+    global gpio_available
+    global logging
+
+    if len(channels) > 0:
+        logging.error ("Sensors: configure_gpio_backend - GPIO backend must be selected before creating sensors")
+    elif simulated:
+        logging.info ("Sensors: Using the GPIO simulator for track sensor inputs")
+        GPIO = gpio_simulator
+        gpio_available = True
+    else:
+        gpio_available = is_raspberrypi()
+        if gpio_available: logging.info ("Sensors: Using RPi.GPIO for track sensor inputs")
+        else: logging.warning ("Sensors: Not running on a Raspberry Pi - GPIO inputs will be non-functional")
+    return()
+
 # -------------------------------------------------------------------------
 # Define the different callbacks types for the sensor
 # -------------------------------------------------------------------------
@@ -52,9 +113,13 @@ class track_sensor_callback_type(enum.Enum):
     
 # -------------------------------------------------------------------------
 # Sensor Channels are to be added to a global dictionary when created
+# We also maintain a reverse index of sensor ID to GPIO channel so we
+# don't need to search all the channels to find the channel for a sensor
 # -------------------------------------------------------------------------
 
 channels: dict = {}
+sensors: dict = {}
+input_banks: dict = {}
 
 # -------------------------------------------------------------------------
 # The default "External" callback function for the sensor
@@ -71,76 +136,319 @@ def null_callback(sensor_id:int,callback_type):
 def channel_mapped(channel:int):
     return (str(channel) in channels.keys() )
 
+def sensor_exists(sensor_id:int):
+    return (str(sensor_id) in sensors.keys() )
+
+# Sensors mapped to signal passed/approach events don't raise sensor triggered events
+def sensor_mapped_to_signal(sensor_id:int):
+    channel = channels[str(sensors[str(sensor_id)])]
+    return (channel["signal_passed"] > 0 or channel["signal_approach"] > 0)
+
+def input_bank_exists(bank_id:int):
+    return (str(bank_id) in input_banks.keys() )
+
+# The channel for an input bank input is a string of the form "<bank_id>:<input>"
+def bank_channel(bank_id:int, bank_input:int):
+    return (str(bank_id)+":"+str(bank_input))
+
+# -------------------------------------------------------------------------
+# Internal function to test whether the input for a sensor channel is active
+# (low). GPIO channels are read directly - input bank channels are taken from
+# the latest reading of the bank (made by the input bank poller)
+# -------------------------------------------------------------------------
+
+def channel_input_active(channel):
+    if isinstance(channel, int):
+        return (gpio_available and not GPIO.input(channel))
+    channel_config = channels[channel]
+    return (not (input_banks[channel_config["input_bank"]]["state"] >> channel_config["bank_input"]) & 1)
+
+# -------------------------------------------------------------------------
+# Internal functions to read an input bank (an MCP23017 port expander on an
+# I2C bus). The port expander is accessed via the I2C device file (the I2C
+# address is selected with an ioctl) - We configure all pins as inputs with
+# the pull-ups enabled and then read both 8 bit ports (GPIOA and GPIOB) in a
+# single transaction - returns the 16 bit reading (or None if it failed)
+# -------------------------------------------------------------------------
+
+I2C_SLAVE = 0x0703
+MCP23017_IODIRA = 0x00
+MCP23017_GPPUA = 0x0C
+MCP23017_GPIOA = 0x12
+
+def open_input_bank(device:str, address:int):
+    bank_file = os.open(device, os.O_RDWR)
+    try:
+        fcntl.ioctl(bank_file, I2C_SLAVE, address)
+        os.write(bank_file, bytes((MCP23017_IODIRA, 0xFF, 0xFF)))
+        os.write(bank_file, bytes((MCP23017_GPPUA, 0xFF, 0xFF)))
+    except Exception:
+        os.close(bank_file)
+        raise
+    return (bank_file)
+
+def read_input_bank(bank:dict):
+    if bank["device"] == "simulated":
+        return (gpio_simulator.read_simulated_bank(bank["bank_id"]))
+    try:
+        os.write(bank["file"], bytes((MCP23017_GPIOA,)))
+        reading = os.read(bank["file"], 2)
+    except Exception as exception:
+        if not bank["read_error"]:
+            logging.error ("Input Bank "+str(bank["bank_id"])+": Error reading "+bank["device"]+
+                                    " - Reported exception: "+str(exception))
+        bank["read_error"] = True
+        return (None)
+    bank["read_error"] = False
+    return (reading[0] | (reading[1] << 8))
+
+# -------------------------------------------------------------------------
+# Internal function to poll an input bank. Each reading is compared with the
+# previous reading and a sensor "trigger" is raised for every input with an
+# event mapped that has changed from inactive to active (high to low). The
+# input bank poller thread polls all the input banks in turn
+# -------------------------------------------------------------------------
+
+bank_poller_thread = None
+
+def poll_input_bank(bank_id:str, bank:dict):
+    reading = read_input_bank(bank)
+    if reading is not None:
+        falling_edges = bank["state"] & ~reading & bank["event_mask"]
+        bank["state"] = reading
+        while falling_edges:
+            bank_input = (falling_edges & -falling_edges).bit_length() - 1
+            falling_edges = falling_edges & (falling_edges - 1)
+            track_sensor_triggered(bank_channel(bank_id, bank_input))
+    return()
+
+def thread_to_poll_input_banks():
+    while True:
+        for bank_id, bank in list(input_banks.items()):
+            poll_input_bank(bank_id, bank)
+        time.sleep(min(bank["poll_interval"] for bank in input_banks.values()))
+    return()
+
+# -------------------------------------------------------------------------
+# Externally called function to create an input bank (16 inputs)
+# -------------------------------------------------------------------------
+
+def create_input_bank (bank_id:int, device:str = "/dev/i2c-1", address:int = 0x20, poll_interval:float = 0.005):
+
+    global bank_poller_thread
+    global logging
+
+    logging.info ("Input Bank "+str(bank_id)+": Creating input bank ("+device+" - address "+hex(address)+")")
+    if bank_id < 1:
+        logging.error ("Input Bank "+str(bank_id)+": Input bank ID must be greater than zero")
+    elif input_bank_exists(bank_id):
+        logging.error ("Input Bank "+str(bank_id)+": Input bank already exists")
+    elif address < 0x20 or address > 0x27:
+        logging.error ("Input Bank "+str(bank_id)+": Invalid I2C address "+hex(address)+" - must be between 0x20 and 0x27")
+    elif device != "simulated" and any(bank["device"] == device and bank["address"] == address for bank in input_banks.values()):
+        logging.error ("Input Bank "+str(bank_id)+": Address "+hex(address)+" on "+device+" is already used by another input bank")
+    else:
+        bank = {"bank_id": bank_id, "device": device, "address": address, "file": None,
+                "poll_interval": poll_interval, "event_mask": 0, "state": 0xFFFF, "read_error": False}
+        try:
+            if device != "simulated": bank["file"] = open_input_bank(device, address)
+        except Exception as exception:
+            logging.error ("Input Bank "+str(bank_id)+": Error opening "+device+" - Reported exception: "+str(exception))
+        else:
+            reading = read_input_bank(bank)
+            if reading is not None: bank["state"] = reading
+            input_banks[str(bank_id)] = bank
+            if bank_poller_thread is None:
+                bank_poller_thread = threading.Thread(target=thread_to_poll_input_banks, daemon=True)
+                bank_poller_thread.start()
+    return()
+
+# -------------------------------------------------------------------------
+# Internal scheduler for the sensor debounce and timeout checks. Rather than
+# sleeping in the GPIO edge callback (which blocks the single RPi.GPIO callback
+# thread so edges on other channels queue up behind it) or starting a thread
+# for every trigger, the checks are scheduled to run after the required delay
+# in a single background thread. The scheduled tasks are held in a heap (the
+# task due to run next at the top) and the thread waits on a Condition until
+# either the next task is due or a new task has been scheduled
+# -------------------------------------------------------------------------
+
+scheduled_tasks: list = []
+scheduler_condition = threading.Condition()
+scheduler_thread = None
+task_sequence = 0
+
+def schedule_sensor_task(delay:float, task_function, *args):
+    global scheduler_thread
+    global task_sequence
+    with scheduler_condition:
+        if scheduler_thread is None:
+            scheduler_thread = threading.Thread(target=thread_to_run_scheduled_tasks, daemon=True)
+            scheduler_thread.start()
+        # The sequence number ensures tasks due at the same time are run in the order scheduled
+        task_sequence = task_sequence + 1
+        heapq.heappush(scheduled_tasks, (time.monotonic() + delay, task_sequence, task_function, args))
+        scheduler_condition.notify()
+    return()
+
+def thread_to_run_scheduled_tasks():
+    global logging
+    while True:
+        with scheduler_condition:
+            while len(scheduled_tasks) == 0 or scheduled_tasks[0][0] > time.monotonic():
+                if len(scheduled_tasks) == 0: scheduler_condition.wait()
+                else: scheduler_condition.wait(scheduled_tasks[0][0] - time.monotonic())
+            due_time, sequence, task_function, args = heapq.heappop(scheduled_tasks)
+        try: task_function(*args)
+        except Exception as exception:
+            logging.error("Sensors: Exception in scheduled sensor task - Reported exception: "+str(exception))
+    return()
+
 # -------------------------------------------------------------------------
 # Internal function called each time the external sensor input is triggered
 # If the sensor is still within the timeout period (from the last time it
 # was triggered) then the timeout period will effectively be extended
-# If  not in the timouut period then the external callback will be made
+# If not in the timeout period then a check is scheduled for the end of the
+# trigger period (to confirm the sensor is still active) - this function
+# returns immediately so it never blocks the GPIO callback thread. The
+# 'timeout_active' and 'confirmation_pending' flags are only tested/changed
+# with the sensor state lock held (the edge callbacks and the scheduled
+# checks run in different threads) so a sensor can't be triggered twice
+# by an edge that arrives whilst the trigger is being confirmed
 # -------------------------------------------------------------------------
 
+sensor_state_lock = threading.Lock()
+
 def track_sensor_triggered (gpio_channel:int):
     
     global channels
     global logging
     
-    # Thread to "lock" the sensor for the specified timeout period
-    def thread_to_timeout_sensor (channel):
-        channels[str(channel)]["timeout_start"] = time.time()
-        channels[str(channel)]["timeout_active"] = True
-        while time.time() < channels[str(channel)]["timeout_start"] + channels[str(channel)]["timeout_value"]:
-            time.sleep(0.001)
-        channels[str(channel)]["timeout_active"] = False
-        return()
-
-    # This is where the main code begins
     if not channel_mapped (gpio_channel):
         logging.error ("Sensor "+str(gpio_channel)+": Triggered sensor not mapped")
     else:
-        if channels[str(gpio_channel)]["timeout_active"]:
-            # If we are still in the timeout period then we want to extend it
-            channels[str(gpio_channel)]["timeout_start"] = time.time()
-        else:
-            # Wait for the trigger delay period and then check the sensor is still active
-            # We do this to alow any spurious "spikes" on the inputs to be filtered out
-            time.sleep (channels[str(gpio_channel)]["trigger_period"])
-            sensor_id = channels[str(gpio_channel)]["sensor_id"]
-            if track_sensor_active(sensor_id):
-                # Start a new timeout thread
-                timeout_thread = threading.Thread (target=thread_to_timeout_sensor, args=(gpio_channel,))
-                timeout_thread.start()
-                # Now call back into the main tkinter thread to process the callback. We do this as all the
-                # information out there on the internet concludes tkinter isn't fully thread safe and so all  
-                # manipulation of tkinter drawing objects should be done from within the main tkinter thread 
-                # If a Tkinter window hasn't been created (i.e. the model_railway_signals package is just being 
-                # used for the sensor functionality, then we make a callback in the thread we happen to be in
-                logging.info("Sensor "+str(sensor_id)+": Triggered Event **************************************************")
-                
-                if channels[str(gpio_channel)]["signal_passed"] > 0:
-                    sig_id = channels[str(gpio_channel)]["signal_passed"]
-                    if not signals_common.sig_exists(sig_id):
-                        logging.error ("Signal "+str(sig_id)+": trigger_signal_passed_event - Signal does not exist")
-                    else:
-                        # Raise a signal passed event in the main tkinter thread (if the signal exists)
-                        # If the signal exists then we know there is a main tkinter root window
-                        common.execute_function_in_tkinter_thread(lambda:signals_common.sig_passed_button_event(sig_id))
-                elif channels[str(gpio_channel)]["signal_approach"] > 0:
-                    sig_id = channels[str(gpio_channel)]["signal_approach"]
-                    if not signals_common.sig_exists(sig_id):
-                        logging.error ("Signal "+str(sig_id)+": trigger_signal_approach_event - Signal does not exist")
-                    elif (signals_common.signals[str(sig_id)]["sigtype"] in
-                          (signals_common.sig_type.colour_light, signals_common.sig_type.semaphore) ):
-                        # If the signal exists then we know there is a main tkinter root window
-                        # Raise a signal approach event in the main tkinter thread (if the signal exists)
-                        common.execute_function_in_tkinter_thread(lambda:signals_common.approach_release_button_event(sig_id))
-                    else:
-                        logging.error ("Signal "+str(sig_id)+": trigger_signal_approach_event - Function not supported by signal type")
-                elif common.root_window is not None:
-                    # Raise a callback in the main tkinter thread as long as we know the main root window
-                    common.execute_function_in_tkinter_thread (lambda: channels[str(gpio_channel)]["callback"]
-                                                            (sensor_id,track_sensor_callback_type.sensor_triggered))
-                else: 
-                    # Raise a callback in the current gpio event thread
-                    channels[str(gpio_channel)]["callback"](sensor_id,track_sensor_callback_type.sensor_triggered)
+        channel = channels[str(gpio_channel)]
+        with sensor_state_lock:
+            if channel["timeout_active"]:
+                # If we are still in the timeout period then we want to extend it
+                channel["timeout_start"] = time.time()
+                start_confirmation = False
+            else:
+                start_confirmation = not channel["confirmation_pending"]
+                channel["confirmation_pending"] = True
+        if start_confirmation:
+            # Start a new event trace (only if event tracing has been enabled)
+            trace_id = event_tracing.start_trace("Sensor "+str(channel["sensor_id"]))
+            event_tracing.end_current_trace()
+            # Check the sensor is still active after the trigger period - We do this to allow
+            # any spurious "spikes" on the inputs to be filtered out
+            schedule_sensor_task(channel["trigger_period"], confirm_sensor_triggered, gpio_channel, trace_id)
+    return()
+
+# -------------------------------------------------------------------------
+# Internal function (run by the scheduler) to expire the timeout period for
+# a sensor - If the timeout has been extended (by further triggers) since
+# the check was scheduled then we re-schedule the check for the new expiry
+# -------------------------------------------------------------------------
+
+def expire_sensor_timeout (gpio_channel:int):
+    channel = channels[str(gpio_channel)]
+    with sensor_state_lock:
+        remaining_time = channel["timeout_start"] + channel["timeout_value"] - time.time()
+        if remaining_time <= 0: channel["timeout_active"] = False
+    if remaining_time > 0:
+        schedule_sensor_task(remaining_time, expire_sensor_timeout, gpio_channel)
+    return()
+
+# -------------------------------------------------------------------------
+# Internal function (run by the scheduler) at the end of the trigger period
+# If the sensor is still active then we "lock" the sensor for the timeout
+# period and make the appropriate callback (or raise the signal event)
+# -------------------------------------------------------------------------
+
+def confirm_sensor_triggered (gpio_channel:int, trace_id):
+    
+    global channels
+    global logging
+
+    channel = channels[str(gpio_channel)]
+    event_tracing.set_current_trace(trace_id)
+    # The trace is always ended (even if an exception is raised in the external callback)
+    try:
+        sensor_id = channel["sensor_id"]
+        with sensor_state_lock:
+            # If the sensor is still active then "Lock" the sensor for the specified timeout period
+            # (before the pending confirmation is cleared) so further edges just extend the timeout
+            sensor_triggered = track_sensor_active(sensor_id)
+            if sensor_triggered:
+                channel["timeout_start"] = time.time()
+                channel["timeout_active"] = True
+            channel["confirmation_pending"] = False
+        if sensor_triggered:
+            event_tracing.record_trace_stage("sensor_trigger_filter")
+            schedule_sensor_task(channel["timeout_value"], expire_sensor_timeout, gpio_channel)
+            # Now call back into the main tkinter thread to process the callback. We do this as all the
+            # information out there on the internet concludes tkinter isn't fully thread safe and so all  
+            # manipulation of tkinter drawing objects should be done from within the main tkinter thread 
+            # If a Tkinter window hasn't been created (i.e. the model_railway_signals package is just being 
+            # used for the sensor functionality, then we make a callback in the thread we happen to be in
+            logging.info("Sensor "+str(sensor_id)+": Triggered Event **************************************************")
+        
+            if channel["signal_passed"] > 0:
+                sig_id = channel["signal_passed"]
+                if not signals_common.sig_exists(sig_id):
+                    logging.error ("Signal "+str(sig_id)+": trigger_signal_passed_event - Signal does not exist")
+                else:
+                    # Raise a signal passed event in the main tkinter thread (if the signal exists)
+                    # If the signal exists then we know there is a main tkinter root window
+                    common.execute_function_in_tkinter_thread(lambda:signals_common.sig_passed_button_event(sig_id))
+            elif channel["signal_approach"] > 0:
+                sig_id = channel["signal_approach"]
+                if not signals_common.sig_exists(sig_id):
+                    logging.error ("Signal "+str(sig_id)+": trigger_signal_approach_event - Signal does not exist")
+                elif (signals_common.signals[str(sig_id)]["sigtype"] in
+                      (signals_common.sig_type.colour_light, signals_common.sig_type.semaphore) ):
+                    # If the signal exists then we know there is a main tkinter root window
+                    # Raise a signal approach event in the main tkinter thread (if the signal exists)
+                    common.execute_function_in_tkinter_thread(lambda:signals_common.approach_release_button_event(sig_id))
+                else:
+                    logging.error ("Signal "+str(sig_id)+": trigger_signal_approach_event - Function not supported by signal type")
+            elif common.root_window is not None:
+                event_recorder.record_input_event("sensor_triggered",sensor_id)
+                # Raise a callback in the main tkinter thread as long as we know the main root window
+                common.execute_function_in_tkinter_thread (lambda: sensor_triggered_event(sensor_id))
+            else: 
+                event_recorder.record_input_event("sensor_triggered",sensor_id)
+                # Raise a callback in the current (scheduler) thread
+                sensor_triggered_event(sensor_id)
+    finally:
+        event_tracing.end_current_trace()
+    return()
+
+# -------------------------------------------------------------------------
+# Internal function to process a sensor triggered event (also called by the
+# event_recorder to replay recorded events). Any track section transitions
+# mapped to the sensor are processed before the external callback is made
+# -------------------------------------------------------------------------
+
+def sensor_triggered_event (sensor_id:int):
+    track_sections.process_occupancy_event("sensor",sensor_id)
+    channels[str(sensors[str(sensor_id)])]["callback"](sensor_id,track_sensor_callback_type.sensor_triggered)
+    return()
+
+# -------------------------------------------------------------------------
+# Internal function to enable the events for a sensor (called by the track
+# sections module if the sensor is used to trigger a section transition)
+# -------------------------------------------------------------------------
+
+def enable_sensor_events (sensor_id:int):
+    channel = channels[str(sensors[str(sensor_id)])]
+    if not channel["events_enabled"]:
+        channel["events_enabled"] = True
+        if channel["input_bank"] != "0":
+            input_banks[channel["input_bank"]]["event_mask"] |= (1 << channel["bank_input"])
+        elif gpio_available:
+            GPIO.add_event_detect(channel["bank_input"], GPIO.FALLING, callback=track_sensor_triggered)
     return()
 
 # -------------------------------------------------------------------------
@@ -154,19 +462,28 @@ def create_track_sensor (sensor_id:int, gpio_channel:int,
                          signal_passed:int = 0,
                          signal_approach:int = 0,
                          sensor_timeout:float = 3.0,
-                         trigger_period:float = 0.001):
+                         trigger_period:float = 0.001,
+                         input_bank:int = 0):
     
     global channels 
     global logging
-    global raspberry_pi
+    global gpio_available
 
+    # Inputs on an input bank are identified by a channel of the form "<bank_id>:<input>"
+    if input_bank > 0: channel = bank_channel(input_bank, gpio_channel)
+    else: channel = gpio_channel
     # Validate the parameters we have been given
     logging.info ("Sensor "+str(sensor_id)+": Creating track sensor mapping")
     if sensor_id < 1:
         logging.error ("Sensor "+str(sensor_id)+": Sensor ID must be greater than zero")
-    elif channel_mapped(gpio_channel):
-        logging.error ("Sensor "+str(sensor_id)+": Channel "+str(gpio_channel)+" is already mapped to another Sensor")
-    elif gpio_channel < 4 or gpio_channel > 26 or gpio_channel == 14 or gpio_channel == 15:
+    elif channel_mapped(channel):
+        logging.error ("Sensor "+str(sensor_id)+": Channel "+str(channel)+" is already mapped to another Sensor")
+    elif input_bank > 0 and not input_bank_exists(input_bank):
+        logging.error ("Sensor "+str(sensor_id)+": Input bank "+str(input_bank)+" does not exist")
+    elif input_bank > 0 and (gpio_channel < 0 or gpio_channel > 15):
+        logging.error ("Sensor "+str(sensor_id)+": Invalid input "+str(gpio_channel)+" for input bank "
+                        +str(input_bank)+" - Input number must be between 0 and 15")
+    elif input_bank == 0 and (gpio_channel < 4 or gpio_channel > 26 or gpio_channel == 14 or gpio_channel == 15):
         # We don't use GPIO 14 or 15 as these are used for UART comms with the PI-SPROG-3
         # We don't use GPIO 0, 1, 2, 3 as these are the I2C (which we might want to use later)
         logging.error ("Sensor "+str(sensor_id)+": Invalid GPIO Channel "+str(gpio_channel)
@@ -175,29 +492,36 @@ def create_track_sensor (sensor_id:int, gpio_channel:int,
         logging.error ("Sensor "+str(sensor_id)+": Can only map to a signal_passed event OR a signal_approach event")
     elif (signal_passed > 0 or signal_approach) > 0 and sensor_callback != null_callback:
         logging.error ("Sensor "+str(sensor_id)+": Cannot specify a sensor_callback AND map to a signal event")
+    elif sensor_exists(sensor_id):
+        logging.error ("Sensor "+str(sensor_id)+": Sensor already exists - mapped to Channel "+str(sensors[str(sensor_id)]))
     else:
-        sensor_mapped = False
-        for channel in channels.keys():
-            if channels[str(channel)]["sensor_id"] == sensor_id:
-                logging.error ("Sensor "+str(sensor_id)+": Sensor already exists - mapped to Channel "+str(channel))
-                sensor_mapped = True
-        if not sensor_mapped:
-            if raspberry_pi:
-                GPIO.setup(gpio_channel, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-                # only bother creating an event if an external callback was specified
-                if sensor_callback != null_callback or signal_passed > 0 or signal_approach > 0:
-                    GPIO.add_event_detect(gpio_channel, GPIO.FALLING, callback=track_sensor_triggered)
-            else:
-                logging.warning ("Sensor "+str(sensor_id)+": Not running on a Raspberry Pi - GPIO inputs will be non-functional")
-
-            # Add the to the dictionaries of sensors and channels
-            channels[str(gpio_channel)] = {"sensor_id"       : sensor_id,
-                                           "callback"        : sensor_callback,
-                                           "signal_approach" : signal_approach,
-                                           "signal_passed"   : signal_passed,
-                                           "trigger_period"  : trigger_period,
-                                           "timeout_value"   : sensor_timeout,
-                                           "timeout_active"  : False}
+        # only bother raising events for the input if an external callback was specified (events
+        # can also be enabled later if the sensor is used for a track section transition)
+        events_enabled = sensor_callback != null_callback or signal_passed > 0 or signal_approach > 0
+        if input_bank > 0:
+            if events_enabled: input_banks[str(input_bank)]["event_mask"] |= (1 << gpio_channel)
+        elif gpio_available:
+            GPIO.setup(gpio_channel, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            if events_enabled: GPIO.add_event_detect(gpio_channel, GPIO.FALLING, callback=track_sensor_triggered)
+        else:
+            logging.warning ("Sensor "+str(sensor_id)+": Not running on a Raspberry Pi - GPIO inputs will be non-functional")
+
+        # Wrap the external callback so it can be profiled (see callback_profiler)
+        sensor_callback = callback_profiler.profile_callback(sensor_callback,"sensor_callback")
+        # Add the to the dictionaries of sensors and channels
+        channels[str(channel)] = {"sensor_id"       : sensor_id,
+                                  "callback"        : sensor_callback,
+                                  "signal_approach" : signal_approach,
+                                  "signal_passed"   : signal_passed,
+                                  "trigger_period"  : trigger_period,
+                                  "timeout_value"   : sensor_timeout,
+                                  "timeout_active"  : False,
+                                  "timeout_start"   : 0.0,
+                                  "confirmation_pending" : False,
+                                  "events_enabled"  : events_enabled,
+                                  "input_bank"      : str(input_bank),
+                                  "bank_input"      : gpio_channel}
+        sensors[str(sensor_id)] = channel
     return() 
 
 # -------------------------------------------------------------------------
@@ -207,17 +531,30 @@ def create_track_sensor (sensor_id:int, gpio_channel:int,
 def track_sensor_active (sensor_id:int):
 
     global logging
-    global raspberry_pi
+    global gpio_available
     
     # A quick and dirty way of getting the code to run on Windows for development
     # As the Windows version of python doesn't include the RPi specific GPIO package
-    if raspberry_pi:
-        for channel in channels.keys():
-            if channels[str(channel)]["sensor_id"] == sensor_id:
-                return not bool(GPIO.input(int(channel)))
-        logging.error ("Sensor "+str(sensor_id)+": does not exist")
-        return (False)
-    else:
-        return (False)
+    # (GPIO sensors are always reported as inactive if the GPIO inputs are not available)
+    if sensor_exists(sensor_id):
+        return bool(channel_input_active(sensors[str(sensor_id)]))
+    logging.error ("Sensor "+str(sensor_id)+": does not exist")
+    return (False)
+
+# -------------------------------------------------------------------------
+# Externally called function to return the states of several sensor objects
+# (in the order specified). The GPIO channels are looked up first (so any
+# errors are logged before we start) and then all the inputs read together
+# -------------------------------------------------------------------------
+
+def track_sensors_active (*sensor_ids:int):
+
+    global logging
+    global gpio_available
+
+    sensor_channels = [sensors.get(str(sensor_id)) for sensor_id in sensor_ids]
+    for sensor_id, channel in zip(sensor_ids, sensor_channels):
+        if channel is None: logging.error ("Sensor "+str(sensor_id)+": does not exist")
+    return [channel is not None and bool(channel_input_active(channel)) for channel in sensor_channels]
 
 ############################################################################
\ No newline at end of file
@@ -0,0 +1,56 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for the binary layout state file format (binary_file_format.py)
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+
+from model_railway_signals.library import binary_file_format
+from model_railway_signals.library import file_interface
+
+# A small layout state snapshot (in the form returned by 'take_layout_state_snapshot')
+test_snapshot = {
+    "signals": [ ("1", [("sigclear",True),("subclear",None),("override",False),("siglocked",False),("sublocked",False),
+                        ("routeset",1),("releaseonred",None),("releaseonyel",False),("theatretext","M")]),
+                 ("2", [("sigclear",False),("subclear",True),("override",None),("siglocked",True),("sublocked",None),
+                        ("routeset",None),("releaseonred",True),("releaseonyel",None),("theatretext","")]) ],
+    "points": [ ("2", [("switched",False),("fpllock",True),("locked",None)]) ],
+    "sections": [ ("3", [("occupied",True),("labeltext",None)]),
+                  ("box1-4", [("occupied",False),("labeltext","1F23 é")]) ],
+    "instruments": [] }
+
+def expected_layout_state(snapshot:dict):
+    layout_state = {"info": "Model Railway Signalling State File"}
+    for layout_element, items in snapshot.items():
+        layout_state[layout_element] = {item_id: dict(item_elements) for item_id, item_elements in items}
+    return(layout_state)
+
+class test_binary_file_format(unittest.TestCase):
+
+    def test_round_trip(self):
+        encoded = binary_file_format.encode_layout_state(test_snapshot, file_interface.get_sig_file_config())
+        self.assertTrue(binary_file_format.is_binary_format(encoded))
+        self.assertEqual(binary_file_format.decode_layout_state(encoded), expected_layout_state(test_snapshot))
+
+    def test_round_trip_many_items(self):
+        # Tests the packing of the bools (4 per byte) for numbers of items that aren't a multiple of 4
+        for number_of_items in range(1, 10):
+            snapshot = { "points": [ (str(item_id), [("switched",(True,False,None)[item_id%3]),("fpllock",item_id%2==0),
+                                        ("locked",None)]) for item_id in range(number_of_items) ] }
+            encoded = binary_file_format.encode_layout_state(snapshot, {"points":file_interface.get_sig_file_config()["points"]})
+            self.assertEqual(binary_file_format.decode_layout_state(encoded), expected_layout_state(snapshot))
+
+    def test_invalid_files(self):
+        self.assertFalse(binary_file_format.is_binary_format(b'{"info": "Model Railway Signalling State File"}'))
+        self.assertRaises(ValueError, binary_file_format.decode_layout_state, b'{}')
+        self.assertRaises(ValueError, binary_file_format.decode_layout_state, b'MRSB\x63\x00')
+        self.assertRaises(ValueError, binary_file_format.decode_layout_state, b'MRSB\x01\x00')
+
+    def test_null_characters_rejected(self):
+        snapshot = {"sections": [("1", [("occupied",True),("labeltext","A\x00B")])]}
+        self.assertRaises(ValueError, binary_file_format.encode_layout_state, snapshot,
+                                        {"sections":file_interface.get_sig_file_config()["sections"]})
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
@@ -0,0 +1,109 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for the block instruments (block_instruments.py). The instruments are
+# populated directly (the tkinter buttons and the root window are mock objects)
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+
+from model_railway_signals.library import block_instruments
+from model_railway_signals.library import common
+
+class test_bell_code_timings(unittest.TestCase):
+
+    def test_single_group(self):
+        self.assertEqual(block_instruments.bell_code_timings("3"), [0.0, 0.25, 0.5])
+
+    def test_groups_separated_by_pause(self):
+        self.assertEqual(block_instruments.bell_code_timings("3-1-2"), [0.0, 0.25, 0.5, 1.4, 2.3, 2.55])
+
+    def test_spaces_are_ignored(self):
+        self.assertEqual(block_instruments.bell_code_timings(" 2 - 2 "), block_instruments.bell_code_timings("2-2"))
+
+    def test_invalid_codes(self):
+        for bell_code in ("", "0", "10", "3--1", "3-", "a", "1.5", "-1"):
+            self.assertIsNone(block_instruments.bell_code_timings(bell_code))
+
+class test_section_bell(unittest.TestCase):
+
+    def setUp(self):
+        self.root_window = mock.MagicMock()
+        self.patches = [ mock.patch.dict(block_instruments.instruments, {"1":{"bellbutton":mock.MagicMock(),
+                                                                  "bellsound":mock.MagicMock()}}, clear=True),
+                         mock.patch.object(common, "root_window", self.root_window),
+                         mock.patch.object(common, "shutdown_initiated", False) ]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def test_bell_flash_scheduled_with_the_ring(self):
+        with mock.patch.object(block_instruments.audio_mixer, "play_sound", return_value=0.5):
+            block_instruments.ring_section_bell(1)
+        block_instruments.instruments["1"]["bellbutton"].config.assert_not_called()
+        self.assertEqual(self.root_window.after.call_args[0][0], 500)
+        self.root_window.after.call_args[0][1]()
+        block_instruments.instruments["1"]["bellbutton"].config.assert_called_once_with(bg="yellow")
+
+    def test_bell_flash_immediate_if_channel_free(self):
+        with mock.patch.object(block_instruments.audio_mixer, "play_sound", return_value=0.0):
+            block_instruments.ring_section_bell(1)
+        block_instruments.instruments["1"]["bellbutton"].config.assert_called_once_with(bg="yellow")
+
+class test_button_transitions(unittest.TestCase):
+
+    def setUp(self):
+        self.patches = [ mock.patch.dict(block_instruments.instruments, {"1":{"sectionstate":None}}, clear=True),
+                         mock.patch.object(block_instruments, "render_instrument_buttons"),
+                         mock.patch.dict(block_instruments.section_button_render,
+                                        {None:"blocked", True:"clear", False:"occupied"}, clear=True) ]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def transition_valid(self, current_state, new_state):
+        block_instruments.instruments["1"]["sectionstate"] = current_state
+        return(block_instruments.button_transition_valid(1, new_state))
+
+    def test_valid_transitions(self):
+        for current_state, new_state in ((None,True), (None,False), (True,None), (True,False), (False,None)):
+            self.assertTrue(self.transition_valid(current_state, new_state))
+        block_instruments.render_instrument_buttons.assert_not_called()
+
+    def test_reselecting_current_state_is_valid(self):
+        for state in (None, True, False):
+            self.assertTrue(self.transition_valid(state, state))
+
+    def test_line_clear_rejected_from_train_on_line(self):
+        self.assertFalse(self.transition_valid(False, True))
+        block_instruments.render_instrument_buttons.assert_called_once_with(1, "occupied")
+
+class test_create_block_instruments(unittest.TestCase):
+
+    def setUp(self):
+        self.patches = [ mock.patch.dict(block_instruments.instruments, clear=True),
+                         mock.patch.object(block_instruments, "create_block_instrument") ]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def test_invalid_definitions_are_skipped(self):
+        canvas = mock.MagicMock()
+        definitions = [ {"block_id":1, "x":100, "y":200, "linked_to":2},
+                        {"block_id":2, "x":100, "y":300, "linkedto":1},
+                        {"block_id":3, "x":100, "y":400, "canvas":canvas},
+                        {"block_id":4, "x":100},
+                        "not a definition" ]
+        with self.assertLogs(level="ERROR") as logs:
+            block_instruments.create_block_instruments(canvas, definitions)
+        self.assertEqual(len(logs.records), 4)
+        block_instruments.create_block_instrument.assert_called_once()
+        self.assertEqual(block_instruments.create_block_instrument.call_args[1]["block_id"], 1)
+        self.assertEqual(block_instruments.create_block_instrument.call_args[1]["linked_to"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
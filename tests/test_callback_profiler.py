@@ -0,0 +1,52 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for the callback profiler (callback_profiler.py)
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+import time
+
+from model_railway_signals.library import callback_profiler
+
+def slow_callback(*args):
+    time.sleep(0.02)
+
+def failing_callback(*args):
+    raise RuntimeError("Callback failed")
+
+class test_callback_profiler(unittest.TestCase):
+
+    def setUp(self):
+        callback_profiler.enable_callback_profiling(threshold=1000.0)
+
+    def tearDown(self):
+        callback_profiler.disable_callback_profiling()
+        callback_profiler.reset_callback_statistics()
+
+    def test_nested_callback_time_not_counted_twice(self):
+        profiled_callback = callback_profiler.profile_callback(slow_callback, "signal_callback")
+        queued_function = lambda: profiled_callback(1)
+        start_time = time.perf_counter()
+        callback_profiler.execute_profiled_callback("queued_function", queued_function)
+        elapsed = (time.perf_counter() - start_time) * 1000.0
+        statistics = callback_profiler.get_callback_statistics()
+        self.assertEqual(len(statistics), 2)
+        self.assertGreaterEqual(statistics[callback_profiler.get_callback_name(slow_callback)]["total"], 20.0)
+        self.assertLessEqual(sum(callback_data["total"] for callback_data in statistics.values()), elapsed)
+
+    def test_time_recorded_on_exception(self):
+        profiled_callback = callback_profiler.profile_callback(failing_callback, "point_callback")
+        self.assertRaises(RuntimeError, profiled_callback, 1)
+        self.assertRaises(RuntimeError, profiled_callback, 1)
+        statistics = callback_profiler.get_callback_statistics()
+        self.assertEqual(statistics[callback_profiler.get_callback_name(failing_callback)]["count"], 2)
+        self.assertEqual(callback_profiler.thread_context.nested_callbacks, [])
+
+    def test_not_profiled_when_disabled(self):
+        callback_profiler.disable_callback_profiling()
+        callback_profiler.profile_callback(slow_callback, "signal_callback")(1)
+        self.assertEqual(callback_profiler.get_callback_statistics(), {})
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
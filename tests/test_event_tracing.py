@@ -0,0 +1,59 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for event tracing (event_tracing.py) - in particular that a trace is always
+# ended when an event has been processed (even if an exception is raised in an external callback)
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+
+from model_railway_signals.library import event_tracing
+from model_railway_signals.library import signals_common
+from model_railway_signals.library import track_sensors
+
+def failing_callback(*args):
+    raise RuntimeError("External callback failed")
+
+class test_event_tracing(unittest.TestCase):
+
+    def setUp(self):
+        event_tracing.enable_event_tracing()
+
+    def tearDown(self):
+        event_tracing.end_current_trace()
+        event_tracing.disable_event_tracing()
+        event_tracing.reset_trace_statistics()
+
+    def test_trace_stages_recorded(self):
+        trace_id = event_tracing.start_trace("Test")
+        event_tracing.record_trace_stage("stage1")
+        event_tracing.record_trace_stage("stage2", trace_id)
+        event_tracing.end_current_trace()
+        event_tracing.record_trace_stage("stage1")
+        statistics = event_tracing.get_trace_statistics()
+        self.assertEqual(statistics["stage1"]["count"], 1)
+        self.assertEqual(statistics["stage2"]["count"], 1)
+
+    def test_signal_button_trace_ended_on_exception(self):
+        with mock.patch.dict(signals_common.signals, {"1":{"extcallback":failing_callback}}, clear=True), \
+             mock.patch.object(signals_common, "toggle_signal"), \
+             mock.patch.object(signals_common, "auto_refresh_signal"):
+            self.assertRaises(RuntimeError, signals_common.signal_button_event, 1)
+        self.assertIsNone(event_tracing.current_trace())
+
+    def test_sensor_trace_ended_on_exception(self):
+        channel = {"sensor_id":1, "confirmation_pending":True, "timeout_value":1.0,
+                   "signal_passed":0, "signal_approach":0}
+        with mock.patch.dict(track_sensors.channels, {"4":channel}, clear=True), \
+             mock.patch.object(track_sensors, "track_sensor_active", return_value=True), \
+             mock.patch.object(track_sensors, "schedule_sensor_task"), \
+             mock.patch.object(track_sensors, "sensor_triggered_event", side_effect=failing_callback), \
+             mock.patch.object(track_sensors.common, "root_window", None):
+            trace_id = event_tracing.start_trace("Sensor 1")
+            event_tracing.end_current_trace()
+            self.assertRaises(RuntimeError, track_sensors.confirm_sensor_triggered, 4, trace_id)
+        self.assertIsNone(event_tracing.current_trace())
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
@@ -0,0 +1,116 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for the layout state journal and autosave (file_interface.py). The journal
+# is run against a temporary directory with the point states populated directly (no tkinter objects)
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+import tempfile
+import json
+import os
+import time
+
+from model_railway_signals.library import file_interface
+from model_railway_signals.library import points
+
+def point_state(switched:bool):
+    return({"switched":switched, "fpllock":True, "locked":False})
+
+class test_journal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "layout.sig")
+        self.saved_state = {"info": "Model Railway Signalling State File", "points": {"1": point_state(False)}}
+        with open(self.filename,'w') as file: json.dump(self.saved_state, file)
+        self.patches = [ mock.patch.dict(points.points, {"1":point_state(False), "2":point_state(False)}, clear=True),
+                         mock.patch.object(file_interface, "journal_compaction_threshold", 3),
+                         mock.patch.object(file_interface, "journal_sync_interval", 0.0) ]
+        for patch in self.patches: patch.start()
+        file_interface.layout_state = json.loads(json.dumps(self.saved_state))
+
+    def tearDown(self):
+        file_interface.stop_journal()
+        for patch in self.patches: patch.stop()
+        self.directory.cleanup()
+
+    def record_changes(self, number_of_changes:int):
+        for change in range(number_of_changes):
+            points.points["1"]["switched"] = not points.points["1"]["switched"]
+            file_interface.record_state_change("points", 1)
+        points.points["2"]["switched"] = True
+        file_interface.record_state_change("points", 2)
+
+    def replayed_state(self):
+        file_interface.read_layout_state_file(self.filename)
+        file_interface.replay_journal(self.filename+".journal")
+        return(file_interface.layout_state)
+
+    def test_replay_after_compaction(self):
+        file_interface.start_journal(self.filename)
+        self.record_changes(5)
+        file_interface.stop_journal()
+        self.assertTrue(os.path.isfile(self.filename+".journal.snapshot"))
+        layout_state = self.replayed_state()
+        self.assertEqual(layout_state["points"]["1"], point_state(True))
+        self.assertEqual(layout_state["points"]["2"], point_state(True))
+
+    def test_sig_file_not_written_by_journal(self):
+        file_interface.start_journal(self.filename, compact_on_start=True)
+        self.record_changes(10)
+        file_interface.stop_journal()
+        with open(self.filename) as file: self.assertEqual(json.load(file), self.saved_state)
+
+    def test_quit_without_saving_discards_journal(self):
+        file_interface.start_journal(self.filename)
+        self.record_changes(5)
+        file_interface.stop_journal(delete_journal=True)
+        self.assertFalse(os.path.isfile(self.filename+".journal"))
+        self.assertFalse(os.path.isfile(self.filename+".journal.snapshot"))
+        self.assertEqual(self.replayed_state(), self.saved_state)
+
+    def test_corrupted_records_ignored(self):
+        with open(self.filename+".journal",'w') as file:
+            file.write('["points","1",{"switched":true,"fpllock":true,"locked":false}]\n["points","2",{"swi')
+        self.assertEqual(self.replayed_state()["points"], {"1": point_state(True)})
+
+class test_autosave(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = {"points": [("1", [("switched", True)])]}
+        self.patches = [ mock.patch.dict(points.points, {"1":point_state(False)}, clear=True),
+                         mock.patch.object(file_interface.common, "root_window", None),
+                         mock.patch.object(file_interface, "write_layout_state_file"),
+                         mock.patch.object(file_interface, "take_layout_state_snapshot", side_effect=
+                                    [RuntimeError("dictionary changed size during iteration"), self.snapshot]) ]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        file_interface.stop_autosave()
+        for patch in self.patches: patch.stop()
+
+    def test_failed_snapshot_does_not_stop_autosave(self):
+        file_interface.configure_autosave("layout.sig", interval=0.05)
+        with self.assertLogs(level="ERROR"):
+            file_interface.record_state_change("points", 1)
+            time.sleep(0.3)
+        self.assertTrue(file_interface.autosave_config["writer_thread"].is_alive())
+        file_interface.write_layout_state_file.assert_called_once()
+        self.assertEqual(file_interface.write_layout_state_file.call_args[0][1], self.snapshot)
+        self.assertEqual(file_interface.autosave_config["changes_since_save"], 0)
+
+    def test_change_count_triggers_save(self):
+        file_interface.take_layout_state_snapshot.side_effect = None
+        file_interface.take_layout_state_snapshot.return_value = self.snapshot
+        file_interface.configure_autosave("layout.sig", interval=0.0, change_count=2)
+        file_interface.record_state_change("points", 1)
+        time.sleep(0.1)
+        file_interface.write_layout_state_file.assert_not_called()
+        file_interface.record_state_change("points", 1)
+        time.sleep(0.1)
+        file_interface.write_layout_state_file.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
@@ -0,0 +1,74 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for the layout checkpoints module (layout_checkpoints.py). These tests
+# populate the library dictionaries directly (no tkinter objects are created) so they can be
+# run without a display: python -m unittest discover tests
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+
+from model_railway_signals.library import layout_checkpoints
+from model_railway_signals.library import signals_common
+from model_railway_signals.library import points
+from model_railway_signals.library import track_sections
+from model_railway_signals.library import block_instruments
+
+def fake_signal(route=signals_common.route_type.MAIN):
+    return({"sigclear":False, "subclear":False, "override":False, "siglocked":False,
+            "sublocked":False, "routeset":route, "releaseonred":False, "releaseonyel":False,
+            "theatretext":"", "hassubsidary":False})
+
+class test_element_changed(unittest.TestCase):
+
+    def test_enum_element_compared_by_value(self):
+        signal = fake_signal(signals_common.route_type.MAIN)
+        self.assertFalse(layout_checkpoints.element_changed(signal, {"routeset":signals_common.route_type.MAIN.value}, "routeset"))
+        self.assertTrue(layout_checkpoints.element_changed(signal, {"routeset":signals_common.route_type.LH1.value}, "routeset"))
+
+    def test_missing_elements_not_changed(self):
+        signal = fake_signal()
+        self.assertFalse(layout_checkpoints.element_changed(signal, {"routeset":None}, "routeset"))
+        self.assertFalse(layout_checkpoints.element_changed(signal, {"labeltext":"X"}, "labeltext"))
+        self.assertTrue(layout_checkpoints.element_changed(signal, {"sigclear":True}, "sigclear"))
+
+class test_restore_checkpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.patches = [ mock.patch.dict(signals_common.signals, {"1":fake_signal(), "2":fake_signal(signals_common.route_type.LH1)}, clear=True),
+                         mock.patch.dict(points.points, {"1":{"switched":False, "fpllock":True, "locked":False,
+                                                              "hasfpl":True, "automatic":False}}, clear=True),
+                         mock.patch.dict(track_sections.sections, {"1":{"occupied":True, "labeltext":"1F23"}}, clear=True),
+                         mock.patch.dict(block_instruments.instruments, {"1":{"sectionstate":None, "repeaterstate":True,
+                                                                              "singleline":False}}, clear=True),
+                         mock.patch.dict(layout_checkpoints.checkpoints, {}, clear=True) ]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def test_unchanged_checkpoint_makes_no_changes(self):
+        layout_checkpoints.save_checkpoint("start")
+        with mock.patch.object(layout_checkpoints, "signals") as signals, \
+             mock.patch.object(layout_checkpoints, "points") as points_module, \
+             mock.patch.object(layout_checkpoints.signals_common, "unlock_signal") as unlock_signal:
+            points_module.point_exists.return_value = True
+            points_module.points = points.points
+            self.assertEqual(layout_checkpoints.restore_checkpoint("start"), 0)
+            self.assertEqual(signals.set_route.call_count, 0)
+            self.assertEqual(unlock_signal.call_count, 0)
+            self.assertEqual(points_module.toggle_point.call_count, 0)
+
+    def test_changed_route_is_restored(self):
+        layout_checkpoints.save_checkpoint("start")
+        signals_common.signals["1"]["routeset"] = signals_common.route_type.RH1
+        with mock.patch.object(layout_checkpoints, "signals") as signals:
+            self.assertEqual(layout_checkpoints.restore_checkpoint("start"), 1)
+            signals.set_route.assert_called_once_with(1, route=signals_common.route_type.MAIN, theatre_text="")
+
+    def test_unknown_slot(self):
+        self.assertEqual(layout_checkpoints.restore_checkpoint("unknown"), -1)
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
@@ -0,0 +1,56 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for the queuing of received MQTT messages (mqtt_interface.py). Messages are
+# passed directly to the 'on_message' callback (no broker connection is needed)
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+import types
+import json
+
+from model_railway_signals.library import mqtt_interface
+from model_railway_signals.library import common
+
+def message(topic:str, data:dict):
+    return(types.SimpleNamespace(topic=topic, payload=json.dumps(data).encode("utf-8")))
+
+class test_message_queue(unittest.TestCase):
+
+    def setUp(self):
+        self.patches = [ mock.patch.dict(mqtt_interface.node_config, {"network_configured":True, "network_identifier":"net",
+                            "callbacks":{}, "coalesced_topics":set(), "network_thread_topics":set(),
+                            "list_of_subscribed_topics":[], "message_queue":{}, "message_count":0}),
+                         mock.patch.object(mqtt_interface, "mqtt_client", mock.MagicMock(), create=True),
+                         mock.patch.object(common, "root_window", mock.MagicMock()),
+                         mock.patch.object(common, "execute_function_in_tkinter_thread") ]
+        for patch in self.patches: patch.start()
+        self.received = []
+        mqtt_interface.subscribe_to_mqtt_messages("signal_updated_event","box1",1,
+                    lambda data: self.received.append(("updated",data["state"])), coalesce=True)
+        mqtt_interface.subscribe_to_mqtt_messages("signal_passed_event","box1",1,
+                    lambda data: self.received.append(("passed",data["state"])))
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def send(self, message_type:str, state:int):
+        mqtt_interface.on_message(None, None, message(message_type+"/net/box1-1", {"sourceidentifier":"box1-1", "state":state}))
+
+    def test_coalesced_update_moves_to_latest_position(self):
+        self.send("signal_updated_event", 1)
+        self.send("signal_passed_event", 1)
+        self.send("signal_updated_event", 2)
+        self.send("signal_passed_event", 2)
+        self.assertEqual(common.execute_function_in_tkinter_thread.call_count, 1)
+        mqtt_interface.process_queued_messages()
+        self.assertEqual(self.received, [("passed",1), ("updated",2), ("passed",2)])
+
+    def test_invalid_message_discarded(self):
+        mqtt_interface.on_message(None, None, types.SimpleNamespace(topic="signal_passed_event/net/box1-1", payload=b"{x"))
+        mqtt_interface.process_queued_messages()
+        self.assertEqual(self.received, [])
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
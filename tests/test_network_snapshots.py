@@ -0,0 +1,64 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for applying layout state snapshots received from remote nodes
+# (network_snapshots.py). The remote signals and sections are populated directly
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+
+from model_railway_signals.library import network_snapshots
+from model_railway_signals.library import signals_common
+from model_railway_signals.library import track_sections
+
+class test_layout_snapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.signal_callback = mock.MagicMock()
+        self.section_callback = mock.MagicMock()
+        self.patches = [ mock.patch.dict(signals_common.signals, {"box1-1":{"sigstate":signals_common.signal_state_type.DANGER,
+                                                    "extcallback":self.signal_callback}}, clear=True),
+                         mock.patch.dict(track_sections.sections, {"box1-2":{"occupied":False, "labeltext":"OCCUPIED",
+                                                    "extcallback":self.section_callback}}, clear=True) ]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def snapshot(self, **elements):
+        message = {"sourceidentifier":"box1-0", "sequence":1, "signals":{"1":2},
+                   "sections":{"2":[True,"1F23"]}, "instruments":{}}
+        message.update(elements)
+        return(message)
+
+    def test_snapshot_applied(self):
+        network_snapshots.handle_mqtt_layout_snapshot_event(self.snapshot())
+        self.assertEqual(signals_common.signals["box1-1"]["sigstate"], signals_common.signal_state_type.PROCEED)
+        self.assertEqual(track_sections.sections["box1-2"]["occupied"], True)
+        self.assertEqual(track_sections.sections["box1-2"]["labeltext"], "1F23")
+        self.signal_callback.assert_called_once()
+        self.section_callback.assert_called_once()
+
+    def test_unchanged_items_not_updated(self):
+        network_snapshots.handle_mqtt_layout_snapshot_event(self.snapshot(signals={"1":1}, sections={"2":[False,"OCCUPIED"]}))
+        self.signal_callback.assert_not_called()
+        self.section_callback.assert_not_called()
+
+    def test_invalid_snapshots_discarded(self):
+        invalid_snapshots = [ self.snapshot(sourceidentifier="box1"), self.snapshot(sourceidentifier=None),
+                              self.snapshot(signals=[2]), self.snapshot(signals={"1":99}),
+                              self.snapshot(signals={"1":"PROCEED"}), self.snapshot(sections=[]),
+                              self.snapshot(sections={"2":[True]}), self.snapshot(sections={"2":[1,"1F23"]}),
+                              self.snapshot(sections={"2":[True,None]}), self.snapshot(instruments={"box2-1":"clear"}) ]
+        for message in invalid_snapshots:
+            with self.assertLogs(level="WARNING"):
+                network_snapshots.handle_mqtt_layout_snapshot_event(message)
+        # The valid elements of the invalid snapshots must not have been applied either
+        self.assertEqual(signals_common.signals["box1-1"]["sigstate"], signals_common.signal_state_type.DANGER)
+        self.assertEqual(track_sections.sections["box1-2"]["occupied"], False)
+        self.signal_callback.assert_not_called()
+        self.section_callback.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
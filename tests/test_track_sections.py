@@ -0,0 +1,207 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for the track section occupancy engine (track_sections.py). The sections,
+# signals and sensors are populated directly (the section buttons are mock objects)
+#-----------------------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+
+from model_railway_signals.library import track_sections
+from model_railway_signals.library import track_sensors
+from model_railway_signals.library import signals_common
+from model_railway_signals.library import points
+from model_railway_signals.library import callback_profiler
+
+def fake_section(occupied:bool=False, label:str="OCCUPIED"):
+    return({"occupied":occupied, "labeltext":label, "button1":mock.MagicMock(), "displayed":{}})
+
+class test_occupancy_engine(unittest.TestCase):
+
+    def setUp(self):
+        self.patches = [ mock.patch.dict(track_sections.sections, {"1":fake_section(True,"1F23"), "2":fake_section()}, clear=True),
+                         mock.patch.dict(track_sections.section_transitions, {}, clear=True),
+                         mock.patch.dict(track_sections.signal_protections, {}, clear=True),
+                         mock.patch.dict(track_sections.section_protected_signals, {}, clear=True),
+                         mock.patch.dict(track_sections.point_protected_signals, {}, clear=True),
+                         mock.patch.dict(signals_common.signals, {"1":{"sigtype":None}}, clear=True),
+                         mock.patch.dict(track_sensors.sensors, {"5":"4", "6":"7"}, clear=True),
+                         mock.patch.dict(track_sensors.channels, {"4":{"signal_passed":1, "signal_approach":0},
+                                                      "7":{"signal_passed":0, "signal_approach":0}}, clear=True),
+                         mock.patch.object(track_sensors, "enable_sensor_events") ]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def test_transition_moves_label(self):
+        track_sections.add_section_transition(1, 2, sig_passed=1)
+        track_sections.process_occupancy_event("sig_passed", 1)
+        self.assertFalse(track_sections.sections["1"]["occupied"])
+        self.assertTrue(track_sections.sections["2"]["occupied"])
+        self.assertEqual(track_sections.sections["2"]["labeltext"], "1F23")
+
+    def test_transition_processed_within_active_batch(self):
+        track_sections.add_section_transition(1, 2, sensor=6)
+        self.assertTrue(track_sections.start_section_batch())
+        track_sections.process_occupancy_event("sensor", 6)
+        self.assertTrue(track_sections.sections["2"]["occupied"])
+        # The button updates are deferred until the batch in progress is completed
+        self.assertEqual(track_sections.sections["2"]["button1"].config.call_count, 0)
+        track_sections.complete_section_batch()
+        self.assertEqual(track_sections.sections["2"]["button1"].config.call_count, 1)
+
+    def test_sensor_mapped_to_signal_rejected(self):
+        with self.assertLogs(level="ERROR"):
+            track_sections.add_section_transition(1, 2, sensor=5)
+        self.assertEqual(track_sections.section_transitions, {})
+
+    def test_set_sections_callback_profiled(self):
+        sections_callback = mock.MagicMock(__name__="sections_callback", __module__="tests")
+        callback_profiler.enable_callback_profiling()
+        try:
+            track_sections.set_sections([(1, False), (2, True, "2A01")], sections_callback)
+            statistics = callback_profiler.get_callback_statistics()
+        finally:
+            callback_profiler.disable_callback_profiling()
+            callback_profiler.reset_callback_statistics()
+        sections_callback.assert_called_once_with([1, 2], track_sections.section_callback_type.section_updated)
+        self.assertEqual([callback_data["type"] for callback_data in statistics.values()], ["section_callback"])
+
+class test_occupancy_transitions(unittest.TestCase):
+
+    def setUp(self):
+        self.signals = {"1":{"sigtype":None, "override":False}, "2":{"sigtype":None, "override":False}}
+        self.patches = [ mock.patch.dict(track_sections.sections, {"1":fake_section(True,"1F23"), "2":fake_section(),
+                                                                   "3":fake_section()}, clear=True),
+                         mock.patch.dict(track_sections.section_transitions, {}, clear=True),
+                         mock.patch.dict(track_sections.signal_protections, {}, clear=True),
+                         mock.patch.dict(track_sections.section_protected_signals, {}, clear=True),
+                         mock.patch.dict(track_sections.point_protected_signals, {}, clear=True),
+                         mock.patch.dict(signals_common.signals, self.signals, clear=True),
+                         mock.patch.dict(points.points, {"1":{"switched":False}}, clear=True),
+                         mock.patch.dict(track_sensors.sensors, {"6":"7"}, clear=True),
+                         mock.patch.dict(track_sensors.channels, {"7":{"signal_passed":0, "signal_approach":0}}, clear=True),
+                         mock.patch.object(track_sensors, "enable_sensor_events"),
+                         mock.patch.object(track_sections, "list_of_sections_to_publish", [1, 2, 3]),
+                         mock.patch.object(track_sections.mqtt_interface, "send_mqtt_message"),
+                         mock.patch.object(track_sections.network_snapshots, "published_state_changed"),
+                         mock.patch.object(signals_common, "set_signal_override", side_effect=
+                                    lambda sig_id: signals_common.signals[str(sig_id)].update(override=True)),
+                         mock.patch.object(signals_common, "clear_signal_override", side_effect=
+                                    lambda sig_id: signals_common.signals[str(sig_id)].update(override=False)),
+                         mock.patch.object(signals_common, "auto_refresh_signal") ]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def section_state(self, section_id:int):
+        return(track_sections.sections[str(section_id)]["occupied"], track_sections.sections[str(section_id)]["labeltext"])
+
+    def published_sections(self):
+        return(sorted(call[0][1] for call in track_sections.mqtt_interface.send_mqtt_message.call_args_list))
+
+    def test_forward_moves(self):
+        track_sections.add_section_transition(1, 2, sig_passed=1)
+        track_sections.add_section_transition(2, 3, sensor=6)
+        track_sections.add_section_transition(3, 0, sig_passed=2)
+        track_sections.process_occupancy_event("sig_passed", 1)
+        self.assertEqual([self.section_state(section_id) for section_id in (1,2,3)],
+                                    [(False,"1F23"), (True,"1F23"), (False,"OCCUPIED")])
+        track_sections.process_occupancy_event("sensor", 6)
+        self.assertEqual([self.section_state(section_id) for section_id in (1,2,3)],
+                                    [(False,"1F23"), (False,"1F23"), (True,"1F23")])
+        track_sections.process_occupancy_event("sig_passed", 2)
+        self.assertEqual(self.section_state(3), (False,"1F23"))
+
+    def test_train_entering_schematic(self):
+        track_sections.add_section_transition(0, 2, sig_passed=1)
+        track_sections.process_occupancy_event("sig_passed", 1)
+        self.assertEqual(self.section_state(2), (True,"OCCUPIED"))
+        # A second train can't enter the section whilst it is still occupied
+        track_sections.mqtt_interface.send_mqtt_message.reset_mock()
+        track_sections.process_occupancy_event("sig_passed", 1)
+        self.assertEqual(self.published_sections(), [])
+
+    def test_no_move_if_from_section_clear(self):
+        track_sections.add_section_transition(2, 3, sig_passed=1)
+        track_sections.process_occupancy_event("sig_passed", 1)
+        self.assertEqual(self.section_state(3), (False,"OCCUPIED"))
+        self.assertEqual(self.published_sections(), [])
+
+    def test_route_conditions_select_transition(self):
+        track_sections.add_section_transition(1, 2, sig_passed=1, points_switched=[1])
+        track_sections.add_section_transition(1, 3, sig_passed=1, points_normal=[1])
+        track_sections.process_occupancy_event("sig_passed", 1)
+        self.assertEqual(self.section_state(2), (False,"OCCUPIED"))
+        self.assertEqual(self.section_state(3), (True,"1F23"))
+
+    def test_reverse_moves(self):
+        track_sections.add_section_transition(2, 1, sig_passed=1)
+        track_sections.add_section_transition(2, 3, sensor=6, bidirectional=True)
+        # The transition isn't bidirectional - so a train in section 1 doesn't move back to section 2
+        track_sections.process_occupancy_event("sig_passed", 1)
+        self.assertEqual(self.section_state(1), (True,"1F23"))
+        self.assertEqual(self.section_state(2), (False,"OCCUPIED"))
+        track_sections.set_section_occupied(3, label="2A01")
+        track_sections.process_occupancy_event("sensor", 6)
+        self.assertEqual(self.section_state(2), (True,"2A01"))
+        self.assertEqual(self.section_state(3), (False,"2A01"))
+        # The forward direction still applies
+        track_sections.process_occupancy_event("sensor", 6)
+        self.assertEqual(self.section_state(2), (False,"2A01"))
+        self.assertEqual(self.section_state(3), (True,"2A01"))
+
+    def test_move_into_occupied_section(self):
+        track_sections.set_section_occupied(2, label="2B00")
+        track_sections.mqtt_interface.send_mqtt_message.reset_mock()
+        track_sections.add_section_transition(1, 2, sig_passed=1)
+        track_sections.process_occupancy_event("sig_passed", 1)
+        # The section stays occupied - with the label of the train that has moved into it
+        self.assertEqual(self.section_state(1), (False,"1F23"))
+        self.assertEqual(self.section_state(2), (True,"1F23"))
+        self.assertEqual(self.published_sections(), [1, 2])
+
+    def test_protection_override_set_and_cleared(self):
+        track_sections.add_section_protection(2, 2)
+        track_sections.add_section_protection(3, 2, points_switched=[1])
+        signals_common.set_signal_override.assert_not_called()
+        track_sections.add_section_transition(1, 2, sig_passed=1)
+        track_sections.add_section_transition(2, 3, sensor=6)
+        track_sections.process_occupancy_event("sig_passed", 1)
+        self.assertTrue(signals_common.signals["2"]["override"])
+        signals_common.auto_refresh_signal.assert_called_once_with(2)
+        # Section 3 is not on the route ahead of the signal (the point is NORMAL)
+        track_sections.process_occupancy_event("sensor", 6)
+        self.assertFalse(signals_common.signals["2"]["override"])
+        # Switching the point puts section 3 on the route ahead of the signal
+        points.points["1"]["switched"] = True
+        track_sections.update_point_protections(1)
+        self.assertTrue(signals_common.signals["2"]["override"])
+        track_sections.clear_section_occupied(3)
+        self.assertFalse(signals_common.signals["2"]["override"])
+        self.assertEqual(signals_common.set_signal_override.call_count, 2)
+        self.assertEqual(signals_common.clear_signal_override.call_count, 2)
+
+    def test_single_publish_and_render_per_event(self):
+        track_sections.add_section_protection(1, 1)
+        track_sections.add_section_protection(2, 1)
+        track_sections.add_section_transition(1, 2, sig_passed=1)
+        track_sections.mqtt_interface.send_mqtt_message.reset_mock()
+        signals_common.auto_refresh_signal.reset_mock()
+        track_sections.process_occupancy_event("sig_passed", 1)
+        # Each changed section is published and re-drawn once (with its final state)
+        self.assertEqual(self.published_sections(), [1, 2])
+        for call in track_sections.mqtt_interface.send_mqtt_message.call_args_list:
+            self.assertEqual(call[1]["data"], {"occupied":call[0][1]==2, "labeltext":"1F23"})
+        self.assertEqual(track_sections.sections["1"]["button1"].config.call_count, 1)
+        self.assertEqual(track_sections.sections["2"]["button1"].config.call_count, 1)
+        # The protected signal stays overridden (the train has moved between its protected sections)
+        signals_common.auto_refresh_signal.assert_not_called()
+        self.assertTrue(signals_common.signals["1"]["override"])
+        self.assertFalse(track_sections.section_batch["batch_active"])
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################
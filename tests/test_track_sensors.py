@@ -0,0 +1,130 @@
+#-----------------------------------------------------------------------------------------------
+# Headless unit tests for the track sensors and input banks (track_sensors.py) - using the
+# in-process GPIO simulator (gpio_simulator.py) to inject the input edges and bank readings
+#-----------------------------------------------------------------------------------------------
+
+import time
+import unittest
+from unittest import mock
+
+from model_railway_signals.library import track_sensors
+from model_railway_signals.library import gpio_simulator
+
+class test_sensor_triggering(unittest.TestCase):
+
+    def setUp(self):
+        self.callback = mock.MagicMock()
+        self.patches = [ mock.patch.dict(track_sensors.channels, clear=True),
+                         mock.patch.dict(track_sensors.sensors, clear=True),
+                         mock.patch.dict(gpio_simulator.input_levels, clear=True),
+                         mock.patch.dict(gpio_simulator.edge_callbacks, clear=True),
+                         mock.patch.object(track_sensors, "GPIO", gpio_simulator, create=True),
+                         mock.patch.object(track_sensors, "gpio_available", True),
+                         mock.patch.object(track_sensors.common, "root_window", None),
+                         mock.patch.object(track_sensors.track_sections, "process_occupancy_event") ]
+        for patch in self.patches: patch.start()
+        track_sensors.create_track_sensor(1, 4, sensor_callback=self.callback,
+                                          trigger_period=0.02, sensor_timeout=0.1)
+
+    def tearDown(self):
+        # Wait for the sensor timeout to expire (so no sensor tasks are left scheduled)
+        time.sleep(0.3)
+        for patch in self.patches: patch.stop()
+
+    def test_sensor_triggered_once(self):
+        gpio_simulator.set_simulated_input(4, 0)
+        time.sleep(0.1)
+        self.callback.assert_called_once_with(1, track_sensors.track_sensor_callback_type.sensor_triggered)
+
+    def test_spike_filtered_out(self):
+        gpio_simulator.set_simulated_input(4, 0)
+        gpio_simulator.set_simulated_input(4, 1)
+        time.sleep(0.1)
+        self.callback.assert_not_called()
+
+    def test_edge_during_confirmation_triggers_once(self):
+        # Inject another edge whilst the trigger is being confirmed (after the input has been read)
+        track_sensor_active = track_sensors.track_sensor_active
+        def inject_edge(sensor_id):
+            sensor_active = track_sensor_active(sensor_id)
+            if not self.edge_injected:
+                self.edge_injected = True
+                gpio_simulator.set_simulated_input(4, 1)
+                gpio_simulator.set_simulated_input(4, 0)
+                time.sleep(0.02)
+            return(sensor_active)
+        self.edge_injected = False
+        with mock.patch.object(track_sensors, "track_sensor_active", side_effect=inject_edge):
+            gpio_simulator.set_simulated_input(4, 0)
+            time.sleep(0.15)
+        self.assertTrue(self.edge_injected)
+        self.callback.assert_called_once_with(1, track_sensors.track_sensor_callback_type.sensor_triggered)
+
+class test_input_banks(unittest.TestCase):
+
+    def setUp(self):
+        self.patches = [ mock.patch.dict(track_sensors.channels, clear=True),
+                         mock.patch.dict(track_sensors.sensors, clear=True),
+                         mock.patch.dict(track_sensors.input_banks, clear=True),
+                         mock.patch.dict(gpio_simulator.bank_levels, clear=True),
+                         mock.patch.object(track_sensors, "bank_poller_thread", mock.MagicMock()),
+                         mock.patch.object(track_sensors, "track_sensor_triggered") ]
+        for patch in self.patches: patch.start()
+        track_sensors.create_input_bank(1, device="simulated")
+        # Sensors with events enabled on inputs 0, 3, 5 and 15 (but not on input 7)
+        for sensor_id, bank_input in ((1,0), (2,3), (3,5), (4,15)):
+            track_sensors.create_track_sensor(sensor_id, bank_input, sensor_callback=mock.MagicMock(), input_bank=1)
+        track_sensors.create_track_sensor(5, 7, input_bank=1)
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def set_inputs(self, level:int, *bank_inputs:int):
+        for bank_input in bank_inputs: gpio_simulator.set_simulated_input((1, bank_input), level)
+
+    def poll(self):
+        track_sensors.track_sensor_triggered.reset_mock()
+        track_sensors.poll_input_bank("1", track_sensors.input_banks["1"])
+        return([call[0][0] for call in track_sensors.track_sensor_triggered.call_args_list])
+
+    def test_changed_input_raises_event(self):
+        self.set_inputs(0, 3)
+        self.assertEqual(self.poll(), ["1:3"])
+        self.assertEqual(track_sensors.input_banks["1"]["state"], 0xFFFF & ~(1 << 3))
+        self.assertTrue(track_sensors.track_sensor_active(2))
+        self.assertFalse(track_sensors.track_sensor_active(1))
+
+    def test_several_inputs_change_in_one_poll(self):
+        self.set_inputs(0, 15, 0, 5)
+        self.assertEqual(self.poll(), ["1:0", "1:5", "1:15"])
+
+    def test_no_events_for_unchanged_inputs(self):
+        self.set_inputs(0, 3)
+        self.assertEqual(self.poll(), ["1:3"])
+        self.assertEqual(self.poll(), [])
+        self.set_inputs(0, 5)
+        self.assertEqual(self.poll(), ["1:5"])
+        # Inputs going inactive (and inputs without events enabled) don't raise events
+        self.set_inputs(1, 3, 5)
+        self.set_inputs(0, 7)
+        self.assertEqual(self.poll(), [])
+
+    def test_reasserted_input_raises_event(self):
+        self.set_inputs(0, 0)
+        self.assertEqual(self.poll(), ["1:0"])
+        self.set_inputs(1, 0)
+        self.assertEqual(self.poll(), [])
+        self.set_inputs(0, 0)
+        self.assertEqual(self.poll(), ["1:0"])
+
+    def test_input_active_when_bank_created(self):
+        gpio_simulator.set_simulated_input((2, 3), 0)
+        track_sensors.create_input_bank(2, device="simulated", address=0x21)
+        track_sensors.create_track_sensor(6, 3, sensor_callback=mock.MagicMock(), input_bank=2)
+        track_sensors.poll_input_bank("2", track_sensors.input_banks["2"])
+        track_sensors.track_sensor_triggered.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
+
+###############################################################################################